@@ -28,7 +28,7 @@ class MeetingCreate(BaseModel):
 
 
 @router.get("/meetings")
-async def get_meetings(
+def get_meetings(
     status: Optional[str] = Query(None, description="Filtrar por estado: pendiente, confirmada, completada, cancelada"),
     limit: int = Query(100, description="Número máximo de reuniones a retornar")
 ):
@@ -47,7 +47,7 @@ async def get_meetings(
 
 
 @router.get("/meetings/{meeting_id}")
-async def get_meeting(meeting_id: str):
+def get_meeting(meeting_id: str):
     """Obtiene los detalles de una reunión específica."""
     try:
         meeting = get_meeting_by_id(meeting_id)
@@ -61,7 +61,7 @@ async def get_meeting(meeting_id: str):
 
 
 @router.patch("/meetings/{meeting_id}")
-async def update_meeting(meeting_id: str, update_data: MeetingUpdate):
+def update_meeting(meeting_id: str, update_data: MeetingUpdate):
     """
     Actualiza una reunión.
     
@@ -104,7 +104,7 @@ async def update_meeting(meeting_id: str, update_data: MeetingUpdate):
 
 
 @router.post("/meetings")
-async def create_meeting(meeting_data: MeetingCreate):
+def create_meeting(meeting_data: MeetingCreate):
     """
     Crea una nueva reunión manualmente.
     
@@ -134,7 +134,7 @@ async def create_meeting(meeting_data: MeetingCreate):
 
 
 @router.delete("/meetings/{meeting_id}")
-async def cancel_meeting(meeting_id: str):
+def cancel_meeting(meeting_id: str):
     """Cancela una reunión (cambia su estado a 'cancelada')."""
     try:
         meeting = get_meeting_by_id(meeting_id)
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Request, HTTPException
 import logging
 from app.services.whatsapp import send_message
-from app.services.firebase import save_message
+from app.services.firebase import save_message_firestore
+from app.services.executor import run_blocking
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -18,11 +19,11 @@ async def send_whatsapp_message_endpoint(request: Request):
             return {"success": False, "error": "Phone and message required"}
         
         # Enviar mensaje
-        success = send_message(phone, message)
+        success = await send_message(phone, message)
         
         if success:
             # Guardar en Firestore
-            save_message(phone, "assistant", message)
+            await run_blocking(save_message_firestore, phone, "assistant", message)
             return {"success": True, "message": "Mensaje enviado"}
         else:
             return {"success": False, "error": "Failed to send"}
@@ -0,0 +1,61 @@
+"""
+Endpoint /metrics en formato Prometheus y middleware de métricas HTTP.
+
+El middleware es ASGI puro (sin BaseHTTPMiddleware) y etiqueta por la ruta
+declarada (`/api/meetings/{meeting_id}`), no por la URL concreta, para que
+la cardinalidad de las series se mantenga acotada.
+"""
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.services.metrics import counter, histogram, render_prometheus
+
+router = APIRouter()
+
+HTTP_REQUESTS = counter(
+    "http_requests_total",
+    "Requests HTTP por método, ruta y código de respuesta",
+    labels=("method", "route", "status")
+)
+HTTP_SECONDS = histogram(
+    "http_request_duration_seconds",
+    "Latencia de los requests HTTP por método y ruta",
+    labels=("method", "route")
+)
+
+
+class MetricsMiddleware:
+    """Cuenta y cronometra cada request HTTP por ruta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            HTTP_SECONDS.observe(time.perf_counter() - start, method=method, route=route_path)
+            HTTP_REQUESTS.inc(method=method, route=route_path, status=str(status["code"]))
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métricas de la app para el scrape de Prometheus"""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -9,10 +9,10 @@ from datetime import datetime
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import httpx
-
 from app.core.config import settings
-from app.services.firebase import db, save_message_firestore
+from app.services.firebase import db, count_firestore, save_message_firestore
+from app.services.http_client import GRAPH_API_URL, get_http_client, graph_headers, record_graph_call
+from app.services.executor import run_blocking
 
 logger = logging.getLogger(__name__)
 
@@ -58,7 +58,8 @@ async def save_promo_message_to_firestore(phone: str, image_url: str, caption: s
     try:
         # Usar la función estándar de firebase.py para consistencia
         # El caption incluye el texto de la promoción
-        save_message_firestore(
+        await run_blocking(
+            save_message_firestore,
             phone=phone,
             role="assistant",
             content=f"📢 PROMOCIÓN: {caption}",
@@ -74,14 +75,9 @@ async def save_promo_message_to_firestore(phone: str, image_url: str, caption: s
 async def send_image_message(phone: str, image_url: str, caption: str) -> dict:
     """
     Envía imagen con texto a un número de WhatsApp.
-    Versión asíncrona usando httpx.
+    Versión asíncrona usando el cliente httpx compartido (keep-alive).
     """
-    url = f"https://graph.facebook.com/v18.0/{settings.PHONE_NUMBER_ID}/messages"
-    
-    headers = {
-        "Authorization": f"Bearer {settings.META_TOKEN}",
-        "Content-Type": "application/json"
-    }
+    url = f"{GRAPH_API_URL}/{settings.PHONE_NUMBER_ID}/messages"
     
     payload = {
         "messaging_product": "whatsapp",
@@ -94,37 +90,77 @@ async def send_image_message(phone: str, image_url: str, caption: str) -> dict:
         }
     }
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, headers=headers, json=payload, timeout=30)
+    client = get_http_client()
+    try:
+        response = await client.post(url, headers=graph_headers(), json=payload, timeout=30)
+        record_graph_call("promotion", status_code=response.status_code)
+        
+        if response.status_code == 200:
+            # Guardar mensaje en Firestore si se envió exitosamente
+            await save_promo_message_to_firestore(phone, image_url, caption)
             
-            if response.status_code == 200:
-                # Guardar mensaje en Firestore si se envió exitosamente
-                await save_promo_message_to_firestore(phone, image_url, caption)
-                
-                data = response.json()
-                message_id = data.get("messages", [{}])[0].get("id", "")
-                logger.info(f"✅ Promoción enviada a {phone}: {message_id}")
-                return {
-                    "phone": phone,
-                    "status": "sent",
-                    "messageId": message_id
-                }
-            else:
-                error_msg = response.text[:200]
-                logger.error(f"❌ Error enviando a {phone}: {error_msg}")
-                return {
-                    "phone": phone,
-                    "status": "error",
-                    "error": error_msg
-                }
-        except Exception as e:
-            logger.error(f"❌ Excepción enviando a {phone}: {e}")
+            data = response.json()
+            message_id = data.get("messages", [{}])[0].get("id", "")
+            logger.info(f"✅ Promoción enviada a {phone}: {message_id}")
+            return {
+                "phone": phone,
+                "status": "sent",
+                "messageId": message_id
+            }
+        else:
+            error_msg = response.text[:200]
+            logger.error(f"❌ Error enviando a {phone}: {error_msg}")
             return {
                 "phone": phone,
                 "status": "error",
-                "error": str(e)
+                "error": error_msg
             }
+    except Exception as e:
+        record_graph_call("promotion", e)
+        logger.error(f"❌ Excepción enviando a {phone}: {e}")
+        return {
+            "phone": phone,
+            "status": "error",
+            "error": str(e)
+        }
+
+
+def save_promotion_history(request: SendPromotionRequest, sent_count: int, failed_count: int):
+    """Registra el envío en la colección 'promotions' (bloqueante, usar con run_blocking)."""
+    from google.cloud import firestore as fs
+    
+    promo_ref = db.collection('promotions').document(request.promotionId)
+    
+    batch_record = {
+        "enviadoEn": datetime.now(),
+        "destinatarios": len(request.phones),
+        "enviados": sent_count,
+        "fallidos": failed_count,
+        "imageUrl": request.imageUrl,
+        "title": request.title
+    }
+    
+    # Verificar si el documento existe
+    doc = promo_ref.get()
+    count_firestore("promotions", "read")
+    if doc.exists:
+        promo_ref.update({
+            "historialEnvios": fs.ArrayUnion([batch_record]),
+            "ultimoEnvio": datetime.now(),
+            "status": "sent"
+        })
+    else:
+        promo_ref.set({
+            "id": request.promotionId,
+            "title": request.title,
+            "description": request.description,
+            "imageUrl": request.imageUrl,
+            "createdAt": datetime.now(),
+            "ultimoEnvio": datetime.now(),
+            "status": "sent",
+            "historialEnvios": [batch_record]
+        })
+    count_firestore("promotions", "write")
 
 
 # --- Endpoints ---
@@ -179,39 +215,7 @@ async def send_promotion(request: SendPromotionRequest):
     
     # Guardar historial de la promoción
     try:
-        from google.cloud import firestore as fs
-        
-        promo_ref = db.collection('promotions').document(request.promotionId)
-        
-        batch_record = {
-            "enviadoEn": datetime.now(),
-            "destinatarios": len(request.phones),
-            "enviados": sent_count,
-            "fallidos": failed_count,
-            "imageUrl": request.imageUrl,
-            "title": request.title
-        }
-        
-        # Verificar si el documento existe
-        doc = promo_ref.get()
-        if doc.exists:
-            promo_ref.update({
-                "historialEnvios": fs.ArrayUnion([batch_record]),
-                "ultimoEnvio": datetime.now(),
-                "status": "sent"
-            })
-        else:
-            promo_ref.set({
-                "id": request.promotionId,
-                "title": request.title,
-                "description": request.description,
-                "imageUrl": request.imageUrl,
-                "createdAt": datetime.now(),
-                "ultimoEnvio": datetime.now(),
-                "status": "sent",
-                "historialEnvios": [batch_record]
-            })
-        
+        await run_blocking(save_promotion_history, request, sent_count, failed_count)
         logger.info(f"📊 Historial guardado para promoción {request.promotionId}")
     except Exception as e:
         logger.warning(f"No se pudo guardar historial: {e}")
@@ -230,12 +234,13 @@ async def send_promotion(request: SendPromotionRequest):
 
 
 @router.get("/promotions/{promotion_id}")
-async def get_promotion_stats(promotion_id: str):
+def get_promotion_stats(promotion_id: str):
     """
     Obtiene estadísticas de una promoción específica.
     """
     try:
         doc = db.collection('promotions').document(promotion_id).get()
+        count_firestore("promotions", "read")
         
         if not doc.exists:
             raise HTTPException(status_code=404, detail="Promoción no encontrada")
@@ -6,9 +6,10 @@ import logging
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Request
 
-from app.services.firebase import db, save_message_firestore
+from app.services.firebase import db, count_firestore, save_message_firestore
 from app.services.whatsapp import send_message
 from app.services.settings import get_bot_settings
+from app.services.executor import run_blocking
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +32,7 @@ def get_chats_pending_reminder(minutes_threshold: int) -> list:
         chats_ref = db.collection('chats').stream()
         
         for chat_doc in chats_ref:
+            count_firestore("chats", "read")
             chat_data = chat_doc.to_dict()
             phone = chat_doc.id
             
@@ -52,6 +54,7 @@ def get_chats_pending_reminder(minutes_threshold: int) -> list:
             )
             
             last_msg_docs = list(messages_ref.stream())
+            count_firestore("messages", "read", len(last_msg_docs))
             
             if not last_msg_docs:
                 continue
@@ -104,7 +107,7 @@ async def check_and_send_reminders(request: Request = None):
     logger.info("⏰ Iniciando verificación de recordatorios...")
     
     # Obtener configuración
-    settings = get_bot_settings()
+    settings = await run_blocking(get_bot_settings)
     
     if not settings.get('enableReminders', False):
         logger.info("📴 Recordatorios desactivados en configuración")
@@ -120,7 +123,7 @@ async def check_and_send_reminders(request: Request = None):
     logger.info(f"⚙️ Config: {minutes} minutos, mensaje: {reminder_message[:50]}...")
     
     # Obtener chats pendientes
-    pending = get_chats_pending_reminder(minutes)
+    pending = await run_blocking(get_chats_pending_reminder, minutes)
     logger.info(f"📋 Encontrados {len(pending)} chats pendientes de recordatorio")
     
     sent_count = 0
@@ -130,17 +133,18 @@ async def check_and_send_reminders(request: Request = None):
         phone = chat['phone']
         try:
             # Enviar recordatorio
-            success = send_message(phone, reminder_message)
+            success = await send_message(phone, reminder_message)
             
             if success:
                 # Guardar mensaje en historial
-                save_message_firestore(phone, "assistant", f"⏰ {reminder_message}")
+                await run_blocking(save_message_firestore, phone, "assistant", f"⏰ {reminder_message}")
                 
                 # Marcar que se envió recordatorio para no duplicar
-                db.collection('chats').document(phone).update({
+                await run_blocking(db.collection('chats').document(phone).update, {
                     'reminderSent': True,
                     'reminderSentAt': datetime.utcnow()
                 })
+                count_firestore("chats", "write")
                 
                 sent_count += 1
                 logger.info(f"✅ Recordatorio enviado a {phone} (esperando {chat['minutes_waiting']} min)")
@@ -169,7 +173,7 @@ async def check_and_send_reminders(request: Request = None):
 
 
 @router.post("/reset-reminder/{phone}")
-async def reset_reminder_flag(phone: str):
+def reset_reminder_flag(phone: str):
     """
     Resetea el flag de recordatorio cuando el cliente responde.
     Debe llamarse cuando llega un mensaje del usuario.
@@ -178,6 +182,7 @@ async def reset_reminder_flag(phone: str):
         db.collection('chats').document(phone).update({
             'reminderSent': False
         })
+        count_firestore("chats", "write")
         return {"success": True, "phone": phone}
     except Exception as e:
         logger.error(f"Error reseteando reminder flag: {e}")
@@ -17,10 +17,91 @@ class Settings:
     # WhatsApp/Meta
     META_TOKEN: str = os.getenv("META_TOKEN", "")
     PHONE_NUMBER_ID: str = os.getenv("PHONE_NUMBER_ID", "")
-    VERIFY_TOKEN: str = os.getenv("VERIFY_TOKEN", "maquinarias123")
+    VERIFY_TOKEN: str = os.getenv("VERIFY_TOKEN", "maquinaria123")
+    
+    # Cliente HTTP compartido para la Graph API
+    GRAPH_MAX_CONNECTIONS: int = int(os.getenv("GRAPH_MAX_CONNECTIONS", "100"))
+    GRAPH_MAX_KEEPALIVE: int = int(os.getenv("GRAPH_MAX_KEEPALIVE", "20"))
+    GRAPH_KEEPALIVE_SECONDS: float = float(os.getenv("GRAPH_KEEPALIVE_SECONDS", "60"))
+    GRAPH_TIMEOUT_SECONDS: float = float(os.getenv("GRAPH_TIMEOUT_SECONDS", "10"))
+    GRAPH_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("GRAPH_CONNECT_TIMEOUT_SECONDS", "5"))
     
     # Gemini
     MODEL_NAME: str = os.getenv("MODEL_NAME", "gemini-2.0-flash-exp")
+    
+    # Backend de LLM: "vertex" (Gemini) o "fake" (guionado, sin red, para pruebas de carga)
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "vertex")
+    FAKE_LLM_LATENCY_SECONDS: float = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "0.2"))
+    
+    # Gateway de Gemini: cuota local por minuto (0 = sin límite) y reintentos ante 429
+    LLM_RPM: int = int(os.getenv("LLM_RPM", "300"))
+    LLM_TPM: int = int(os.getenv("LLM_TPM", "1000000"))
+    LLM_OUTPUT_TOKENS_ESTIMATE: int = int(os.getenv("LLM_OUTPUT_TOKENS_ESTIMATE", "400"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    LLM_BACKOFF_BASE_SECONDS: float = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+    LLM_BACKOFF_MAX_SECONDS: float = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "20"))
+    
+    # Memoria de conversación: resumen incremental + ventana reciente
+    HISTORY_RECENT_MESSAGES: int = int(os.getenv("HISTORY_RECENT_MESSAGES", "8"))
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+    SUMMARY_EVERY_MESSAGES: int = int(os.getenv("SUMMARY_EVERY_MESSAGES", "10"))
+    SUMMARY_MAX_BATCH: int = int(os.getenv("SUMMARY_MAX_BATCH", "200"))
+    SUMMARY_MAX_WORDS: int = int(os.getenv("SUMMARY_MAX_WORDS", "200"))
+    
+    # Caché semántica de respuestas (preguntas sin estado repetidas)
+    REPLY_CACHE_SIZE: int = int(os.getenv("REPLY_CACHE_SIZE", "500"))
+    REPLY_CACHE_TTL_SECONDS: float = float(os.getenv("REPLY_CACHE_TTL_SECONDS", "3600"))
+    REPLY_CACHE_SIMILARITY: float = float(os.getenv("REPLY_CACHE_SIMILARITY", "0.9"))
+    
+    # Confianza mínima (0-1) para asociar un nombre pedido por el modelo a un producto
+    NAME_MATCH_MIN_SCORE: float = float(os.getenv("NAME_MATCH_MIN_SCORE", "0.5"))
+    
+    # Plazo común para las funciones pedidas en una misma respuesta del modelo
+    TOOL_DEADLINE_SECONDS: float = float(os.getenv("TOOL_DEADLINE_SECONDS", "25"))
+    
+    # Transcripción de notas de voz
+    TRANSCRIPTION_CONCURRENCY: int = int(os.getenv("TRANSCRIPTION_CONCURRENCY", "4"))
+    TRANSCRIPTION_CACHE_SIZE: int = int(os.getenv("TRANSCRIPTION_CACHE_SIZE", "1000"))
+    TRANSCRIPTION_CACHE_TTL_SECONDS: float = float(os.getenv("TRANSCRIPTION_CACHE_TTL_SECONDS", str(24 * 3600)))
+    TRANSCRIPTION_MAX_BYTES: int = int(os.getenv("TRANSCRIPTION_MAX_BYTES", str(16 * 1024 * 1024)))
+    
+    # Cola de turnos (spool en SQLite). SPOOL_PATH es obligatorio y debe estar en un
+    # volumen persistente: en Cloud Run /tmp vive en memoria y se pierde con la instancia
+    SPOOL_PATH: str = os.getenv("SPOOL_PATH", "")
+    # WAL necesita memoria compartida; en volúmenes de red (NFS/Filestore) usar DELETE
+    SPOOL_JOURNAL_MODE: str = os.getenv("SPOOL_JOURNAL_MODE", "WAL")
+    SPOOL_WORKERS: int = int(os.getenv("SPOOL_WORKERS", "4"))
+    SPOOL_MAX_ATTEMPTS: int = int(os.getenv("SPOOL_MAX_ATTEMPTS", "3"))
+    SPOOL_POLL_SECONDS: float = float(os.getenv("SPOOL_POLL_SECONDS", "0.5"))
+    # Lease de cada lote tomado: se renueva mientras el turno sigue en curso; si la
+    # instancia muere, sus lotes vuelven a la cola cuando el lease vence
+    SPOOL_LEASE_SECONDS: float = float(os.getenv("SPOOL_LEASE_SECONDS", "30"))
+    # Espera máxima al apagar para que los turnos en curso (con sus imágenes/PDFs) terminen;
+    # los que no alcancen vuelven a la cola
+    SPOOL_DRAIN_SECONDS: float = float(os.getenv("SPOOL_DRAIN_SECONDS", "20"))
+    
+    # Agrupación de ráfagas por conversación (0 = sin espera)
+    COALESCE_WINDOW_SECONDS: float = float(os.getenv("COALESCE_WINDOW_SECONDS", "2.0"))
+    COALESCE_MAX_WAIT_SECONDS: float = float(os.getenv("COALESCE_MAX_WAIT_SECONDS", "8.0"))
+    COALESCE_MAX_EVENTS: int = int(os.getenv("COALESCE_MAX_EVENTS", "10"))
+    
+    # Hilos para llamadas bloqueantes (Firestore, Storage, PDFs)
+    BLOCKING_IO_WORKERS: int = int(os.getenv("BLOCKING_IO_WORKERS", "32"))
+    
+    # Deduplicación de mensajes entrantes
+    DEDUP_CACHE_SIZE: int = int(os.getenv("DEDUP_CACHE_SIZE", "10000"))
+    DEDUP_TTL_SECONDS: float = float(os.getenv("DEDUP_TTL_SECONDS", "3600"))
+    DEDUP_STORE_TTL_SECONDS: int = int(os.getenv("DEDUP_STORE_TTL_SECONDS", str(7 * 24 * 3600)))
+    
+    # Configuración del bot (config/bot_settings): listener en vivo, polling si se cae,
+    # y TTL para procesos sin listener (scripts)
+    SETTINGS_POLL_SECONDS: float = float(os.getenv("SETTINGS_POLL_SECONDS", "5"))
+    SETTINGS_CACHE_TTL_SECONDS: float = float(os.getenv("SETTINGS_CACHE_TTL_SECONDS", "30"))
+    
+    # Catálogo de maquinarias en memoria: listener en vivo, polling si se cae,
+    # y TTL para procesos sin listener (scripts)
+    CATALOG_POLL_SECONDS: float = float(os.getenv("CATALOG_POLL_SECONDS", "60"))
+    CATALOG_CACHE_TTL_SECONDS: float = float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "60"))
 
 
 settings = Settings()
@@ -1,28 +1,52 @@
 """
 Agente de IA con Gemini y Function Calling.
 """
+import asyncio
 import logging
-import json
 import re
-import vertexai
-from vertexai.generative_models import (
-    GenerativeModel, 
-    Tool, 
-    FunctionDeclaration,
-    GenerationConfig
-)
+import threading
+import time
+from contextvars import ContextVar
+from typing import NamedTuple, Optional
 from app.core.config import settings
-from app.services.maquinarias import search_maquinarias, get_maquinaria
+from app.services.catalog import get_catalog_version
+from app.services.maquinarias import search_maquinarias, resolve_maquinarias, get_maquinaria
 from app.services.quotation import generate_quotation_pdf, save_quotation_to_firestore, update_quotation_status
-from app.services.settings import get_bot_settings
+from app.services.settings import get_settings_snapshot_async
 from app.services.firebase import schedule_meeting
+from app.services.executor import run_blocking
+from app.services.delivery import DeferredArtifact
+from app.services.intent import classify_message
+from app.services.llm import generate, count_turn_calls
+from app.services.llm_backend import get_backend
+from app.services.memory import format_history
+from app.services import reply_cache
+from app.services.metrics import histogram
 
-import time
 from google.api_core.exceptions import ResourceExhausted
 
 logger = logging.getLogger(__name__)
 
-vertexai.init(location=settings.GCP_LOCATION)
+TOOL_SECONDS = histogram(
+    "tool_call_seconds",
+    "Duración de cada función del agente",
+    labels=("tool", "status")
+)
+
+class TurnContext(NamedTuple):
+    """Datos del turno en curso que las funciones necesitan y el modelo no envía."""
+    client_phone: Optional[str]
+    settings_version: int
+
+
+# Cada turno corre en su propia tarea: el contexto no se comparte entre conversaciones
+# concurrentes y lo heredan las tareas de run_tool_calls
+_turn: ContextVar[Optional[TurnContext]] = ContextVar("agent_turn", default=None)
+
+
+def current_turn() -> Optional[TurnContext]:
+    """Contexto del turno que se está procesando en esta tarea (None fuera de un turno)."""
+    return _turn.get()
 
 def get_system_prompt(max_discount: int) -> str:
     """Genera el prompt del sistema con configuración dinámica."""
@@ -376,7 +400,7 @@ Tú: (Si max_discount > 0) "Mira, te puedo hacer un {MAX_DISCOUNT}% de descuento
     return base_prompt.replace("{MAX_DISCOUNT}", str(max_discount))
 
 # Funciones
-buscar_func = FunctionDeclaration(
+buscar_func = dict(
     name="buscar_maquinaria",
     description="Busca productos. Usa 'todas' para catálogo completo.",
     parameters={
@@ -386,7 +410,7 @@ buscar_func = FunctionDeclaration(
     }
 )
 
-mostrar_imagenes_func = FunctionDeclaration(
+mostrar_imagenes_func = dict(
     name="mostrar_imagenes_por_nombre",
     description="Muestra fotos de uno o VARIOS productos. Usa nombres exactos.",
     parameters={
@@ -402,7 +426,7 @@ mostrar_imagenes_func = FunctionDeclaration(
     }
 )
 
-cotizar_func = FunctionDeclaration(
+cotizar_func = dict(
     name="generar_cotizacion",
     description="Genera cotización para uno o Varios productos. Necesitas nombres y datos del cliente.",
     parameters={
@@ -421,7 +445,7 @@ cotizar_func = FunctionDeclaration(
     }
 )
 
-estado_func = FunctionDeclaration(
+estado_func = dict(
     name="actualizar_estado_cotizacion",
     description="Actualiza el estado de la cotización según la negociación. (NEGOCIANDO, VENDIDA, PERDIDA)",
     parameters={
@@ -434,7 +458,7 @@ estado_func = FunctionDeclaration(
     }
 )
 
-agendar_reunion_func = FunctionDeclaration(
+agendar_reunion_func = dict(
     name="agendar_reunion",
     description="Agenda una reunión o llamada con el cliente. EJECUTAR cuando el cliente proporcione su email y horario preferido.",
     parameters={
@@ -448,15 +472,51 @@ agendar_reunion_func = FunctionDeclaration(
     }
 )
 
-tools = Tool(function_declarations=[buscar_func, mostrar_imagenes_func, cotizar_func, estado_func, agendar_reunion_func])
+# Declaraciones neutrales: cada backend las traduce a su formato de tools
+tools = [buscar_func, mostrar_imagenes_func, cotizar_func, estado_func, agendar_reunion_func]
+
+
+async def render_quotation(cliente: dict, maquinarias: list, total: float) -> list:
+    """Genera el PDF de la cotización, la registra en Firestore y retorna el documento a enviar."""
+    pdf = await run_blocking(generate_quotation_pdf, maquinarias=maquinarias, **cliente)
+    if not pdf:
+        raise RuntimeError("No se pudo generar el PDF de la cotización")
+
+    filename = pdf.split("/")[-1]
+    await run_blocking(
+        save_quotation_to_firestore,
+        codigo=filename.replace(".pdf", ""),
+        maquinaria_ids=[m["id"] for m in maquinarias],
+        maquinaria_nombres=[m["nombre"] for m in maquinarias],
+        precio_total=total,
+        pdf_url=pdf,
+        # Al generar PDF pasamos directo a CONTACTADO (Cotizado)
+        estado="CONTACTADO",
+        **cliente
+    )
+    # El PDF ya existe: recién ahora la cotización está generada
+    return [("document", pdf, filename, "✅ *Cotización Generada Exitosamente*")]
+
+
+async def _resolve_names(nombres: list) -> list:
+    """Productos pedidos por nombre, resueltos contra un mismo snapshot del catálogo."""
+    if not nombres:
+        return []
+    encontrados = []
+    for match in await run_blocking(resolve_maquinarias, nombres):
+        if match.item is None:
+            logger.warning(f"⚠️ Producto no encontrado: '{match.query}' (confianza {match.score:.2f})")
+        else:
+            encontrados.append(match.item)
+    return encontrados
 
 
-def execute_func(name: str, args: dict) -> dict:
-    """Ejecuta funciones."""
+async def execute_func(name: str, args: dict) -> dict:
+    """Ejecuta funciones. Firestore, ReportLab y Storage corren en el pool bloqueante."""
     logger.info(f"🔧 {name} → {args}")
     
     if name == "buscar_maquinaria":
-        resultados = search_maquinarias(args.get("consulta", ""), limit=6)
+        resultados = await run_blocking(search_maquinarias, args.get("consulta", ""), limit=6)
         if resultados:
             return {"success": True, "productos": [
                 {
@@ -478,17 +538,14 @@ def execute_func(name: str, args: dict) -> dict:
             nombres = [args.get("nombre_producto")]
             
         items_encontrados = []
-        for nombre in nombres:
-            resultados = search_maquinarias(nombre, limit=1)
-            if resultados:
-                m = resultados[0]
-                items_encontrados.append({
-                    "nombre": m["nombre"],
-                    "descripcion": m.get("descripcion", ""),
-                    "imagenes": m.get("imagenes", []),
-                    "ficha_tecnica_pdf": m.get("fichaTecnicaPdf", ""),
-                    "id": m["id"]
-                })
+        for m in await _resolve_names(nombres):
+            items_encontrados.append({
+                "nombre": m["nombre"],
+                "descripcion": m.get("descripcion", ""),
+                "imagenes": m.get("imagenes", []),
+                "ficha_tecnica_pdf": m.get("fichaTecnicaPdf", ""),
+                "id": m["id"]
+            })
         
         if items_encontrados:
             return {"success": True, "items": items_encontrados}
@@ -504,51 +561,38 @@ def execute_func(name: str, args: dict) -> dict:
         if not nombres and args.get("nombre_producto"):
             nombres = [args.get("nombre_producto")]
             
-        maquinarias_encontradas = []
-        for nombre in nombres:
-            res = search_maquinarias(nombre, limit=1)
-            if res:
-                maquinarias_encontradas.append(res[0])
+        maquinarias_encontradas = await _resolve_names(nombres)
         
         if not maquinarias_encontradas:
             return {"success": False, "mensaje": "No se encontraron los productos especificados"}
         
         # Calcular precio total referencia
         total = sum([m.get("precioReferencia", 0) for m in maquinarias_encontradas])
+        cliente = {
+            "cliente_nombre": args["cliente_nombre"],
+            "cliente_email": args["cliente_email"],
+            "cliente_telefono": args["cliente_telefono"]
+        }
         
-        pdf = generate_quotation_pdf(
-            cliente_nombre=args["cliente_nombre"],
-            cliente_email=args["cliente_email"],
-            cliente_telefono=args["cliente_telefono"],
-            maquinarias=maquinarias_encontradas
-        )
-        
-        if pdf:
-            save_quotation_to_firestore(
-                codigo=pdf.split("/")[-1].replace(".pdf", ""),
-                cliente_nombre=args["cliente_nombre"],
-                cliente_email=args["cliente_email"],
-                cliente_telefono=args["cliente_telefono"],
-                maquinaria_ids=[m["id"] for m in maquinarias_encontradas],
-                maquinaria_nombres=[m["nombre"] for m in maquinarias_encontradas],
-                precio_total=total,
-                pdf_url=pdf,
-                # Al generar PDF pasamos directo a CONTACTADO (Cotizado)
-                estado="CONTACTADO"
+        # El PDF (ReportLab + imágenes + Storage) se genera en segundo plano;
+        # el cliente recibe el resumen de inmediato y el documento al estar listo
+        return {
+            "success": True,
+            "nombres": [m["nombre"] for m in maquinarias_encontradas],
+            "precio_total": total,
+            "deferred": DeferredArtifact(
+                "quotation_pdf",
+                lambda: render_quotation(cliente, maquinarias_encontradas, total),
+                "⚠️ Tuve un problema generando el PDF de tu cotización. ¿Quieres que lo intente de nuevo?"
             )
-            return {
-                "success": True,
-                "pdf_url": pdf,
-                "nombres": [m["nombre"] for m in maquinarias_encontradas],
-                "precio_total": total
-            }
-        return {"success": False}
+        }
+
 
     elif name == "actualizar_estado_cotizacion":
         telefono = args.get("cliente_telefono")
         estado = args.get("nuevo_estado")
         
-        success = update_quotation_status(telefono, estado)
+        success = await run_blocking(update_quotation_status, telefono, estado)
         if success:
             messages = {
                 "NEGOCIANDO": "Perfecto, aplicaré ese descuento especial del 10% para avanzar. 🤝",
@@ -560,13 +604,15 @@ def execute_func(name: str, args: dict) -> dict:
             return {"success": False, "mensaje": "No encontré una cotización activa para actualizar."}
     
     elif name == "agendar_reunion":
-        # Usar teléfono del cliente actual si no se proporciona
-        telefono = args.get("cliente_telefono") or _current_client_phone
+        # Usar teléfono del cliente del turno si no se proporciona
+        turn = current_turn()
+        telefono = args.get("cliente_telefono") or (turn.client_phone if turn else None)
         email = args.get("cliente_email")
         horario = args.get("horario_preferido")
         tipo = args.get("tipo_reunion", "videollamada")
         
-        success = schedule_meeting(
+        success = await run_blocking(
+            schedule_meeting,
             phone=telefono,
             client_email=email,
             meeting_time=horario,
@@ -589,59 +635,311 @@ def execute_func(name: str, args: dict) -> dict:
     return {"success": False}
 
 
-# Variable global para el teléfono del cliente actual
-_current_client_phone = None
+MAX_PRODUCTOS_LISTA = 5
+
+# Señales del clasificador que indican que el cliente habla de algo ya mencionado
+# (no hace falta pre-búsqueda) o que menciona productos
+CONTEXT_SIGNALS = frozenset({"price", "photos", "quote", "discount"})
+PRODUCT_SIGNALS = frozenset({"product", "generic_product"})
+
+
+def render_search_results(productos: list) -> str:
+    """Respuesta a una búsqueda con resultados: solo nombres, en lista numerada."""
+    if len(productos) == 1:
+        intro = "¡Excelente! Tenemos esta opción disponible para ti: 🚜"
+    else:
+        intro = "¡Excelente! Tenemos estas opciones disponibles para ti: 🚜"
+    lista = "\n".join(
+        f"{i}. *{p['nombre']}*" for i, p in enumerate(productos[:MAX_PRODUCTOS_LISTA], start=1)
+    )
+    return f"{intro}\n\n{lista}\n\n💬 ¿Te interesa ver fotos o detalles de alguno de estos productos? Dime cuál."
+
+
+def render_items_description(items: list) -> str:
+    """Descripción de respaldo de los productos mostrados (si el modelo no respondió)."""
+    texto = ""
+    for item in items:
+        texto += f"📷 *{item['nombre']}*\n\n{item.get('descripcion', '')}\n\n"
+        if item.get('ficha_tecnica_pdf'):
+            texto += "📋 Incluye ficha técnica.\n\n"
+    texto += "💬 ¿Qué te parece? ¿Te gustaría saber más detalles?"
+    return texto
+
+
+async def continue_with_tool_results(model, prompt: str, model_content, responses: list,
+                                     site: str, temperature: float = 0.3) -> str:
+    """
+    Devuelve el resultado de las funciones al modelo en la misma conversación
+    (mensaje del usuario → function_calls del modelo → FunctionResponses) y
+    retorna el texto con que responde. "" si no hubo respuesta utilizable.
+
+    Args:
+        responses: [(nombre_funcion, payload)] en el orden de las llamadas
+    """
+    contents = get_backend().function_response_contents(prompt, model_content, responses)
+    try:
+        # Cuota y reintentos ante 429 los maneja el gateway
+        response = await generate(
+            model, contents, site,
+            generation_config={"temperature": temperature}
+        )
+        if not response.candidates:
+            return ""
+        return "".join(
+            part.text for part in response.candidates[0].content.parts
+            if hasattr(part, 'text') and part.text
+        ).strip()
+    except Exception as e:
+        logger.error(f"Error continuando tras {[name for name, _ in responses]}: {e}")
+        return ""
 
-def process_message(user_message: str, chat_history: list = None, client_phone: str = None) -> dict:
-    """Procesa mensaje."""
-    global _current_client_phone
-    _current_client_phone = client_phone
-    
+
+async def _timed_tool(name: str, args: dict) -> dict:
+    start = time.perf_counter()
+    status = "error"
     try:
-        # Load dynamic settings
-        bot_settings = get_bot_settings()
-        system_prompt = get_system_prompt(bot_settings.get("maxDiscount", 10))
-        
-        model = GenerativeModel("gemini-2.5-flash", system_instruction=[system_prompt], tools=[tools])
+        fr = await execute_func(name, args)
+        status = "ok" if fr.get("success") else "failed"
+        return fr
+    except asyncio.CancelledError:
+        status = "timeout"
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error ejecutando {name}: {e}")
+        return {"success": False, "error": str(e)}
+    finally:
+        TOOL_SECONDS.observe(time.perf_counter() - start, tool=name, status=status)
+
+
+async def run_tool_calls(calls: list) -> list:
+    """
+    Ejecuta en paralelo todas las funciones pedidas en una respuesta del modelo,
+    con un plazo común (TOOL_DEADLINE_SECONDS).
+
+    Returns:
+        Resultado de cada llamada, en el mismo orden de `calls`
+    """
+    if len(calls) > 1:
+        logger.info(f"⚡ {len(calls)} funciones en paralelo: {[name for name, _ in calls]}")
+    tasks = [asyncio.create_task(_timed_tool(name, args)) for name, args in calls]
+
+    done, pending = await asyncio.wait(tasks, timeout=settings.TOOL_DEADLINE_SECONDS)
+    for task in pending:
+        task.cancel()
+
+    results = []
+    for (name, _), task in zip(calls, tasks):
+        if task in done:
+            results.append(task.result())
+        else:
+            logger.error(f"⏱️ {name} excedió el plazo de {settings.TOOL_DEADLINE_SECONDS}s")
+            results.append({"success": False, "error": "timeout"})
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    return results
+
+
+def tool_outcome(name: str, args: dict, fr: dict) -> dict:
+    """
+    Traduce el resultado de una función a lo que se le envía al cliente.
+
+    Returns:
+        dict con text (determinista), images, documents, deferred (artefactos
+        en segundo plano) y, si el texto lo debe redactar el modelo,
+        model_payload/site/temperature/fallback
+    """
+    outcome = {
+        "text": "", "images": [], "documents": [], "deferred": [],
+        "model_payload": None, "site": None, "temperature": 0.3, "fallback": ""
+    }
+
+    if name == "buscar_maquinaria":
+        if fr.get("success"):
+            # Lista de nombres: no requiere redacción del modelo
+            outcome["text"] = render_search_results(fr["productos"])
+        else:
+            # Fallo la búsqueda exacta: el modelo redacta la recuperación
+            # con su contexto (system prompt + historial)
+            consulta = args.get("consulta", "lo que buscas")
+            outcome["model_payload"] = {"success": False, "consulta": consulta, "productos": []}
+            outcome["site"] = "fallback"
+            outcome["fallback"] = (
+                "🧐 No encontré eso exactamente en stock, pero cuéntame: ¿Para qué labor específica lo necesitas? "
+                "Quizás pueda recomendarte un modelo alternativo o explicarte qué buscar aunque no lo tenga yo."
+            )
+
+    elif name == "mostrar_imagenes_por_nombre":
+        if fr.get("success"):
+            items = fr.get("items", [])
+            # Retrocompatibilidad
+            if not items and "nombre" in fr:
+                items = [fr]
+
+            for item in items:
+                if item.get("imagenes"):
+                    outcome["images"].extend(item["imagenes"][:3])
+
+            # El modelo presenta los productos a partir de la respuesta de la función
+            # (sin URLs de imágenes, que no necesita leer)
+            outcome["model_payload"] = {
+                "success": True,
+                "fotos_enviadas": True,
+                "items": [
+                    {
+                        "nombre": item['nombre'],
+                        "descripcion": item.get('descripcion', ''),
+                        "tiene_ficha": bool(item.get('ficha_tecnica_pdf'))
+                    }
+                    for item in items
+                ]
+            }
+            outcome["site"] = "description"
+            outcome["temperature"] = 0.8
+            outcome["fallback"] = render_items_description(items)
+        else:
+            outcome["text"] = "😕 No tengo fotos disponibles de esos productos. ¿Podrías verificar el nombre?"
+
+    elif name == "generar_cotizacion":
+        if fr.get("success"):
+            # El PDF llega después, como artefacto diferido
+            if fr.get("deferred"):
+                outcome["deferred"].append(fr["deferred"])
+            
+            precio = f"${fr.get('precio_total', 0):,.0f}".replace(",", ".")
+            
+            nombres = fr.get("nombres", [])
+            if not nombres and "nombre" in fr:
+                # Retrocompatibilidad
+                nombres = [fr["nombre"]]
+            
+            lista_nombres = "\n• ".join([f"*{n}*" for n in nombres])
+            
+            outcome["text"] = (
+                f"⏳ Estoy preparando tu cotización…\n\n📄 Productos:\n• {lista_nombres}\n\n"
+                f"💰 Total Neto: {precio} + IVA\n\n📎 Te envío el PDF en unos segundos."
+            )
+        else:
+            outcome["text"] = "⚠️ Hubo un problema generando la cotización. Asegúrate de que los productos existen o intenta nuevamente."
+
+    elif name == "actualizar_estado_cotizacion":
+        if fr.get("success"):
+            outcome["text"] = fr["mensaje"]
+        else:
+            outcome["text"] = "⚠️ No pude actualizar el estado de la venta. Verifica que tengas una cotización previa."
+
+    elif name == "agendar_reunion":
+        if fr.get("success"):
+            email = fr.get("email", "")
+            telefono = fr.get("telefono", "")
+            horario = fr.get("horario", "")
+            tipo = fr.get("tipo", "videollamada")
+            
+            tipo_texto = "videollamada" if tipo == "videollamada" else "llamada telefónica"
+            
+            outcome["text"] = (
+                f"✅ *Reunión Agendada*\n\n"
+                f"📅 *Horario:* {horario}\n"
+                f"📞 *Tipo:* {tipo_texto}\n\n"
+                f"*Datos de contacto:*\n"
+                f"• *Correo:* {email}\n"
+                f"• *Teléfono:* {telefono}\n\n"
+                f"Nuestro equipo se pondrá en contacto contigo para confirmar la reunión.\n\n"
+                f"¡Gracias por tu confianza! 👋"
+            )
+        else:
+            outcome["text"] = fr.get("mensaje", "⚠️ Hubo un problema agendando la reunión. Por favor intenta nuevamente.")
+
+    return outcome
+
+
+# Modelo (prompt de sistema + tools) por backend y versión de configuración del bot.
+# Se construye una vez por versión y se reutiliza en todos los turnos.
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_agent_model(settings_version: int, bot_settings):
+    """Retorna el modelo del agente para la versión de settings, construyéndolo si no existe."""
+    backend = get_backend()
+    key = (backend, settings_version)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            system_prompt = get_system_prompt(bot_settings.get("maxDiscount", 10))
+            model = backend.model("gemini-2.5-flash", system_instruction=[system_prompt], tools=tools)
+            # Solo importa la versión vigente; las anteriores se descartan
+            _models.clear()
+            _models[key] = model
+            logger.info(f"🧠 Modelo del agente construido para settings v{settings_version}")
+    return model
+
+
+async def process_message(user_message: str, chat_history: list = None, client_phone: str = None,
+                          conversation_summary: str = None) -> dict:
+    """
+    Procesa mensaje (registra cuántas llamadas a Gemini hizo el turno).
+
+    Args:
+        chat_history: mensajes recientes aún no cubiertos por el resumen
+        conversation_summary: resumen de la conversación anterior (chats/{phone}.summary)
+    """
+    with count_turn_calls():
+        # Load dynamic settings (snapshot en memoria, actualizado por el listener)
+        settings_version, bot_settings = await get_settings_snapshot_async()
+        # Contexto del turno para las funciones (p. ej. teléfono al agendar)
+        token = _turn.set(TurnContext(client_phone, settings_version))
+        try:
+            # Preguntas sin estado repetidas ("qué máquinas tienen") se responden desde caché
+            # Solo al inicio de la conversación: el historial trae únicamente los mensajes de este
+            # turno (se guardan antes de cargarlo). Con más historial la respuesta es de este cliente
+            turn_lines = set(user_message.split("\n"))
+            fresh = not conversation_summary and all(
+                m.get("role") == "user" and m.get("content") in turn_lines for m in chat_history or []
+            )
+            cache_key = reply_cache.make_key(user_message, fresh, get_catalog_version(), settings_version)
+            if cache_key:
+                cached = reply_cache.lookup(cache_key)
+                if cached:
+                    logger.info(f"♻️ Respuesta desde caché ({cache_key.bucket[0]})")
+                    return cached
+
+            start = time.perf_counter()
+            result = await _process_message(
+                user_message, chat_history, conversation_summary, settings_version, bot_settings
+            )
+            if cache_key:
+                reply_cache.store(cache_key, result, time.perf_counter() - start)
+            return result
+        finally:
+            _turn.reset(token)
+
+
+async def _process_message(user_message: str, chat_history: list, conversation_summary: str,
+                           settings_version: int, bot_settings) -> dict:
+    try:
+        model = get_agent_model(settings_version, bot_settings)
         
-        history = "" 
-        if chat_history:
-            for msg in chat_history[-40:]:
-                role = "Usuario" if msg["role"] == "user" else "Asistente"
-                history += f"{role}: {msg['content']}\n"
+        # Resumen + mensajes recientes, dentro del presupuesto de tokens
+        history = format_history(conversation_summary, chat_history)
         
         # Detectar si el mensaje menciona productos para forzar búsqueda
         # Solo hacer pre-búsqueda si el usuario está buscando/preguntando por productos
-        # NO si solo pregunta precio/detalles de algo ya mencionado
-        message_lower = user_message.lower()
-        
-        # Palabras que indican que NO necesitamos buscar (ya hay contexto)
-        context_words = ["cuánto cuesta", "cuanto cuesta", "precio", "qué precio", "que precio", 
-                        "muéstrame", "muestrame", "fotos", "imágenes", "imagenes", "ver fotos",
-                        "cotización", "cotizacion", "descuento"]
-        
-        has_context = any(word in message_lower for word in context_words)
-        
-        # Palabras clave de productos
-        product_keywords = [
-            "tractor", "arado", "rastra", "fumigador", "cosechadora", "sembradora",
-            "cultivador", "subsolador", "máquina", "equipo", "implemento",
-            "carro", "remolque", "triturador", "fertilizador",
-            "preparación", "suelo", "cosecha", "transporte", "mantenimiento"
-        ]
-        
-        has_product_keyword = any(keyword in message_lower for keyword in product_keywords)
+        # NO si solo pregunta precio/fotos/cotización de algo ya mencionado
+        message_intent = classify_message(user_message)
+        has_context = bool(message_intent.signals & CONTEXT_SIGNALS)
+        has_product_keyword = bool(message_intent.signals & PRODUCT_SIGNALS)
         
         # Hacer pre-búsqueda solo si menciona productos Y no tiene contexto previo
         search_context = ""
         if has_product_keyword and not has_context and not history:
-            # Extraer términos clave del mensaje (remover palabras comunes)
-            search_term = message_lower
-            for remove in ["necesito", "busco", "quiero", "me interesa", "algo para", "un ", "una "]:
-                search_term = search_term.replace(remove, "")
-            search_term = search_term.strip()
+            # Mensaje sin palabras de relleno ("necesito", "busco", "un"...)
+            search_term = message_intent.search_term
             
-            pre_search_results = search_maquinarias(search_term)
+            pre_search_results = await run_blocking(search_maquinarias, search_term)
             
             if pre_search_results:
                 search_context = f"\n\n🔍 INFO DE INVENTARIO: Encontré {len(pre_search_results)} producto(s) relacionado(s) con '{search_term}': {[p['nombre'] for p in pre_search_results[:3]]}. Usa esta información."
@@ -650,211 +948,63 @@ def process_message(user_message: str, chat_history: list = None, client_phone:
         
         prompt = f"HISTORIAL:\n{history}\n\nMENSAJE: {user_message}{search_context}"
         
-        # Retry logic for main generation
-        response = None
-        for attempt in range(3):
-            try:
-                response = model.generate_content(prompt, generation_config=GenerationConfig(temperature=0.3))
-                break
-            except ResourceExhausted:
-                logger.warning(f"Quota exceeded (429). Retrying in {2**attempt}s...")
-                time.sleep(2**attempt)
-                if attempt == 2: raise
-        
-        if not response:
+        # Cuota y reintentos ante 429 los maneja el gateway
+        try:
+            response = await generate(model, prompt, "main", generation_config={"temperature": 0.3})
+        except ResourceExhausted:
             return {"text": "⚠️ El sistema está saturado. Por favor intenta en unos segundos."}
         
-        result = {"text": "", "images": [], "documents": []}
+        result = {"text": "", "images": [], "documents": [], "deferred": []}
         
         for candidate in response.candidates:
+            calls = []
             for part in candidate.content.parts:
-                if hasattr(part, 'text') and part.text:
+                if hasattr(part, 'function_call') and part.function_call:
+                    calls.append((part.function_call.name, dict(part.function_call.args)))
+                elif hasattr(part, 'text') and part.text:
                     result["text"] += part.text
-                
-                elif hasattr(part, 'function_call') and part.function_call:
-                    fc = part.function_call
-                    fr = execute_func(fc.name, dict(fc.args))
-                    
-                    if fc.name == "buscar_maquinaria":
-                        if fr.get("success"):
-                            productos = fr["productos"]
-                            # Convertir a texto para el modelo
-                            productos_txt = json.dumps(productos, ensure_ascii=False, indent=2)
-                            
-                            # Prompt secundario para que el modelo redacte la respuesta final
-                            summary_prompt = (
-                                f"CONTEXTO: El usuario preguntó '{user_message}'.\n"
-                                f"RESULTADO BÚSQUEDA: Se encontraron estos productos:\n{productos_txt}\n\n"
-                                f"INSTRUCCIÓN: Como vendedor experto, responde con calidez y entusiasmo (pero SIN presentarte de nuevo como asesor si ya hablaste).\n"
-                                f"1. Di algo como '¡Excelente! Tenemos estas opciones disponibles para ti:' o similar.\n"
-                                f"2. LISTA NUMERADA SOLO CON LOS NOMBRES de los productos (sin descripciones ni precios).\n"
-                                f"3. Si hay muchos > 5, selecciona los 5 más relevantes.\n"
-                                f"4. CIERRA OBLIGATORIAMENTE con: '💬 ¿Te interesa ver fotos o detalles de alguno de estos productos? Dime cuál.'\n"
-                                f"5. Usa emojis (🚜, 🌾) para dar calidez.\n"
-                            )
-                            
-                            try:
-                                # Retry logic for summary generation
-                                for attempt in range(3):
-                                    try:
-                                        summary_response = model.generate_content(summary_prompt, generation_config=GenerationConfig(temperature=0.7))
-                                        result["text"] = summary_response.text
-                                        break
-                                    except ResourceExhausted:
-                                        time.sleep(2**attempt)
-                            except Exception as e:
-                                logger.error(f"Error generando resumen: {e}")
-                                # Fallback básico por si falla la generación
-                                result["text"] = "🚜 *Productos encontrados:*\n\n"
-                                for p in productos:
-                                    precio = f"${p['precio']:,.0f}" if p['precio'] else "Consultar"
-                                    result["text"] += f"• *{p['nombre']}* - 💰 {precio}\n"
-                                result["text"] += "\n¿Te gustaría ver fotos o cotizar alguno?"
-
-                        else:
-                            # Fallo la búsqueda exacta, usamos inteligencia del modelo para recuperar la venta
-                            # Mantener lógica de recovery existente
-                            consulta = dict(fc.args).get("consulta", "lo que buscas")
-                            prompt_fallback = (
-                                f"Buscaste '{consulta}' en el inventario y NO hay resultados exactos.\n"
-                                f"Como vendedor experto, NO digas solo 'no hay'.\n"
-                                f"1. Dile que no tienes '{consulta}' exacto.\n"
-                                f"2. Pregúntale qué labor agrícola necesita hacer (fumigar, cosechar, triturar, etc.).\n"
-                                f"3. Ofrécele ver categorías generales (Cosecha, Fertilización, Transporte, Mantenimiento, Preparación de suelo).\n"
-                                f"4. Importante: Si buscó 'preparacion de suelo' u otro término técnico, explícale qué categorías podrían servirle (ej: Rastras, Arados).\n"
-                                f"Responde amable y proactivo, breve para WhatsApp."
-                            )
-                            try:
-                                recovery = model.generate_content(prompt_fallback)
-                                result["text"] = recovery.text
-                            except:
-                                result["text"] = "🧐 No encontré eso exactamente en stock, pero cuéntame: ¿Para qué labor específica lo necesitas? Quizás pueda recomendarte un modelo alternativo o explicarte qué buscar aunque no lo tenga yo."
-
-                    elif fc.name == "mostrar_imagenes_por_nombre":
-                        if fr.get("success"):
-                            items = fr.get("items", [])
-                            # Retrocompatibilidad
-                            if not items and "nombre" in fr:
-                                items = [fr]
-                            
-                            # Enviar imágenes
-                            for item in items:
-                                if item.get("imagenes"):
-                                    result["images"].extend(item["imagenes"][:3])
-                            
-                            # Generar descripción dinámica con el modelo
-                            items_info = []
-                            for item in items:
-                                items_info.append({
-                                    "nombre": item['nombre'],
-                                    "descripcion": item.get('descripcion', ''),
-                                    "tiene_ficha": bool(item.get('ficha_tecnica_pdf'))
-                                })
-                            
-                            items_json = json.dumps(items_info, ensure_ascii=False, indent=2)
-                            
-                            # Prompt para generar descripción natural y variada
-                            desc_prompt = (
-                                f"CONTEXTO: El cliente preguntó por maquinaria y le mostraste fotos.\n"
-                                f"PRODUCTOS MOSTRADOS:\n{items_json}\n\n"
-                                f"INSTRUCCIÓN: Como vendedor experto, presenta estos productos de forma natural y conversacional.\n"
-                                f"REGLAS IMPORTANTES:\n"
-                                f"- OBLIGATORIO: Menciona el nombre del producto y describe sus características principales con DETALLE\n"
-                                f"- PROHIBIDO usar líneas de separación (------) o guiones largos\n"
-                                f"- FORMATO: emoji 📷 + *Nombre del producto* en negritas, luego descripción DETALLADA (4-6 líneas)\n"
-                                f"- DESCRIPCIÓN DETALLADA debe incluir:\n"
-                                f"  * Función principal y usos específicos\n"
-                                f"  * Características técnicas relevantes (capacidades, medidas, materiales)\n"
-                                f"  * Beneficios concretos para el cliente\n"
-                                f"  * Opciones de configuración o adaptaciones disponibles\n"
-                                f"- Si hay ficha técnica, menciona '📋 Incluye ficha técnica con especificaciones completas'\n"
-                                f"- Varía tu estilo: entusiasta, técnico o consultivo (cambia cada vez)\n"
-                                f"- Usa emojis relevantes (🚜, 🌾, 💧, 🔧) para dar calidez\n"
-                                f"- Termina con UNA pregunta natural que invite a profundizar\n"
-                                f"- Ejemplos de cierres variados:\n"
-                                f"  * '¿Qué te parece? ¿Te gustaría saber el precio o tienes alguna duda técnica?'\n"
-                                f"  * '¿Calza con lo que necesitas o buscas algo con otras especificaciones?'\n"
-                                f"  * '¿Te interesa cotizar este equipo o quieres saber más detalles?'\n"
-                                f"  * '¿Alguna duda sobre cómo funciona o las capacidades?'\n"
-                                f"  * '¿Cómo lo ves para tu operación? ¿Qué capacidad necesitarías?'\n\n"
-                                f"IMPORTANTE: La descripción debe ser COMPLETA y DETALLADA, no superficial.\n"
-                                f"RESPONDE DIRECTO (sin presentarte de nuevo):"
-                            )
-                            
-                            try:
-                                desc_response = model.generate_content(desc_prompt, generation_config=GenerationConfig(temperature=0.8))
-                                if desc_response and desc_response.candidates and desc_response.candidates[0].content.parts:
-                                    result["text"] = desc_response.candidates[0].content.parts[0].text
-                                else:
-                                    # Fallback si falla la generación
-                                    texto_full = ""
-                                    for item in items:
-                                        texto_full += f"📷 *{item['nombre']}*\n\n{item.get('descripcion', '')}\n\n"
-                                        if item.get('ficha_tecnica_pdf'):
-                                            texto_full += "📋 Incluye ficha técnica.\n\n"
-                                    texto_full += "💬 ¿Qué te parece? ¿Te gustaría saber más detalles?"
-                                    result["text"] = texto_full
-                            except Exception as e:
-                                logger.error(f"Error generando descripción dinámica: {e}")
-                                # Fallback
-                                texto_full = ""
-                                for item in items:
-                                    texto_full += f"📷 *{item['nombre']}*\n\n{item.get('descripcion', '')}\n\n"
-                                    if item.get('ficha_tecnica_pdf'):
-                                        texto_full += "📋 Incluye ficha técnica.\n\n"
-                                texto_full += "💬 ¿Te interesa este equipo?"
-                                result["text"] = texto_full
-                        else:
-                            result["text"] = "😕 No tengo fotos disponibles de esos productos. ¿Podrías verificar el nombre?"
-                    
-                    elif fc.name == "generar_cotizacion":
-                        if fr.get("success"):
-                            # Extraer nombre del archivo PDF de la URL
-                            pdf_url = fr["pdf_url"]
-                            pdf_filename = pdf_url.split("/")[-1] if pdf_url else "Cotizacion.pdf"
-                            
-                            result["documents"].append({"url": pdf_url, "filename": pdf_filename})
-                            
-                            precio = f"${fr.get('precio_total', 0):,.0f}".replace(",", ".")
-                            
-                            nombres = fr.get("nombres", [])
-                            if not nombres and "nombre" in fr:
-                                # Retrocompatibilidad
-                                nombres = [fr["nombre"]]
-                            
-                            lista_nombres = "\n• ".join([f"*{n}*" for n in nombres])
-                            
-                            result["text"] = f"✅ *Cotización Generada Exitosamente*\n\n📄 Productos:\n• {lista_nombres}\n\n💰 Total Neto: {precio} + IVA"
-                        else:
-                            result["text"] = "⚠️ Hubo un problema generando la cotización. Asegúrate de que los productos existen o intenta nuevamente."
-                            
-                    elif fc.name == "actualizar_estado_cotizacion":
-                        if fr.get("success"):
-                            result["text"] = fr["mensaje"]
-                        else:
-                            result["text"] = "⚠️ No pude actualizar el estado de la venta. Verifica que tengas una cotización previa."
-                    
-                    elif fc.name == "agendar_reunion":
-                        if fr.get("success"):
-                            email = fr.get("email", "")
-                            telefono = fr.get("telefono", "")
-                            horario = fr.get("horario", "")
-                            tipo = fr.get("tipo", "videollamada")
-                            
-                            tipo_texto = "videollamada" if tipo == "videollamada" else "llamada telefónica"
-                            
-                            result["text"] = (
-                                f"✅ *Reunión Agendada*\n\n"
-                                f"📅 *Horario:* {horario}\n"
-                                f"📞 *Tipo:* {tipo_texto}\n\n"
-                                f"*Datos de contacto:*\n"
-                                f"• *Correo:* {email}\n"
-                                f"• *Teléfono:* {telefono}\n\n"
-                                f"Nuestro equipo se pondrá en contacto contigo para confirmar la reunión.\n\n"
-                                f"¡Gracias por tu confianza! 👋"
-                            )
-                        else:
-                            result["text"] = fr.get("mensaje", "⚠️ Hubo un problema agendando la reunión. Por favor intenta nuevamente.")
+            
+            if not calls:
+                continue
+            
+            # Todas las funciones pedidas en esta respuesta corren en paralelo
+            results = await run_tool_calls(calls)
+            outcomes = [tool_outcome(name, args, fr) for (name, args), fr in zip(calls, results)]
+            
+            # Las que necesitan redacción del modelo comparten una sola continuación,
+            # con la respuesta de cada función pedida (Gemini las exige todas)
+            model_text = ""
+            if any(o["model_payload"] is not None for o in outcomes):
+                model_text = await continue_with_tool_results(
+                    model, prompt, candidate.content,
+                    [
+                        (name, o["model_payload"] if o["model_payload"] is not None else {"success": True, "mensaje": o["text"]})
+                        for (name, _), o in zip(calls, outcomes)
+                    ],
+                    site=next(o["site"] for o in outcomes if o["model_payload"] is not None),
+                    temperature=max(o["temperature"] for o in outcomes if o["model_payload"] is not None)
+                )
+            
+            # Merge determinista, en el orden en que el modelo pidió las funciones
+            texts = []
+            model_text_used = False
+            for o in outcomes:
+                if o["model_payload"] is not None:
+                    if model_text and not model_text_used:
+                        texts.append(model_text)
+                        model_text_used = True
+                    elif not model_text:
+                        texts.append(o["fallback"])
+                elif o["text"]:
+                    texts.append(o["text"])
+                for url in o["images"]:
+                    if url not in result["images"]:
+                        result["images"].append(url)
+                result["documents"].extend(o["documents"])
+                result["deferred"].extend(o["deferred"])
+            
+            # Como antes, el resultado de las funciones reemplaza el texto libre del modelo
+            result["text"] = "\n\n".join(t for t in texts if t)
 
         if not result["text"]:
             result["text"] = "Error procesando. Intenta de nuevo."
@@ -0,0 +1,85 @@
+"""
+Caché en memoria LRU con expiración (TTL), segura entre threads.
+
+Las cachés con `name` se exportan en /metrics (hits, misses, hit ratio, tamaño).
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from app.services.metrics import gauge
+
+_named = {}
+
+
+class TTLCache:
+    """LRU acotada a `maxsize` entradas, cada una válida por `ttl` segundos."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, name: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        if name:
+            _named[name] = self
+
+    def get(self, key, default: Any = None) -> Any:
+        """Retorna el valor vigente o `default`, contando hit/miss."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value: Any, ttl: Optional[float] = None) -> None:
+        """Guarda un valor desalojando el menos usado si se excede el tamaño."""
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            return item[1] if item is not None else default
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            item = self._data.get(key)
+            return item is not None and item[0] > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+def _collect(field: str):
+    return lambda: {(name,): cache.stats()[field] for name, cache in list(_named.items())}
+
+
+gauge("cache_hits_total", "Lecturas de caché con valor vigente", ("cache",), _collect("hits"), kind="counter")
+gauge("cache_misses_total", "Lecturas de caché sin valor vigente", ("cache",), _collect("misses"), kind="counter")
+gauge("cache_hit_ratio", "Proporción de hits sobre lecturas", ("cache",), _collect("hit_ratio"))
+gauge("cache_entries", "Entradas en la caché", ("cache",), _collect("size"))
@@ -0,0 +1,190 @@
+"""
+Catálogo de maquinarias activas en memoria.
+
+Se carga una vez y se mantiene al día con un listener `on_snapshot` sobre la
+consulta `maquinarias where activa == True`, que aplica altas, cambios y
+bajas de a un documento. Cada cambio real publica un snapshot inmutable con
+una versión que solo sube; la caché de respuestas se indexa por esa versión.
+Sin listener se relee cada CATALOG_POLL_SECONDS (o, en scripts, al vencer
+CATALOG_CACHE_TTL_SECONDS); ver `live_snapshot`.
+
+Junto a cada ítem se guardan sus campos de búsqueda ya normalizados y
+tokenizados (SearchFields); se calculan una vez al cargar o cambiar el ítem,
+así una búsqueda solo normaliza la consulta. Cada snapshot trae además su
+índice invertido (app/services/search_index.py), armado con esos campos.
+
+Los ítems del snapshot son compartidos entre turnos y no se modifican.
+"""
+import logging
+import unicodedata
+from types import MappingProxyType
+from typing import FrozenSet, Mapping, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.services.firebase import db, count_firestore
+from app.services.live_snapshot import LiveSnapshot
+from app.services.metrics import gauge
+from app.services.search_index import FieldTerms, SearchIndex, analyze_field
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Elimina acentos y convierte a minúsculas."""
+    if not text:
+        return ""
+    return ''.join(c for c in unicodedata.normalize('NFD', text)
+                   if unicodedata.category(c) != 'Mn').lower().strip()
+
+
+class SearchFields(NamedTuple):
+    """Campos normalizados de un ítem del catálogo, para buscar sin renormalizar."""
+    item: dict
+    nombre: str
+    categoria: str
+    descripcion: str
+    tags: Tuple[str, ...]
+    nombre_tokens: FrozenSet[str]
+    terms: Mapping[str, FieldTerms]  # campo -> términos para el índice
+
+    @classmethod
+    def build(cls, item: dict) -> "SearchFields":
+        nombre = normalize_text(item.get("nombre", ""))
+        categoria = normalize_text(item.get("categoria", ""))
+        descripcion = normalize_text(item.get("descripcion", ""))
+        tags = tuple(normalize_text(tag) for tag in item.get("tags", []))
+        nombre_tokens = frozenset(nombre.split())
+        terms = MappingProxyType({
+            "nombre": analyze_field((nombre,)),
+            "tags": analyze_field(tags),
+            "categoria": analyze_field((categoria,)),
+            "descripcion": analyze_field((descripcion,)),
+        })
+        return cls(item, nombre, categoria, descripcion, tags, nombre_tokens, terms)
+
+
+class CatalogSnapshot(NamedTuple):
+    version: int
+    items: Tuple[dict, ...]
+    by_id: Mapping[str, dict]
+    fields: Tuple[SearchFields, ...]  # alineado con `items`
+    index: SearchIndex
+
+
+def _build_index(items: tuple, fields: tuple) -> SearchIndex:
+    return SearchIndex(items, [f.terms for f in fields])
+
+
+EMPTY_CATALOG = CatalogSnapshot(0, (), MappingProxyType({}), (), _build_index((), ()))
+
+
+def _query():
+    return db.collection("maquinarias").where("activa", "==", True)
+
+
+def _record(doc) -> dict:
+    data = doc.to_dict() or {}
+    data["id"] = doc.id
+    return data
+
+
+def _read_catalog() -> Optional[dict]:
+    """Lee todas las maquinarias activas (None si la lectura falló)."""
+    try:
+        by_id = {doc.id: _record(doc) for doc in _query().stream()}
+        count_firestore("maquinarias", "read", len(by_id))
+        return by_id
+    except Exception as e:
+        logger.error(f"Error leyendo catálogo de maquinarias: {e}")
+        return None
+
+
+def _publish(by_id: dict) -> CatalogSnapshot:
+    """Publica un snapshot nuevo (llamar con `_live.lock` tomado)."""
+    current = _live.current
+    version = (current.version if current else 0) + 1
+    # Orden por id, el mismo en que Firestore entrega la colección
+    items = tuple(by_id[key] for key in sorted(by_id))
+    # Solo se normalizan los ítems nuevos o cambiados
+    previous = {id(fields.item): fields for fields in current.fields} if current else {}
+    fields = tuple(previous.get(id(item)) or SearchFields.build(item) for item in items)
+    snapshot = _live.current = CatalogSnapshot(
+        version, items, MappingProxyType(by_id), fields, _build_index(items, fields)
+    )
+    logger.info(f"📦 Catálogo v{version}: {len(items)} maquinarias activas")
+    return snapshot
+
+
+def _apply_full(by_id: Optional[dict]) -> CatalogSnapshot:
+    """Reemplaza el catálogo completo si el contenido cambió."""
+    with _live.lock:
+        current = _live.current
+        if by_id is None:
+            # Lectura fallida: conservar lo que había; sin catálogo se reintenta en el próximo acceso
+            return current or EMPTY_CATALOG
+        if current is None or by_id != dict(current.by_id):
+            current = _publish(by_id)
+        _live.mark_fetched()
+        return current
+
+
+def _apply_changes(doc_snapshots, changes) -> None:
+    """Aplica altas, cambios y bajas del listener; publica solo si algo cambió."""
+    count_firestore("maquinarias", "read", len(changes))
+    with _live.lock:
+        current = _live.current
+        by_id = dict(current.by_id) if current else {}
+        changed = False
+        for change in changes:
+            doc = change.document
+            if change.type.name == "REMOVED":
+                changed |= by_id.pop(doc.id, None) is not None
+                continue
+            record = _record(doc)
+            if by_id.get(doc.id) != record:
+                by_id[doc.id] = record
+                changed = True
+        if changed or current is None:
+            _publish(by_id)
+
+
+_live = LiveSnapshot(
+    "catálogo",
+    read=lambda: _read_catalog(),
+    apply=_apply_full,
+    subscribe=lambda callback: _query().on_snapshot(callback),
+    on_change=_apply_changes,
+    poll_seconds=settings.CATALOG_POLL_SECONDS,
+    ttl_seconds=settings.CATALOG_CACHE_TTL_SECONDS,
+)
+
+
+def get_catalog_snapshot() -> CatalogSnapshot:
+    """
+    Catálogo activo vigente y su versión, sin ir a Firestore si está al día.
+
+    Returns:
+        CatalogSnapshot(version, items, by_id, fields, index); los ítems son de solo lectura
+    """
+    return _live.get()
+
+
+def get_catalog_version() -> int:
+    """Versión del catálogo activo; sube con cada alta, cambio o baja."""
+    snapshot = _live.current
+    return snapshot.version if snapshot else 0
+
+
+async def start_catalog_listener() -> None:
+    """Carga inicial, listener en vivo y polling de respaldo (startup de la app)."""
+    await _live.start()
+
+
+async def stop_catalog_listener() -> None:
+    """Detiene listener y polling (shutdown de la app)."""
+    await _live.stop()
+
+
+gauge("catalog_version", "Versión vigente del catálogo de maquinarias", source=lambda: {(): get_catalog_version()})
+gauge("catalog_items", "Maquinarias activas en memoria", source=lambda: {(): len(_live.current.items) if _live.current else 0})
+gauge("catalog_listener_active", "1 si el listener on_snapshot del catálogo está activo", source=lambda: {(): int(_live.listening)})
@@ -0,0 +1,144 @@
+"""
+Deduplicación de mensajes entrantes por ID de WhatsApp (wamid).
+
+Meta reenvía el mismo `messages[].id` cuando un turno tarda más que su
+timeout. Antes de guardar el mensaje o llamar al agente se reclama el ID:
+primero en una caché local TTL/LRU y luego en Firestore con `create()`,
+que falla si otra instancia ya lo reclamó.
+
+Cada reclamo guarda el token de la fila del spool que lo hizo (base, fila e
+instancia dueña). Un reintento de esa misma fila recupera su propio reclamo,
+también cuando lo retoma otra instancia porque el lease de la anterior venció
+(el spool le pasa el token del intento previo); cualquier otro evento con el
+mismo ID, aunque venga en el mismo lote reintentado, sigue siendo un duplicado.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from google.api_core.exceptions import AlreadyExists
+
+from app.core.config import settings
+from app.services.cache import TTLCache
+from app.services.firebase import db, count_firestore
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "mensajes_procesados"
+
+_seen = TTLCache(maxsize=settings.DEDUP_CACHE_SIZE, ttl=settings.DEDUP_TTL_SECONDS, name="dedup")
+_lock = threading.Lock()
+_stats = {"local_hits": 0, "store_hits": 0, "misses": 0, "store_errors": 0}
+
+
+def _stored_owner(doc_ref) -> str:
+    """Token de quien reclamó el mensaje en Firestore ("" si no se sabe)."""
+    try:
+        doc = doc_ref.get()
+        count_firestore(COLLECTION, "read")
+        return ((doc.to_dict() or {}).get("claim_token") or "") if doc.exists else ""
+    except Exception as e:
+        logger.error(f"Error leyendo reclamo de {doc_ref.id}: {e}")
+        return ""
+
+
+def _owns(owner: str, claim_token: str, previous_claim_token: str) -> bool:
+    return bool(owner) and owner in (claim_token, previous_claim_token)
+
+
+def _take_over(doc_ref, claim_token: str) -> None:
+    """Pasa el reclamo al token actual, para que los próximos reintentos lo reconozcan."""
+    try:
+        doc_ref.update({"claim_token": claim_token})
+        count_firestore(COLLECTION, "write")
+    except Exception as e:
+        logger.error(f"Error traspasando reclamo de {doc_ref.id}: {e}")
+
+
+def claim_message(message_id: str, phone: str = None, claim_token: str = None, retry: bool = False,
+                  previous_claim_token: str = None) -> bool:
+    """
+    Reclama un mensaje para procesarlo.
+
+    Args:
+        message_id: ID del mensaje de WhatsApp
+        phone: Teléfono del remitente
+        claim_token: identifica a quien reclama (fila del spool e instancia)
+        retry: True si es un reintento del spool; si el ID ya estaba reclamado
+            con `claim_token` o `previous_claim_token` no se trata como duplicado
+        previous_claim_token: token del intento anterior de la misma fila
+            (p.ej. la instancia que se reinició a mitad de turno)
+
+    Returns:
+        True si el mensaje es de quien lo reclama, False si es un duplicado
+    """
+    if not message_id:
+        return True
+
+    doc_ref = db.collection(COLLECTION).document(message_id)
+    owner = _seen.get(message_id)
+    if owner is not None:
+        if retry and _owns(owner, claim_token, previous_claim_token):
+            if owner != claim_token:
+                _take_over(doc_ref, claim_token)
+                _seen.set(message_id, claim_token)
+            return True
+        with _lock:
+            _stats["local_hits"] += 1
+        logger.info(f"🔁 Mensaje duplicado (caché local): {message_id}")
+        return False
+
+    now = datetime.now(timezone.utc)
+    record = {
+        "phone": phone,
+        "claim_token": claim_token,
+        "processed_at": now,
+        # Campo para la política TTL de Firestore
+        "expireAt": now + timedelta(seconds=settings.DEDUP_STORE_TTL_SECONDS)
+    }
+    try:
+        doc_ref.create(record)
+        count_firestore(COLLECTION, "write")
+    except AlreadyExists:
+        owner = _stored_owner(doc_ref)
+        if retry and _owns(owner, claim_token, previous_claim_token):
+            if owner != claim_token:
+                _take_over(doc_ref, claim_token)
+            _seen.set(message_id, claim_token)
+            return True
+        _seen.set(message_id, owner)
+        with _lock:
+            _stats["store_hits"] += 1
+        logger.info(f"🔁 Mensaje duplicado (Firestore): {message_id}")
+        return False
+    except Exception as e:
+        # Si Firestore falla preferimos responder dos veces que no responder
+        with _lock:
+            _stats["store_errors"] += 1
+        logger.error(f"Error registrando mensaje procesado {message_id}: {e}")
+
+    _seen.set(message_id, claim_token or "")
+    with _lock:
+        _stats["misses"] += 1
+    return True
+
+
+def forget_message(message_id: str) -> None:
+    """Libera un ID reclamado cuyo turno falló, para que el reintento se procese."""
+    if not message_id:
+        return
+    _seen.pop(message_id)
+    try:
+        db.collection(COLLECTION).document(message_id).delete()
+        count_firestore(COLLECTION, "delete")
+    except Exception as e:
+        logger.error(f"Error liberando mensaje {message_id}: {e}")
+
+
+def get_dedup_stats() -> dict:
+    """Contadores de hits (duplicados descartados) y misses (mensajes nuevos)."""
+    with _lock:
+        stats = dict(_stats)
+    stats["hits"] = stats["local_hits"] + stats["store_hits"]
+    stats["cache_size"] = len(_seen)
+    return stats
@@ -0,0 +1,200 @@
+"""
+Entrega de la respuesta del agente por WhatsApp.
+
+El texto sale apenas termina el agente. Lo lento (conversión de imágenes,
+PDF de cotización) viaja como artefactos diferidos: se producen en tareas de
+fondo que arrancan junto con el envío del texto y se entregan cuando están
+listos, siempre después del texto y en orden (imágenes antes que el PDF).
+Si un artefacto falla, el cliente recibe un aviso en vez de quedarse esperando.
+
+El turno espera a que se entreguen antes de terminar: así su fila del spool
+no se completa con un PDF pendiente, y el siguiente turno del mismo
+teléfono no se intercala con ellos.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+from app.services.executor import run_blocking
+from app.services.firebase import save_message_firestore
+from app.services.image_converter import webp_to_jpg
+from app.services.metrics import histogram
+from app.services.whatsapp import send_message, send_image, send_document
+
+logger = logging.getLogger(__name__)
+
+DEFERRED_SECONDS = histogram(
+    "deferred_artifact_seconds",
+    "Tiempo hasta entregar cada artefacto diferido (desde que arranca)",
+    labels=("kind", "status")
+)
+# Mismo histograma que las etapas del pipeline (el registro lo comparte):
+# la conversión de imágenes se mide aparte de su entrega
+TURN_STAGE_SECONDS = histogram(
+    "turn_stage_seconds",
+    "Duración de cada etapa del turno",
+    labels=("stage",)
+)
+
+
+class DeferredArtifact(NamedTuple):
+    """
+    Parte de la respuesta que se produce en segundo plano.
+
+    `produce()` retorna los ítems a enviar como (tipo, url, nombre, leyenda),
+    con tipo "image" o "document"; si falla o no retorna nada se envía `failure_text`.
+    """
+    kind: str
+    produce: Callable[[], Awaitable[list]]
+    failure_text: str
+
+
+
+async def prepare_images(image_urls: list) -> list:
+    """
+    Convierte todas las imágenes en paralelo a formato compatible con WhatsApp.
+
+    Returns:
+        URLs convertidas en el mismo orden de entrada, sin las que fallaron
+    """
+    start = time.perf_counter()
+    converted = await asyncio.gather(
+        *(run_blocking(webp_to_jpg, url) for url in image_urls),
+        return_exceptions=True
+    )
+    TURN_STAGE_SECONDS.observe(time.perf_counter() - start, stage="media-prep")
+
+    ready = []
+    for url, result in zip(image_urls, converted):
+        if isinstance(result, str) and result:
+            ready.append(result)
+        else:
+            logger.warning(f"⚠️ No se pudo convertir: {url}")
+    return ready
+
+
+def images_artifact(image_urls: list) -> DeferredArtifact:
+    """Fotos de productos: se convierten a JPG en segundo plano."""
+    async def produce() -> list:
+        logger.info(f"🔄 Convirtiendo {len(image_urls)} imágenes para WhatsApp...")
+        return [("image", url, "", "📷 Imagen del producto") for url in await prepare_images(image_urls)]
+
+    return DeferredArtifact(
+        "images", produce,
+        "😕 No pude preparar las fotos en este momento. ¿Quieres que lo intente de nuevo?"
+    )
+
+
+def deferred_artifacts(result: dict) -> list:
+    """Artefactos diferidos del resultado del agente (imágenes primero)."""
+    artifacts = []
+    if result.get("images"):
+        artifacts.append(images_artifact(result["images"]))
+    artifacts.extend(result.get("deferred", []))
+    return artifacts
+
+
+def _save_messages(phone: str, messages: list) -> None:
+    for content, kwargs in messages:
+        save_message_firestore(phone, "assistant", content, **kwargs)
+
+
+async def send_reply(phone: str, result: dict) -> list:
+    """
+    Envía el texto y los documentos ya listos del resultado, en ese orden.
+
+    Returns:
+        Mensajes a persistir como (contenido, kwargs), en orden de envío;
+        solo los que WhatsApp aceptó
+
+    Raises:
+        RuntimeError: si no se pudo enviar el texto; el spool reintenta el turno
+    """
+    sent = []
+    if result.get("text"):
+        if not await send_message(phone, result["text"]):
+            raise RuntimeError(f"No se pudo enviar la respuesta a {phone}")
+        sent.append((result["text"], {}))
+
+    # Documentos (PDFs). El texto ya salió: reintentar el turno lo duplicaría
+    for doc in result.get("documents", []):
+        filename = doc.get("filename", "Documento.pdf")
+        if await send_document(phone, doc["url"], filename=filename):
+            sent.append((f"📄 {filename}", {"msg_type": "document", "media_url": doc["url"]}))
+        else:
+            logger.error(f"❌ Falló envío de documento: {doc['url']}")
+    return sent
+
+
+async def persist_reply(phone: str, sent: list) -> None:
+    """Guarda lo enviado en un solo viaje al pool bloqueante, conservando el orden."""
+    if sent:
+        await run_blocking(_save_messages, phone, sent)
+
+
+async def _send_items(phone: str, items: list) -> list:
+    sent = []
+    for kind, url, filename, caption in items:
+        if kind == "image":
+            logger.info(f"📤 Enviando imagen: {url}")
+            if await send_image(phone, url, caption=caption):
+                sent.append(("📷 Imagen enviada", {"msg_type": "image", "media_url": url}))
+            else:
+                logger.error(f"❌ Falló envío de imagen: {url}")
+        elif kind == "document":
+            if await send_document(phone, url, filename=filename, caption=caption):
+                sent.append((f"📄 {filename}", {"msg_type": "document", "media_url": url}))
+            else:
+                logger.error(f"❌ Falló envío de documento: {url}")
+    return sent
+
+
+async def _deliver_artifact(phone: str, artifact: DeferredArtifact, after: Optional[asyncio.Event],
+                            delivered: asyncio.Event) -> None:
+    start = time.perf_counter()
+    status = "failed"
+    sent = []
+    try:
+        items = await artifact.produce()
+        # Nunca antes del texto del turno ni del artefacto anterior
+        if after is not None:
+            await after.wait()
+        sent = await _send_items(phone, items)
+        if sent:
+            status = "ok"
+    except Exception as e:
+        logger.error(f"❌ Artefacto {artifact.kind} de {phone} falló: {e}", exc_info=True)
+        if after is not None:
+            await after.wait()
+
+    try:
+        if status != "ok":
+            await send_message(phone, artifact.failure_text)
+            sent.append((artifact.failure_text, {}))
+        await persist_reply(phone, sent)
+    except Exception as e:
+        logger.error(f"Error entregando artefacto {artifact.kind} de {phone}: {e}")
+    finally:
+        DEFERRED_SECONDS.observe(time.perf_counter() - start, kind=artifact.kind, status=status)
+        delivered.set()
+
+
+def start_deferred(phone: str, artifacts: list, after: Optional[asyncio.Event] = None) -> list:
+    """
+    Arranca la producción de todos los artefactos en paralelo; se entregan en
+    orden (imágenes antes que el PDF), cada uno después del anterior.
+
+    Args:
+        after: evento que se marca cuando salió el texto; los artefactos esperan a él
+
+    Returns:
+        Tareas de entrega; el turno las espera antes de darse por terminado
+    """
+    tasks = []
+    previous = after
+    for artifact in artifacts:
+        delivered = asyncio.Event()
+        tasks.append(asyncio.create_task(_deliver_artifact(phone, artifact, previous, delivered)))
+        previous = delivered
+    return tasks
@@ -0,0 +1,21 @@
+"""
+Executor acotado para llamadas bloqueantes (Firestore, Cloud Storage, ReportLab)
+desde código async, sin congelar el event loop de uvicorn.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.core.config import settings
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.BLOCKING_IO_WORKERS,
+    thread_name_prefix="blocking-io"
+)
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Ejecuta `func(*args, **kwargs)` en el pool de I/O bloqueante y espera su resultado."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
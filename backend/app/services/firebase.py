@@ -9,6 +9,7 @@ from firebase_admin import credentials, firestore
 logger = logging.getLogger(__name__)
 
 from app.core.config import settings
+from app.services.metrics import counter
 
 # Inicializar Firebase (solo una vez)
 if not firebase_admin._apps:
@@ -21,6 +22,18 @@ if not firebase_admin._apps:
 # Obtener cliente (usa la app inicializada arriba por defecto)
 db = firestore.client()
 
+FIRESTORE_OPS = counter(
+    "firestore_operations_total",
+    "Documentos leídos y escritos en Firestore por colección",
+    labels=("collection", "op")
+)
+
+
+def count_firestore(collection: str, op: str, n: int = 1) -> None:
+    """Registra `n` documentos leídos (op="read") o escritos (op="write"/"delete")."""
+    if n:
+        FIRESTORE_OPS.inc(n, collection=collection, op=op)
+
 
 def save_message_firestore(phone: str, role: str, content: str, msg_type: str = "text", media_url: str = None) -> None:
     """Guarda un mensaje en Firestore"""
@@ -35,6 +48,7 @@ def save_message_firestore(phone: str, role: str, content: str, msg_type: str =
             "agentePausado": False,
             "unread": role == "user"
         }, merge=True)
+        count_firestore("chats", "write")
         
         # Datos del mensaje
         msg_data = {
@@ -54,6 +68,7 @@ def save_message_firestore(phone: str, role: str, content: str, msg_type: str =
         
         # Ahora guardar el mensaje en la subcolección
         chat_ref.collection("messages").add(msg_data)
+        count_firestore("messages", "write")
         
         logger.info(f"💾 Mensaje guardado: {phone} - {role} ({msg_type})")
     except Exception as e:
@@ -89,6 +104,7 @@ def get_chat_history_firestore(phone: str, limit: int = 50) -> list:
                 "content": content
             })
         
+        count_firestore("messages", "read", len(messages))
         return list(reversed(messages))
     except Exception as e:
         logger.error(f"Error obteniendo historial: {e}")
@@ -203,6 +219,7 @@ def schedule_meeting(phone: str, client_email: str, meeting_time: str, meeting_t
         }
         
         meeting_ref.set(meeting_data)
+        count_firestore("meetings", "write")
         
         logger.info(f"📅 Reunión agendada: {phone} - {meeting_time} → {scheduled_at.strftime('%Y-%m-%d %H:%M')} Chile ({scheduled_at_utc.strftime('%Y-%m-%d %H:%M')} UTC) ({meeting_type})")
         return True
@@ -248,6 +265,7 @@ def get_all_meetings(status_filter: str = None, limit: int = 100) -> list:
             
             meetings.append(meeting_data)
         
+        count_firestore("meetings", "read", len(meetings))
         return meetings
     except Exception as e:
         logger.error(f"Error obteniendo reuniones: {e}")
@@ -258,6 +276,7 @@ def get_meeting_by_id(meeting_id: str) -> dict:
     """Obtiene una reunión específica por ID."""
     try:
         doc = db.collection("meetings").document(meeting_id).get()
+        count_firestore("meetings", "read")
         
         if doc.exists:
             meeting_data = doc.to_dict()
@@ -295,6 +314,7 @@ def update_meeting_status(meeting_id: str, new_status: str) -> bool:
         db.collection("meetings").document(meeting_id).update({
             "status": new_status
         })
+        count_firestore("meetings", "write")
         
         logger.info(f"📅 Estado de reunión {meeting_id} actualizado a: {new_status}")
         return True
@@ -315,6 +335,7 @@ def add_meeting_notes(meeting_id: str, notes: str) -> bool:
         db.collection("meetings").document(meeting_id).update({
             "notes": notes
         })
+        count_firestore("meetings", "write")
         
         logger.info(f"📝 Notas agregadas a reunión {meeting_id}")
         return True
@@ -0,0 +1,99 @@
+"""
+Cliente HTTP compartido para la Graph API de WhatsApp.
+
+Un único httpx.AsyncClient con pool keep-alive (y HTTP/2 si `h2` está
+instalado) para todos los envíos, en vez de un handshake TLS por llamada.
+Se crea al iniciar la app y se cierra al apagarla.
+
+Cada llamada se cuenta por tipo (text, image, document, ...) y los errores
+por tipo y motivo (código HTTP o excepción) para /metrics.
+"""
+import logging
+from typing import Optional
+
+import httpx
+
+from app.core.config import settings
+from app.services.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+GRAPH_API_URL = "https://graph.facebook.com/v18.0"
+
+_client: Optional[httpx.AsyncClient] = None
+
+GRAPH_REQUESTS = counter(
+    "graph_api_requests_total",
+    "Llamadas a la Graph API por tipo",
+    labels=("type",)
+)
+GRAPH_ERRORS = counter(
+    "graph_api_errors_total",
+    "Llamadas fallidas a la Graph API por tipo y motivo",
+    labels=("type", "reason")
+)
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        timeout=httpx.Timeout(settings.GRAPH_TIMEOUT_SECONDS, connect=settings.GRAPH_CONNECT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=settings.GRAPH_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GRAPH_MAX_KEEPALIVE,
+            keepalive_expiry=settings.GRAPH_KEEPALIVE_SECONDS
+        )
+    )
+
+
+async def start_http_client() -> None:
+    """Crea el cliente compartido (startup de la app)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+        logger.info(f"🌐 Cliente Graph API listo (HTTP/2: {HTTP2_AVAILABLE})")
+
+
+async def close_http_client() -> None:
+    """Cierra el cliente compartido y sus conexiones (shutdown de la app)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Retorna el cliente compartido, creándolo si la app no pasó por startup (scripts)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+def graph_headers(json_body: bool = True) -> dict:
+    """Headers de autenticación para la Graph API."""
+    headers = {"Authorization": f"Bearer {settings.META_TOKEN}"}
+    if json_body:
+        headers["Content-Type"] = "application/json"
+    return headers
+
+
+def record_graph_call(kind: str, error: Optional[Exception] = None, status_code: Optional[int] = None,
+                      reason: Optional[str] = None) -> None:
+    """Cuenta una llamada a la Graph API y, si falló, su motivo."""
+    GRAPH_REQUESTS.inc(type=kind)
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+    if reason is None:
+        if status_code is not None and status_code >= 400:
+            reason = f"http_{status_code}"
+        elif error is not None:
+            reason = type(error).__name__
+    if reason:
+        GRAPH_ERRORS.inc(type=kind, reason=reason)
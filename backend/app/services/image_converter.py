@@ -15,6 +15,17 @@ logger = logging.getLogger(__name__)
 BUCKET_NAME = "venta-maquinarias-cotizaciones"
 CONVERTED_IMAGES_FOLDER = "imagenes_convertidas"
 
+# Reutilizados entre conversiones (las conversiones corren en paralelo en el pool bloqueante)
+_session = requests.Session()
+_bucket = None
+
+
+def _get_bucket():
+    global _bucket
+    if _bucket is None:
+        _bucket = storage.Client().bucket(BUCKET_NAME)
+    return _bucket
+
 
 def webp_to_jpg(webp_url: str) -> str:
     """
@@ -38,7 +49,7 @@ def webp_to_jpg(webp_url: str) -> str:
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
-        response = requests.get(webp_url, headers=headers, timeout=15)
+        response = _session.get(webp_url, headers=headers, timeout=15)
         response.raise_for_status()
         
         # Abrir con Pillow
@@ -68,9 +79,7 @@ def webp_to_jpg(webp_url: str) -> str:
         jpg_buffer.seek(0)
         
         # Subir a Cloud Storage
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(BUCKET_NAME)
-        blob = bucket.blob(jpg_filename)
+        blob = _get_bucket().blob(jpg_filename)
         
         # Verificar si ya existe (cache)
         if blob.exists():
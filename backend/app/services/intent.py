@@ -0,0 +1,189 @@
+"""
+Pre-clasificador de intención de los mensajes del cliente.
+
+Las frases de cada señal (saludo, precio, fotos, cotización, reunión,
+productos, catálogo, etc.) se compilan al importar en una tabla de frases
+por palabras. El mensaje normalizado (minúsculas, sin acentos ni
+puntuación) se recorre una sola vez tomando en cada posición la frase más
+larga que calce, al estilo Aho-Corasick sobre palabras. Con las señales
+encontradas se decide la intención y el término para la pre-búsqueda del
+agente, y la caché de respuestas decide si el mensaje es cacheable.
+
+Las listas de palabras viven acá; agregar un sinónimo es agregarlo a su grupo.
+"""
+import re
+import unicodedata
+from typing import FrozenSet, NamedTuple, Tuple
+
+# Señal -> frases ya normalizadas. "a|b" declara variantes de la misma palabra
+# (plurales) y "prefijo*" calza cualquier palabra que empiece así.
+SIGNALS = {
+    "personal": ["mi nombre", "mi correo", "mi email", "mi mail"],
+    "schedule": ["agend*", "reunion|reuniones", "videollamada|videollamadas", "llamada|llamadas"],
+    "quote": ["cotiz*"],
+    "discount": ["descuento|descuentos", "rebaja|rebajas"],
+    "purchase": ["compro", "comprar", "comprarlo", "comprarla"],
+    "photos": [
+        "ver foto|fotos", "foto|fotos", "fotografia|fotografias", "imagen|imagenes", "muestrame*", "mostrar*",
+    ],
+    "price": ["cuanto cuesta|cuestan", "cuanto vale|valen", "que precio", "precio|precios", "valor"],
+    "details": ["caracteristicas", "medidas", "capacidad", "especificaciones", "ficha tecnica"],
+    "catalog": [
+        "que maquinas", "que maquinaria", "catalogo|catalogos", "que tienen", "que venden", "que productos",
+        "todas las maquinas", "lista de", "todo lo que tienen", "maquinas disponibles",
+    ],
+    "info": [
+        "horario|horarios", "atencion", "direccion", "ubicacion", "donde estan", "donde quedan",
+        "sucursal|sucursales", "despacho", "envio|envios", "formas de pago", "medios de pago", "contacto",
+    ],
+    "product": [
+        "tractor|tractores", "arado|arados", "rastra|rastras", "fumigador|fumigadores|fumigadora|fumigadoras",
+        "nebulizador|nebulizadores", "cosechadora|cosechadoras", "sembradora|sembradoras",
+        "cultivador|cultivadores", "subsolador|subsoladores", "carro|carros", "aljibe|aljibes",
+        "remolque|remolques", "triturador|trituradores|trituradora|trituradoras",
+        "fertilizador|fertilizadores|fertilizadora|fertilizadoras", "fertilizante|fertilizantes",
+        "pala|palas", "coloso|colosos", "acoplado|acoplados", "desbrozadora|desbrozadoras",
+    ],
+    "generic_product": [
+        "maquina|maquinas", "maquinaria", "equipo|equipos", "implemento|implementos", "preparacion", "suelo",
+        "cosecha", "transporte", "mantenimiento",
+    ],
+    "referential": [
+        "ese", "esa", "este", "esta", "eso", "esto", "esos", "esas", "estos", "estas", "aquel", "aquella",
+        "anterior", "mismo", "misma", "primero", "primera", "segundo", "segunda", "tercero", "tercera",
+        "ultimo", "ultima", "otro", "otra", "ambos", "tambien",
+    ],
+    "greeting": [
+        "hola", "holi", "ola", "alo", "buenas", "buenos", "buen dia", "dias", "tardes", "noches", "saludos",
+    ],
+    # Relleno que se quita del término de pre-búsqueda
+    "filler": ["necesito", "busco", "quiero", "me interesa", "algo para", "un", "una"],
+}
+
+# Intención principal, de la más a la menos específica
+PRIORITY = ("schedule", "quote", "photos", "discount", "price", "details", "catalog", "info", "product", "greeting")
+
+
+def _build_tables() -> tuple:
+    """
+    Returns:
+        (frase en palabras -> señal, primera palabra -> largo máximo de sus
+        frases, prefijo -> señal)
+    """
+    phrases = {}
+    starts = {}
+    prefixes = {}
+    for signal, entries in SIGNALS.items():
+        for entry in entries:
+            if entry.endswith("*"):
+                prefixes.setdefault(entry[:-1], signal)
+                continue
+            # "ver foto|fotos": la última palabra admite variantes
+            *head, last = entry.split(" ")
+            for variant in last.split("|"):
+                words = tuple(head + [variant])
+                phrases.setdefault(words, signal)
+                starts[words[0]] = max(starts.get(words[0], 0), len(words))
+    return phrases, starts, prefixes
+
+
+_PHRASES, _STARTS, _PREFIXES = _build_tables()
+_PREFIX_LENGTHS = sorted({len(prefix) for prefix in _PREFIXES}, reverse=True)
+
+# Puntuación ASCII -> espacio; fuera de ASCII, todo lo que no sea una marca de
+# acento (¿, ¡, emojis) también es separador
+_PUNCTUATION = str.maketrans({
+    chr(c): " " for c in range(128)
+    if not (chr(c).isalnum() or chr(c) in "@ ")
+})
+_NON_ASCII_SEPARATOR = re.compile(r"[^\x00-\x7f\u0300-\u036f]+")
+
+
+class Intent(NamedTuple):
+    intent: str
+    products: Tuple[str, ...]
+    signals: FrozenSet[str]
+    search_term: str
+    greeting_only: bool
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sin acentos ni puntuación, espacios colapsados (ñ -> n)."""
+    text = text or ""
+    if not text.isascii():
+        text = _NON_ASCII_SEPARATOR.sub(" ", unicodedata.normalize("NFD", text))
+        text = text.encode("ascii", "ignore").decode("ascii")
+    return " ".join(text.lower().translate(_PUNCTUATION).split())
+
+
+def canonical_product(term: str) -> str:
+    """Producto en singular (tractores -> tractor, arados -> arado)."""
+    if term.endswith("ores"):
+        return term[:-2]
+    if term.endswith("s"):
+        return term[:-1]
+    return term
+
+
+def classify_normalized(normalized: str) -> Intent:
+    """Como `classify_message`, para un texto ya pasado por `normalize`."""
+    words = normalized.split()
+    signals = set()
+    products = set()
+    kept = []
+    greeting_words = 0
+
+    i = 0
+    while i < len(words):
+        word = words[i]
+        signal = None
+        size = 1
+        # Frase más larga que empiece en esta palabra
+        longest = _STARTS.get(word, 0)
+        for size in range(min(longest, len(words) - i), 0, -1):
+            signal = _PHRASES.get(tuple(words[i:i + size]) if size > 1 else (word,))
+            if signal:
+                break
+        if signal is None:
+            size = 1
+            for length in _PREFIX_LENGTHS:
+                signal = _PREFIXES.get(word[:length])
+                if signal:
+                    break
+
+        if signal is None:
+            kept.append(words[i])
+        else:
+            signals.add(signal)
+            if signal == "product":
+                products.add(canonical_product(words[i]))
+            elif signal == "catalog" and any(w.startswith("maquin") for w in words[i:i + size]):
+                signals.add("generic_product")
+            elif signal == "greeting":
+                greeting_words += size
+            if signal != "filler":
+                kept.extend(words[i:i + size])
+        i += size
+
+    intent = next((name for name in PRIORITY if name in signals), "other")
+    if intent == "product":
+        intent = "search"
+    return Intent(
+        intent=intent,
+        products=tuple(sorted(products)),
+        signals=frozenset(signals),
+        search_term=" ".join(kept),
+        greeting_only=bool(words) and greeting_words == len(words)
+    )
+
+
+def classify_message(text: str) -> Intent:
+    """
+    Intención principal, productos mencionados y señales del mensaje.
+
+    Returns:
+        Intent(intent, products, signals, search_term, greeting_only); intent es
+        una de schedule, quote, photos, discount, price, details, catalog, info,
+        search, greeting u other
+    """
+    return classify_normalized(normalize(text))
@@ -0,0 +1,143 @@
+"""
+Datos de Firestore en memoria, al día con un listener `on_snapshot`.
+
+Lo comparten la configuración del bot (app/services/settings.py) y el
+catálogo de maquinarias (app/services/catalog.py). Cada módulo decide cómo
+lee, aplica y publica su snapshot inmutable; `LiveSnapshot` se encarga de
+mantenerlo fresco:
+
+- Un listener `on_snapshot` aplica los cambios apenas ocurren.
+- Si el listener no está activo, una tarea de polling relee los datos cada
+  `poll_seconds` y reintenta suscribirse.
+- Sin listener ni polling (scripts), el snapshot vence a los `ttl_seconds`
+  y se relee en el siguiente acceso.
+
+Los lectores no toman locks: leen `current`, una referencia que el módulo
+dueño reemplaza entera (con `lock` tomado) al publicar.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from app.services.executor import run_blocking
+
+logger = logging.getLogger(__name__)
+
+
+class LiveSnapshot:
+    """
+    Frescura, listener y polling de respaldo de un snapshot en memoria.
+
+    Args:
+        name: nombre para los logs ("catálogo", "configuración")
+        read: lectura completa desde Firestore (None si falló)
+        apply: aplica una lectura completa y retorna el snapshot vigente;
+            debe llamar a `mark_fetched()` si la lectura fue válida
+        subscribe: registra el callback del listener y retorna el Watch
+        on_change: aplica un evento del listener (corre en un hilo de Firestore)
+    """
+
+    def __init__(self, name: str, read: Callable[[], Optional[Any]], apply: Callable[[Optional[Any]], Any],
+                 subscribe: Callable[[Callable], Any], on_change: Callable[[list, list], None],
+                 poll_seconds: float, ttl_seconds: float):
+        self.name = name
+        self._read = read
+        self._apply = apply
+        self._subscribe = subscribe
+        self._on_change = on_change
+        self.poll_seconds = poll_seconds
+        self.ttl_seconds = ttl_seconds
+
+        self.current = None
+        self.lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._fetched_at = 0.0
+        self._watch = None
+        self.listening = False
+        self._poll_task = None
+
+    def mark_fetched(self) -> None:
+        """Registra una lectura completa válida (reinicia el TTL)."""
+        self._fetched_at = time.monotonic()
+
+    def is_fresh(self) -> bool:
+        if self.current is None:
+            return False
+        if self.listening or self._poll_task is not None:
+            return True
+        return time.monotonic() - self._fetched_at < self.ttl_seconds
+
+    def get(self) -> Any:
+        """Snapshot vigente, releyendo Firestore solo si venció."""
+        if self.is_fresh():
+            return self.current
+        # Una sola relectura aunque lleguen varios turnos con el snapshot vencido
+        with self._load_lock:
+            if self.is_fresh():
+                return self.current
+            return self._apply(self._read())
+
+    async def get_async(self) -> Any:
+        """Igual que get, pero la lectura (si hace falta) va al pool bloqueante."""
+        if self.is_fresh():
+            return self.current
+        return await run_blocking(self.get)
+
+    def _on_snapshot(self, doc_snapshots, changes, read_time) -> None:
+        """Callback del listener (corre en un hilo de Firestore)."""
+        self._on_change(doc_snapshots, changes)
+        self.listening = True
+
+    def _start_watch(self) -> bool:
+        try:
+            self._watch = self._subscribe(self._on_snapshot)
+            return True
+        except Exception as e:
+            logger.error(f"⚠️ No se pudo iniciar listener de {self.name}: {e}")
+            self._watch = None
+            self.listening = False
+            return False
+
+    def _watch_alive(self) -> bool:
+        # El Watch de Firestore se cierra solo ante errores no recuperables
+        return self._watch is not None and getattr(self._watch, "is_active", True)
+
+    async def _poll_loop(self) -> None:
+        """Mientras el listener no esté activo, relee los datos y reintenta suscribirse."""
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            if self._watch_alive() and self.listening:
+                continue
+            self.listening = False
+            try:
+                self._apply(await run_blocking(self._read))
+                if not self._watch_alive():
+                    await run_blocking(self._start_watch)
+            except Exception as e:
+                logger.error(f"Error en polling de {self.name}: {e}")
+
+    async def start(self) -> None:
+        """Carga inicial, listener en vivo y polling de respaldo (startup de la app)."""
+        self._apply(await run_blocking(self._read))
+        await run_blocking(self._start_watch)
+        if self._poll_task is None:
+            self._poll_task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self) -> None:
+        """Detiene listener y polling (shutdown de la app)."""
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+            self._poll_task = None
+        if self._watch is not None:
+            try:
+                self._watch.unsubscribe()
+            except Exception:
+                pass
+            self._watch = None
+        self.listening = False
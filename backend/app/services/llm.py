@@ -0,0 +1,253 @@
+"""
+Gateway compartido para las llamadas a Gemini.
+
+Todas las llamadas (agente, transcripción, resúmenes) pasan por `generate()`:
+
+- Cuota local de requests y tokens por minuto (token bucket, LLM_RPM /
+  LLM_TPM). Los tokens se estiman antes de la llamada y se corrigen con
+  `usage_metadata` al terminar.
+- Carriles de prioridad: los turnos de clientes (PRIORITY_CUSTOMER) pasan
+  antes que el trabajo en segundo plano (PRIORITY_BACKGROUND) cuando hay cola.
+- Reintentos ante 429 (ResourceExhausted) con backoff exponencial con
+  jitter, sin bloquear el event loop.
+
+Cada llamada queda registrada por sitio de origen (main, description,
+fallback, transcription, conversation_summary): cantidad y resultado,
+latencia, reintentos, tokens y espera en cola, expuestos en /metrics.
+Además, cuántas llamadas hace cada turno del agente (`llm_calls_per_turn`).
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from google.api_core.exceptions import ResourceExhausted
+
+from app.core.config import settings
+from app.services.metrics import counter, histogram, gauge
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CUSTOMER = 0
+PRIORITY_BACKGROUND = 1
+LANES = {PRIORITY_CUSTOMER: "customer", PRIORITY_BACKGROUND: "background"}
+
+# Estimación para partes sin texto (audio, function calls/responses)
+NON_TEXT_PART_TOKENS = 500
+
+GEMINI_CALLS = counter(
+    "gemini_calls_total",
+    "Llamadas a Gemini por sitio y resultado",
+    labels=("site", "status")
+)
+GEMINI_SECONDS = histogram(
+    "gemini_call_seconds",
+    "Latencia de las llamadas a Gemini",
+    labels=("site",)
+)
+GEMINI_RETRIES = counter(
+    "gemini_retries_total",
+    "Reintentos por cuota agotada (429)",
+    labels=("site",)
+)
+GEMINI_TOKENS = counter(
+    "gemini_tokens_total",
+    "Tokens consumidos según usage_metadata",
+    labels=("site",)
+)
+LLM_QUEUE_WAIT = histogram(
+    "llm_queue_wait_seconds",
+    "Espera por cuota local antes de llamar a Gemini",
+    labels=("lane",)
+)
+LLM_CALLS_PER_TURN = histogram(
+    "llm_calls_per_turn",
+    "Llamadas a Gemini por turno del agente",
+    buckets=(1, 2, 3, 4, 5, 8)
+)
+
+# Contador del turno en curso (cada turno corre en su propia tarea/contexto)
+_turn_calls: ContextVar[Optional[list]] = ContextVar("llm_turn_calls", default=None)
+
+
+class QuotaLimiter:
+    """
+    Token bucket doble (requests y tokens por minuto) con cola por prioridad.
+
+    Un límite en 0 lo desactiva. Los que esperan se atienden por prioridad y,
+    dentro de la misma prioridad, en orden de llegada.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._waiters = []  # heap de (prioridad, secuencia, tokens, future)
+        self._seq = itertools.count()
+        self._timer = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(float(self.rpm), self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm / 60)
+
+    def _try_take(self, tokens: int) -> bool:
+        self._refill()
+        if self.rpm and self._requests < 1:
+            return False
+        if self.tpm and self._tokens < tokens:
+            return False
+        if self.rpm:
+            self._requests -= 1
+        if self.tpm:
+            self._tokens -= tokens
+        return True
+
+    def _delay_for(self, tokens: int) -> float:
+        delay = 0.0
+        if self.rpm and self._requests < 1:
+            delay = max(delay, (1 - self._requests) * 60 / self.rpm)
+        if self.tpm and self._tokens < tokens:
+            delay = max(delay, (tokens - self._tokens) * 60 / self.tpm)
+        return max(delay, 0.001)
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        while self._waiters:
+            priority, seq, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._try_take(tokens):
+                self._timer = asyncio.get_running_loop().call_later(self._delay_for(tokens), self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+    async def acquire(self, tokens: int, priority: int = PRIORITY_CUSTOMER) -> None:
+        """Espera hasta tener cupo para una llamada de `tokens` tokens."""
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        if not self._waiters and self._try_take(tokens):
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), tokens, future))
+        if self._timer is None:
+            self._dispatch()
+        await future
+
+    def debit(self, tokens: int) -> None:
+        """Ajusta el balance de tokens con el consumo real (puede quedar negativo)."""
+        if self.tpm and tokens:
+            self._tokens -= tokens
+
+    def queue_depth(self) -> dict:
+        depth = {lane: 0 for lane in LANES.values()}
+        for priority, _, _, future in self._waiters:
+            if not future.done():
+                depth[LANES.get(priority, str(priority))] += 1
+        return depth
+
+
+_limiter = QuotaLimiter(settings.LLM_RPM, settings.LLM_TPM)
+
+
+def estimate_tokens(contents) -> int:
+    """Tokens aproximados de la entrada (~4 caracteres por token)."""
+    if contents is None:
+        return 0
+    if isinstance(contents, str):
+        return len(contents) // 4 + 1
+    if isinstance(contents, (list, tuple)):
+        return sum(estimate_tokens(item) for item in contents)
+    parts = getattr(contents, "parts", None)
+    if parts is not None:
+        return estimate_tokens(list(parts))
+    try:
+        return estimate_tokens(contents.text)
+    except Exception:
+        return NON_TEXT_PART_TOKENS
+
+
+@contextmanager
+def count_turn_calls():
+    """Cuenta las llamadas a Gemini hechas dentro del bloque y las registra al salir."""
+    calls = [0]
+    token = _turn_calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _turn_calls.reset(token)
+        LLM_CALLS_PER_TURN.observe(calls[0])
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: uniforme entre 0 y el tope exponencial
+    cap = min(settings.LLM_BACKOFF_MAX_SECONDS, settings.LLM_BACKOFF_BASE_SECONDS * 2 ** attempt)
+    return random.uniform(0, cap)
+
+
+async def generate(model, contents, site: str, priority: int = PRIORITY_CUSTOMER, **kwargs):
+    """
+    `model.generate_content_async(contents, **kwargs)` respetando la cuota local,
+    con reintentos ante 429 y registrando la llamada bajo `site`.
+
+    Raises:
+        ResourceExhausted si la cuota sigue agotada tras LLM_MAX_RETRIES reintentos
+    """
+    calls = _turn_calls.get()
+    if calls is not None:
+        calls[0] += 1
+
+    lane = LANES.get(priority, str(priority))
+    estimated = estimate_tokens(contents) + settings.LLM_OUTPUT_TOKENS_ESTIMATE
+
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        queued = time.perf_counter()
+        await _limiter.acquire(estimated, priority)
+        LLM_QUEUE_WAIT.observe(time.perf_counter() - queued, lane=lane)
+
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = await model.generate_content_async(contents, **kwargs)
+            status = "ok"
+        except ResourceExhausted:
+            status = "quota"
+            if attempt == settings.LLM_MAX_RETRIES:
+                raise
+            GEMINI_RETRIES.inc(site=site)
+            delay = _backoff(attempt)
+            logger.warning(f"Quota exceeded (429) en {site}. Reintentando en {delay:.1f}s...")
+            await asyncio.sleep(delay)
+            continue
+        finally:
+            GEMINI_SECONDS.observe(time.perf_counter() - start, site=site)
+            GEMINI_CALLS.inc(site=site, status=status)
+
+        usage = getattr(response, "usage_metadata", None)
+        used = getattr(usage, "total_token_count", 0) or 0
+        if used:
+            GEMINI_TOKENS.inc(used, site=site)
+            _limiter.debit(used - estimated)
+        return response
+
+
+gauge(
+    "llm_queue_depth",
+    "Llamadas esperando cuota local por carril",
+    labels=("lane",),
+    source=lambda: {(lane,): depth for lane, depth in _limiter.queue_depth().items()}
+)
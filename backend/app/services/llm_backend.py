@@ -0,0 +1,261 @@
+"""
+Backends de LLM intercambiables.
+
+El agente, la transcripción y los resúmenes no importan Vertex AI
+directamente: piden modelos y partes al backend activo y llaman siempre a
+través del gateway (`app.services.llm.generate`).
+
+- `VertexBackend` (LLM_BACKEND=vertex): Gemini en Vertex AI. `vertexai` se
+  importa e inicializa recién al construir el primer modelo.
+- `ScriptedBackend` (LLM_BACKEND=fake): respuestas guionadas, sin red, con
+  latencia configurable. Repite function calls según reglas por regex sobre
+  el mensaje del usuario; sirve para pruebas de carga y scripts offline.
+
+Los modelos de ambos exponen `generate_content_async(contents, **kwargs)`
+y respuestas con la misma forma (`candidates[].content.parts[]` con
+`text` / `function_call`, `text` y `usage_metadata`).
+"""
+import asyncio
+import logging
+import random
+import re
+import threading
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+from typing import Callable, NamedTuple, Optional, Union
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend(ABC):
+    """Interfaz común: modelos (texto + function calling), continuación con FunctionResponses y audio."""
+
+    name = "base"
+
+    @abstractmethod
+    def model(self, model_name: str, system_instruction: Optional[list] = None, tools: Optional[list] = None):
+        """
+        Modelo listo para `generate()`.
+
+        Args:
+            tools: declaraciones de funciones como dicts (name, description, parameters)
+        """
+
+    @abstractmethod
+    def function_response_contents(self, prompt: str, model_content, responses: list) -> list:
+        """
+        Conversación para devolver resultados de funciones al modelo:
+        mensaje del usuario → function_calls del modelo → FunctionResponses.
+
+        Args:
+            responses: [(nombre_funcion, payload)] en el orden de las llamadas
+        """
+
+    @abstractmethod
+    def audio_part(self, data: bytes, mime_type: str):
+        """Parte multimodal con audio para transcribir."""
+
+
+class VertexBackend(LLMBackend):
+    """Gemini en Vertex AI."""
+
+    name = "vertex"
+
+    def __init__(self):
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _init(self):
+        if self._initialized:
+            return
+        with self._lock:
+            if not self._initialized:
+                import vertexai
+                vertexai.init(project=settings.GCP_PROJECT_ID, location=settings.GCP_LOCATION)
+                self._initialized = True
+                logger.info(f"🧠 Vertex AI inicializado ({settings.GCP_LOCATION})")
+
+    def model(self, model_name: str, system_instruction: Optional[list] = None, tools: Optional[list] = None):
+        self._init()
+        from vertexai.generative_models import GenerativeModel, Tool, FunctionDeclaration
+
+        vertex_tools = None
+        if tools:
+            vertex_tools = [Tool(function_declarations=[FunctionDeclaration(**decl) for decl in tools])]
+        return GenerativeModel(model_name, system_instruction=system_instruction, tools=vertex_tools)
+
+    def function_response_contents(self, prompt: str, model_content, responses: list) -> list:
+        from vertexai.generative_models import Content, Part
+
+        return [
+            Content(role="user", parts=[Part.from_text(prompt)]),
+            model_content,
+            Content(role="user", parts=[
+                Part.from_function_response(name=name, response={"content": payload})
+                for name, payload in responses
+            ]),
+        ]
+
+    def audio_part(self, data: bytes, mime_type: str):
+        from vertexai.generative_models import Part
+
+        return Part.from_data(data=data, mime_type=mime_type)
+
+
+class ScriptedCall(NamedTuple):
+    """Function call que el backend guionado devuelve; `args` puede depender del match."""
+    name: str
+    args: Optional[Union[dict, Callable]] = None
+
+
+class ScriptedRule(NamedTuple):
+    pattern: str
+    reply: Union[str, ScriptedCall, list]
+
+
+# Guion por defecto: cubre cada función del agente con los mensajes típicos de un cliente
+DEFAULT_SCRIPT = [
+    ScriptedRule(r"cotiz", ScriptedCall("generar_cotizacion", lambda m: {
+        "nombres_productos": ["Arado"],
+        "cliente_nombre": "Cliente Prueba",
+        "cliente_email": "cliente@prueba.cl",
+        "cliente_telefono": "56900000000"
+    })),
+    ScriptedRule(r"foto|imagen", ScriptedCall("mostrar_imagenes_por_nombre", {"nombres_productos": ["Arado"]})),
+    ScriptedRule(r"reuni[oó]n|llamada", ScriptedCall("agendar_reunion", {
+        "cliente_email": "cliente@prueba.cl", "horario_preferido": "mañana 10:00"
+    })),
+    ScriptedRule(r"tractor|arado|rastra|carro|m[aá]quina", ScriptedCall(
+        "buscar_maquinaria", lambda m: {"consulta": m.group(0)}
+    )),
+    ScriptedRule(r".", "¡Hola! 👋 Soy el asistente de MACI. ¿Qué maquinaria estás buscando?"),
+]
+
+
+def _text_of(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    if isinstance(contents, (list, tuple)):
+        return "\n".join(_text_of(item) for item in contents)
+    return getattr(contents, "text", "") or ""
+
+
+def _response(parts: list, tokens: int):
+    content = SimpleNamespace(role="model", parts=parts)
+    text = "".join(p.text for p in parts if p.text)
+    return SimpleNamespace(
+        candidates=[SimpleNamespace(content=content)],
+        text=text,
+        usage_metadata=SimpleNamespace(total_token_count=tokens)
+    )
+
+
+class _ScriptedModel:
+    def __init__(self, backend: "ScriptedBackend", model_name: str, tools: Optional[list]):
+        self.backend = backend
+        self.model_name = model_name
+        self.tool_names = {decl["name"] for decl in tools or []}
+
+    async def generate_content_async(self, contents, **kwargs):
+        backend = self.backend
+        delay = backend.latency + random.uniform(0, backend.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        text = _text_of(contents)
+        tokens = len(text) // 4 + 1
+        if isinstance(contents, _FunctionResponses):
+            parts = [SimpleNamespace(text=backend.continuation_text, function_call=None)]
+        elif isinstance(contents, list) and any(isinstance(c, _AudioPart) for c in contents):
+            parts = [SimpleNamespace(text=backend.transcript, function_call=None)]
+        else:
+            parts = backend.reply_parts(text, self.tool_names)
+        return _response(parts, tokens)
+
+
+class _FunctionResponses(list):
+    """Conversación de continuación del backend guionado (lista con marca de tipo)."""
+
+
+class _AudioPart(NamedTuple):
+    data: bytes
+    mime_type: str
+
+
+class ScriptedBackend(LLMBackend):
+    """
+    Backend determinista sin red.
+
+    Para cada mensaje toma la primera regla cuyo regex calza con el texto
+    después del último "MENSAJE:" (o todo el prompt, si no hay) y responde su
+    texto o sus function calls. Las continuaciones con FunctionResponses
+    responden `continuation_text` y el audio responde `transcript`.
+    """
+
+    name = "fake"
+
+    def __init__(self, script: Optional[list] = None, latency: Optional[float] = None, jitter: float = 0.0,
+                 continuation_text: str = "Aquí tienes la información 👍",
+                 transcript: str = "Hola, busco un tractor"):
+        self.script = [(re.compile(rule.pattern, re.IGNORECASE), rule.reply) for rule in (script or DEFAULT_SCRIPT)]
+        self.latency = settings.FAKE_LLM_LATENCY_SECONDS if latency is None else latency
+        self.jitter = jitter
+        self.continuation_text = continuation_text
+        self.transcript = transcript
+
+    def reply_parts(self, text: str, tool_names: set) -> list:
+        message = text.rsplit("MENSAJE:", 1)[-1]
+        for pattern, reply in self.script:
+            match = pattern.search(message)
+            if not match:
+                continue
+            replies = reply if isinstance(reply, list) else [reply]
+            parts = []
+            for item in replies:
+                if isinstance(item, ScriptedCall):
+                    if tool_names and item.name not in tool_names:
+                        continue
+                    args = item.args(match) if callable(item.args) else dict(item.args or {})
+                    parts.append(SimpleNamespace(text="", function_call=SimpleNamespace(name=item.name, args=args)))
+                else:
+                    parts.append(SimpleNamespace(text=item, function_call=None))
+            if parts:
+                return parts
+        return [SimpleNamespace(text="", function_call=None)]
+
+    def model(self, model_name: str, system_instruction: Optional[list] = None, tools: Optional[list] = None):
+        return _ScriptedModel(self, model_name, tools)
+
+    def function_response_contents(self, prompt: str, model_content, responses: list) -> list:
+        return _FunctionResponses([prompt, model_content, list(responses)])
+
+    def audio_part(self, data: bytes, mime_type: str):
+        return _AudioPart(data, mime_type)
+
+
+_BACKENDS = {"vertex": VertexBackend, "fake": ScriptedBackend}
+_backend: Optional[LLMBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> LLMBackend:
+    """Backend activo (LLM_BACKEND), creado en el primer uso."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = settings.LLM_BACKEND
+                if name not in _BACKENDS:
+                    raise ValueError(f"LLM_BACKEND desconocido: {name}")
+                _backend = _BACKENDS[name]()
+                logger.info(f"🧠 Backend de LLM: {name}")
+    return _backend
+
+
+def set_backend(backend: LLMBackend) -> None:
+    """Reemplaza el backend activo (scripts y pruebas de carga, antes del primer turno)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
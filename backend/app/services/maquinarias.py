@@ -1,98 +1,130 @@
 """
-Servicio de Maquinarias - Consultas a Firestore.
+Servicio de Maquinarias - Consultas sobre el catálogo en memoria (app/services/catalog.py).
 """
+import difflib
 import logging
-from typing import List, Optional
+from typing import List, NamedTuple, Optional, Sequence
 from firebase_admin import firestore
-from app.services.firebase import db
-
-import unicodedata
+from app.core.config import settings
+from app.services.catalog import SearchFields, get_catalog_snapshot, normalize_text
+from app.services.firebase import db, count_firestore
 
 logger = logging.getLogger(__name__)
 
 
-def normalize_text(text: str) -> str:
-    """Elimina acentos y convierte a minúsculas."""
-    if not text:
-        return ""
-    return ''.join(c for c in unicodedata.normalize('NFD', text)
-                   if unicodedata.category(c) != 'Mn').lower().strip()
+def _active_maquinarias() -> Sequence[dict]:
+    """Todas las maquinarias activas del snapshot vigente (no modificar los ítems)."""
+    return get_catalog_snapshot().items
+
+
+def _search_fields() -> Sequence[SearchFields]:
+    """Campos de búsqueda ya normalizados de las maquinarias activas."""
+    return get_catalog_snapshot().fields
+
+
+class NameMatch(NamedTuple):
+    query: str
+    item: Optional[dict]
+    score: float
+
+
+def _name_score(query: str, query_tokens: set, fields: SearchFields) -> float:
+    """
+    Confianza (0-1) de que `query` (normalizado) se refiere al ítem de `fields`.
+
+    El nombre pesa más que tags y categoría, que solo sirven de respaldo.
+    """
+    nombre = fields.nombre
+    if not nombre:
+        return 0.0
+    if query == nombre:
+        return 1.0
+
+    overlap = len(query_tokens & fields.nombre_tokens)
+    token_score = 2 * overlap / (len(query_tokens) + len(fields.nombre_tokens))
+    score = max(token_score, 0.9 * difflib.SequenceMatcher(None, query, nombre).ratio())
+    if query in nombre or nombre in query:
+        # Contenido en el nombre: alto, y más mientras más del nombre cubra
+        shorter, longer = sorted((len(query), len(nombre)))
+        score = max(score, 0.6 + 0.35 * shorter / longer)
+
+    for extra in (fields.categoria,) + fields.tags:
+        if extra and (extra == query or extra in query_tokens):
+            score = max(score, 0.5)
+    return round(min(score, 0.99), 3)
+
+
+def resolve_maquinarias(nombres: List[str], min_score: Optional[float] = None) -> List[NameMatch]:
+    """
+    Resuelve varios nombres de producto contra un mismo snapshot del catálogo.
+
+    Args:
+        nombres: nombres tal como los manda el modelo (pueden venir con errores)
+        min_score: confianza mínima para aceptar un match (default NAME_MATCH_MIN_SCORE)
+
+    Returns:
+        Un NameMatch por nombre, en el mismo orden; `item` es None si ninguno
+        supera la confianza mínima
+    """
+    min_score = settings.NAME_MATCH_MIN_SCORE if min_score is None else min_score
+    try:
+        catalog = _search_fields()
+    except Exception as e:
+        logger.error(f"Error resolviendo nombres {nombres}: {e}")
+        return [NameMatch(nombre, None, 0.0) for nombre in nombres]
+
+    matches = []
+    for nombre in nombres:
+        query = normalize_text(nombre)
+        best, best_score = None, 0.0
+        if query:
+            query_tokens = set(query.split())
+            for fields in catalog:
+                score = _name_score(query, query_tokens, fields)
+                if score > best_score:
+                    best, best_score = fields.item, score
+                    if score == 1.0:
+                        break
+        if best_score < min_score:
+            best = None
+        matches.append(NameMatch(nombre, best, best_score))
+
+    logger.info(
+        "🔎 Nombres resueltos: "
+        + ", ".join(f"'{m.query}'→{m.item['nombre'] if m.item else '∅'} ({m.score:.2f})" for m in matches)
+    )
+    return matches
 
 
 def search_maquinarias(query: str, limit: int = 10) -> List[dict]:
     """
-    Busca maquinarias por nombre, categoría o tags.
-    Soporta búsqueda insensible a acentos y sinónimos básicos.
+    Busca maquinarias por nombre, categoría, tags o descripción.
+    Soporta búsqueda insensible a acentos, plurales, prefijos y sinónimos básicos;
+    los resultados vienen ordenados por relevancia (ver app/services/search_index.py).
     """
     try:
         query_norm = normalize_text(query)
-        results = []
-        
-        # Mapa de sinónimos comunes en agricultura
-        synonyms = {
-            "fertilizador": "fertilizante",
-            "abonadora": "fertilizante",
-            "sembradora": "siembra",
-            "rastra": "grada",
-            "fumigadora": "nebulizador",
-            "fumigacion": "nebulizador",
-            "atomizador": "nebulizador",
-            "rociador": "nebulizador",
-            "triturador": "trituradora",
-            "preparacion": "preparacion", # Mapeo directo para asegurar coincidencia
-        }
-        
-        # Expanded query terms
-        search_terms = {query_norm}
-        for word in query_norm.split():
-            if word in synonyms:
-                search_terms.add(synonyms[word])
-                # También agregar la versión normalizada del sinónimo
-                search_terms.add(normalize_text(synonyms[word]))
         
         # Palabras clave para mostrar todo el catálogo
         generic_keywords = ["todas", "todo", "maquinas", "maquinas", "catalogo", "catalogo", "disponible", "disponibles", "lista"]
         is_generic = any(keyword in query_norm for keyword in generic_keywords) or len(query_norm) < 3
         
-        # Obtener todas las maquinarias activas
-        docs = db.collection("maquinarias").where("activa", "==", True).stream()
-        
-        all_docs = []
-        for doc in docs:
-            data = doc.to_dict()
-            data["id"] = doc.id
-            all_docs.append(data)
+        # Snapshot en memoria con su índice invertido (sin ir a Firestore)
+        snapshot = get_catalog_snapshot()
             
-        logger.info(f"📊 Total maquinarias activas encontradas en BD: {len(all_docs)}")
+        logger.info(f"📊 Total maquinarias activas en catálogo: {len(snapshot.items)}")
             
         if is_generic:
             logger.info(f"Búsqueda genérica detectada: '{query}' -> Devolviendo todo")
-            return all_docs[:limit]
-            
-        # Filtrado específico
-        for data in all_docs:
-            nombre = normalize_text(data.get("nombre", ""))
-            categoria = normalize_text(data.get("categoria", ""))
-            descripcion = normalize_text(data.get("descripcion", ""))
-            tags = [normalize_text(t) for t in data.get("tags", [])]
-            
-            # Verificar si ALGUNO de los términos de búsqueda está en los campos
-            match = False
-            for term in search_terms:
-                if (term in nombre or 
-                    term in categoria or 
-                    term in descripcion or
-                    any(term in tag for tag in tags)):
-                    match = True
-                    break
+            return list(snapshot.items[:limit])
             
-            if match:
-                results.append(data)
-                if len(results) >= limit:
-                    break
+        ranked = snapshot.index.search(query_norm, limit)
         
-        logger.info(f"🔍 Búsqueda '{query}' (norm: {search_terms}): {len(results)} resultados")
-        return results
+        logger.info(
+            f"🔍 Búsqueda '{query}' (norm: {query_norm}): {len(ranked)} resultados "
+            f"{[(m['nombre'], round(score, 2)) for score, m in ranked[:3]]}"
+        )
+        return [m for _, m in ranked]
         
     except Exception as e:
         logger.error(f"Error buscando maquinarias: {e}")
@@ -110,7 +142,13 @@ def get_maquinaria(maquinaria_id: str) -> Optional[dict]:
         Datos de la maquinaria o None
     """
     try:
+        data = get_catalog_snapshot().by_id.get(maquinaria_id)
+        if data is not None:
+            return data
+
+        # Fuera del catálogo activo (p. ej. desactivada): ir a Firestore
         doc = db.collection("maquinarias").document(maquinaria_id).get()
+        count_firestore("maquinarias", "read")
         
         if doc.exists:
             data = doc.to_dict()
@@ -138,19 +176,7 @@ def get_maquinarias_by_category(category: str, limit: int = 10) -> List[dict]:
         Lista de maquinarias de esa categoría
     """
     try:
-        results = []
-        docs = (
-            db.collection("maquinarias")
-            .where("activa", "==", True)
-            .where("categoria", "==", category)
-            .limit(limit)
-            .stream()
-        )
-        
-        for doc in docs:
-            data = doc.to_dict()
-            data["id"] = doc.id
-            results.append(data)
+        results = [data for data in _active_maquinarias() if data.get("categoria") == category][:limit]
         
         logger.info(f"Categoría '{category}': {len(results)} maquinarias")
         return results
@@ -169,10 +195,7 @@ def get_all_categories() -> List[str]:
     """
     try:
         categories = set()
-        docs = db.collection("maquinarias").where("activa", "==", True).stream()
-        
-        for doc in docs:
-            data = doc.to_dict()
+        for data in _active_maquinarias():
             if "categoria" in data:
                 categories.add(data["categoria"])
         
@@ -0,0 +1,212 @@
+"""
+Memoria de conversación: resumen incremental + ventana reciente.
+
+El prompt del agente lleva el resumen guardado en `chats/{phone}` (campo
+`summary`) y solo los mensajes posteriores a lo resumido, recortados a un
+presupuesto de tokens. Cuando se acumulan SUMMARY_EVERY_MESSAGES mensajes sin
+resumir (además de la ventana reciente), el resumen se actualiza en segundo
+plano con Gemini, así el tamaño del prompt no crece con la conversación.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from firebase_admin import firestore
+
+from app.core.config import settings
+from app.services.executor import run_blocking
+from app.services.firebase import db, count_firestore
+from app.services.llm import generate, PRIORITY_BACKGROUND
+from app.services.llm_backend import get_backend
+from app.services.metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TOKENS = histogram(
+    "history_prompt_tokens",
+    "Tokens estimados del historial (resumen + ventana) por turno",
+    buckets=(100, 250, 500, 1000, 1500, 2000, 3000, 5000, 8000)
+)
+
+SUMMARY_PROMPT = """Eres el asistente de ventas de MACI (maquinaria agrícola) y mantienes un resumen de la conversación con un cliente.
+
+RESUMEN ACTUAL:
+{summary}
+
+MENSAJES NUEVOS:
+{messages}
+
+Actualiza el resumen incorporando los mensajes nuevos. Conserva:
+- Datos del cliente (nombre, correo, teléfono, zona, cultivo o labor)
+- Productos consultados, fotos ya enviadas, precios y cotizaciones generadas
+- Objeciones, descuentos conversados, reuniones agendadas y estado de la negociación
+Escribe en español, en viñetas breves, máximo {max_words} palabras. Responde solo con el resumen."""
+
+_model = None
+_in_progress = set()
+_tasks = set()
+
+
+class ConversationContext(NamedTuple):
+    summary: str
+    recent: list
+    needs_summary: bool
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata (~4 caracteres por token), suficiente para el presupuesto."""
+    return len(text) // 4 + 1 if text else 0
+
+
+def _get_model():
+    global _model
+    if _model is None:
+        _model = get_backend().model(settings.MODEL_NAME)
+    return _model
+
+
+def _window_size() -> int:
+    return settings.HISTORY_RECENT_MESSAGES + settings.SUMMARY_EVERY_MESSAGES
+
+
+def _load(phone: str) -> ConversationContext:
+    chat_ref = db.collection("chats").document(phone)
+    chat_doc = chat_ref.get()
+    count_firestore("chats", "read")
+    chat = (chat_doc.to_dict() or {}) if chat_doc.exists else {}
+    summary = chat.get("summary", "")
+    summary_until = chat.get("summaryUntil", "")
+
+    messages = []
+    docs = (
+        chat_ref.collection("messages")
+        .order_by("timestamp", direction=firestore.Query.DESCENDING)
+        .limit(_window_size())
+        .stream()
+    )
+    for doc in docs:
+        data = doc.to_dict()
+        content = data.get("content")
+        # Fallback para mensajes antiguos guardados solo en parts
+        if not content and data.get("parts"):
+            try:
+                content = data["parts"][0]["text"]
+            except (IndexError, KeyError):
+                content = ""
+        messages.append({"role": data.get("role"), "content": content, "timestamp": data.get("timestamp", "")})
+    count_firestore("messages", "read", len(messages))
+    messages.reverse()
+
+    # Solo lo que el resumen todavía no cubre
+    recent = [m for m in messages if not summary_until or m["timestamp"] > summary_until]
+    return ConversationContext(summary, recent, len(recent) >= _window_size())
+
+
+async def load_conversation(phone: str) -> ConversationContext:
+    """Resumen y mensajes aún no resumidos de la conversación."""
+    try:
+        return await run_blocking(_load, phone)
+    except Exception as e:
+        logger.error(f"Error cargando conversación de {phone}: {e}")
+        return ConversationContext("", [], False)
+
+
+def format_history(summary: Optional[str], messages: Optional[list], budget: Optional[int] = None) -> str:
+    """
+    Bloque HISTORIAL del prompt: resumen + mensajes más recientes que quepan
+    en el presupuesto de tokens (se descartan los más antiguos primero).
+    """
+    budget = budget if budget is not None else settings.HISTORY_TOKEN_BUDGET
+    summary = (summary or "").strip()
+    if summary and estimate_tokens(summary) > budget // 2:
+        summary = summary[:(budget // 2) * 4]
+
+    remaining = budget - estimate_tokens(summary)
+    lines = []
+    for msg in reversed(messages or []):
+        role = "Usuario" if msg["role"] == "user" else "Asistente"
+        line = f"{role}: {msg['content']}\n"
+        cost = estimate_tokens(line)
+        if cost > remaining:
+            break
+        lines.append(line)
+        remaining -= cost
+    lines.reverse()
+
+    history = "".join(lines)
+    if summary:
+        history = f"(Resumen de la conversación anterior)\n{summary}\n\n{history}"
+    PROMPT_TOKENS.observe(estimate_tokens(history))
+    return history
+
+
+def _pending_messages(phone: str) -> tuple:
+    chat_ref = db.collection("chats").document(phone)
+    chat_doc = chat_ref.get()
+    count_firestore("chats", "read")
+    chat = (chat_doc.to_dict() or {}) if chat_doc.exists else {}
+    summary_until = chat.get("summaryUntil", "")
+
+    query = chat_ref.collection("messages")
+    if summary_until:
+        query = query.where("timestamp", ">", summary_until)
+    docs = list(query.order_by("timestamp").limit(settings.SUMMARY_MAX_BATCH).stream())
+    count_firestore("messages", "read", len(docs))
+    return chat.get("summary", ""), [doc.to_dict() for doc in docs]
+
+
+def _save_summary(phone: str, summary: str, summary_until: str) -> None:
+    db.collection("chats").document(phone).set({
+        "summary": summary,
+        "summaryUntil": summary_until,
+        "summaryUpdatedAt": datetime.now()
+    }, merge=True)
+    count_firestore("chats", "write")
+
+
+async def update_summary(phone: str) -> None:
+    """Incorpora al resumen los mensajes anteriores a la ventana reciente."""
+    summary, pending = await run_blocking(_pending_messages, phone)
+    to_summarize = pending[:-settings.HISTORY_RECENT_MESSAGES] if settings.HISTORY_RECENT_MESSAGES else pending
+    if not to_summarize:
+        return
+
+    lines = []
+    for msg in to_summarize:
+        role = "Usuario" if msg.get("role") == "user" else "Asistente"
+        lines.append(f"{role}: {msg.get('content', '')}")
+
+    prompt = SUMMARY_PROMPT.format(
+        summary=summary or "(sin resumen todavía)",
+        messages="\n".join(lines),
+        max_words=settings.SUMMARY_MAX_WORDS
+    )
+    # Trabajo de fondo: cede la cuota a los turnos de clientes
+    response = await generate(
+        _get_model(), prompt, "conversation_summary",
+        priority=PRIORITY_BACKGROUND, generation_config={"temperature": 0.2}
+    )
+    new_summary = response.text.strip()
+    if new_summary:
+        await run_blocking(_save_summary, phone, new_summary, to_summarize[-1].get("timestamp", ""))
+        logger.info(f"🧾 Resumen de {phone} actualizado ({len(to_summarize)} mensajes)")
+
+
+async def _run_update(phone: str) -> None:
+    try:
+        await update_summary(phone)
+    except Exception as e:
+        logger.error(f"Error actualizando resumen de {phone}: {e}")
+    finally:
+        _in_progress.discard(phone)
+
+
+def schedule_summary_update(phone: str) -> None:
+    """Actualiza el resumen en segundo plano (una actualización a la vez por teléfono)."""
+    if phone in _in_progress:
+        return
+    _in_progress.add(phone)
+    task = asyncio.create_task(_run_update(phone))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
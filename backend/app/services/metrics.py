@@ -0,0 +1,172 @@
+"""
+Métricas en memoria (contadores, histogramas y gauges con labels), baratas
+de registrar en cada request y seguras entre threads.
+
+`render_prometheus()` las serializa en el formato de texto de Prometheus
+para el endpoint `/metrics`; el costo se paga solo al hacer scrape.
+"""
+import bisect
+import threading
+
+# Buckets de latencia en segundos (de 5ms a 60s)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class Counter:
+    """Contador monotónico por combinación de labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(label, "") for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+
+class Histogram:
+    """Histograma acumulativo por combinación de labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(label, "") for label in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                key: {"counts": list(series["counts"]), "sum": series["sum"], "count": series["count"]}
+                for key, series in self._series.items()
+            }
+
+    def summary(self) -> dict:
+        """Cantidad y promedio por serie, para logs y health checks."""
+        result = {}
+        for key, series in self.snapshot().items():
+            name = ",".join(key) or "total"
+            result[name] = {
+                "count": series["count"],
+                "avg_ms": round(series["sum"] / series["count"] * 1000, 1) if series["count"] else 0.0
+            }
+        return result
+
+
+class Gauge:
+    """
+    Valor calculado al hacer scrape por `source()` → {labels: valor}.
+
+    Con kind="counter" exporta contadores que ya lleva otro componente
+    (p. ej. hits de una caché) sin duplicar la cuenta.
+    """
+
+    def __init__(self, name: str, description: str, labels: tuple = (), source=None, kind: str = "gauge"):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.source = source
+        self.kind = kind
+
+    def snapshot(self) -> dict:
+        try:
+            return dict(self.source()) if self.source else {}
+        except Exception:
+            return {}
+
+
+def _register(metric):
+    with _registry_lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+
+def counter(name: str, description: str, labels: tuple = ()) -> Counter:
+    """Obtiene (o crea) un contador registrado."""
+    return _register(Counter(name, description, labels))
+
+
+def histogram(name: str, description: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+    """Obtiene (o crea) un histograma registrado."""
+    return _register(Histogram(name, description, labels, buckets))
+
+
+def gauge(name: str, description: str, labels: tuple = (), source=None, kind: str = "gauge") -> Gauge:
+    """Obtiene (o crea) un gauge registrado."""
+    return _register(Gauge(name, description, labels, source, kind))
+
+
+def get_registry() -> dict:
+    with _registry_lock:
+        return dict(_registry)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus() -> str:
+    """Todas las métricas registradas en formato de exposición de texto de Prometheus."""
+    lines = []
+    for name, metric in sorted(get_registry().items()):
+        lines.append(f"# HELP {name} {_escape(metric.description)}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+
+        if metric.kind == "histogram":
+            for key, series in sorted(metric.snapshot().items()):
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float("inf"),), series["counts"]):
+                    cumulative += count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{name}_bucket{_format_labels(metric.labels, key, le)} {cumulative}")
+                labels = _format_labels(metric.labels, key)
+                lines.append(f"{name}_sum{labels} {_format_value(series['sum'])}")
+                lines.append(f"{name}_count{labels} {series['count']}")
+        else:
+            for key, value in sorted(metric.snapshot().items()):
+                lines.append(f"{name}{_format_labels(metric.labels, key)} {_format_value(value)}")
+
+    return "\n".join(lines) + "\n"
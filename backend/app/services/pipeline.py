@@ -0,0 +1,195 @@
+"""
+Pipeline de un turno de conversación por WhatsApp.
+
+Etapas explícitas, cada una cronometrada y registrada en el histograma
+`turn_stage_seconds`:
+
+    parse → dedup → transcribe → persist-in → load-history → agent
+          → send → persist-out → deferred
+
+`parse` corre en el webhook (antes del spool); el resto en los workers.
+Imágenes y PDFs de cotización se producen como artefactos diferidos
+mientras sale el texto (ver `delivery`, histograma `deferred_artifact_seconds`);
+la etapa `deferred` es la espera a que terminen de entregarse. La conversión
+de imágenes arranca junto con el envío del texto y se registra aparte como
+`media-prep`, para separarla de la entrega.
+"""
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+
+from app.services.agent import process_message
+from app.services.dedup import claim_message, forget_message
+from app.services.delivery import send_reply, persist_reply, deferred_artifacts, start_deferred
+from app.services.executor import run_blocking
+from app.services.firebase import db, count_firestore, save_message_firestore
+from app.services.memory import load_conversation, schedule_summary_update
+from app.services.metrics import histogram
+from app.services.transcription import transcribe_media
+from app.services.whatsapp import send_message, parse_webhook_events
+
+logger = logging.getLogger(__name__)
+
+TURN_STAGE_SECONDS = histogram(
+    "turn_stage_seconds",
+    "Duración de cada etapa del turno",
+    labels=("stage",)
+)
+
+
+def _persist_inbound(phone: str, messages: list) -> None:
+    for content in messages:
+        save_message_firestore(phone, "user", content)
+
+    # Resetear flag de recordatorio cuando el cliente responde
+    try:
+        db.collection('chats').document(phone).update({'reminderSent': False})
+        count_firestore("chats", "write")
+    except Exception:
+        pass  # Ignorar si falla
+
+
+class TurnPipeline:
+    """Un turno: uno o más mensajes (una ráfaga) del mismo teléfono y su respuesta."""
+
+    def __init__(self, phone: str):
+        self.phone = phone
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """Cronometra una etapa y la registra en el histograma."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+            TURN_STAGE_SECONDS.observe(elapsed, stage=name)
+
+    @staticmethod
+    def parse(data: dict) -> list:
+        """Etapa parse: envelope del webhook → eventos normalizados."""
+        start = time.perf_counter()
+        events = parse_webhook_events(data)
+        TURN_STAGE_SECONDS.observe(time.perf_counter() - start, stage="parse")
+        return events
+
+    async def run(self, events: list) -> None:
+        """Ejecuta el turno. Si falla, libera los IDs para que el spool reintente."""
+        with self.stage("dedup"):
+            # Meta reenvía el mismo mensaje si el turno anterior tardó demasiado
+            claimed = [
+                event for event in events
+                if await run_blocking(
+                    claim_message, event.get("message_id"), event.get("phone"),
+                    claim_token=event.get("claim_token"), retry=event.get("attempt", 1) > 1,
+                    previous_claim_token=event.get("previous_claim_token")
+                )
+            ]
+        if not claimed:
+            return
+
+        try:
+            await self._run_turn(claimed)
+        except Exception:
+            # Liberar los IDs para que el reintento del spool no se descarte como duplicado
+            for event in claimed:
+                await run_blocking(forget_message, event.get("message_id"))
+            raise
+        finally:
+            self._log_timings()
+
+    async def _run_turn(self, events: list) -> None:
+        texts, inbound = await self._read_inputs(events)
+        if not texts:
+            return
+
+        with self.stage("persist-in"):
+            await run_blocking(_persist_inbound, self.phone, inbound)
+
+        # Una ráfaga ("hola", "busco", "una rastra") se responde en un solo turno
+        final_text = "\n".join(texts)
+        if len(texts) > 1:
+            logger.info(f"🧺 {len(texts)} mensajes de {self.phone} agrupados en un turno")
+
+        with self.stage("load-history"):
+            conversation = await load_conversation(self.phone)
+
+        with self.stage("agent"):
+            result = await process_message(
+                final_text, chat_history=conversation.recent, client_phone=self.phone,
+                conversation_summary=conversation.summary
+            )
+
+        # Imágenes y PDFs se producen en segundo plano mientras sale el texto
+        # y se entregan después, sin retrasarlo
+        text_sent = asyncio.Event()
+        deliveries = start_deferred(self.phone, deferred_artifacts(result), after=text_sent)
+        try:
+            with self.stage("send"):
+                try:
+                    sent = await send_reply(self.phone, result)
+                finally:
+                    text_sent.set()
+
+            with self.stage("persist-out"):
+                await persist_reply(self.phone, sent)
+
+            # La fila del spool se completa recién con todo entregado
+            with self.stage("deferred"):
+                await asyncio.gather(*deliveries)
+        finally:
+            # Si el turno falló o se canceló, el reintento del spool rehace las entregas
+            for task in deliveries:
+                task.cancel()
+
+        if conversation.needs_summary:
+            schedule_summary_update(self.phone)
+
+    async def _read_inputs(self, events: list) -> tuple:
+        """
+        Texto de cada mensaje (transcribiendo audios).
+
+        Returns:
+            (textos para el agente, contenidos a guardar como mensajes del usuario)
+        """
+        texts = []
+        inbound = []
+
+        for event in events:
+            msg_type = event.get("type")
+
+            if msg_type == "text":
+                text = event.get("text", "")
+                if text:
+                    texts.append(text)
+                    inbound.append(text)
+
+            elif msg_type == "audio":
+                logger.info(f"🎙️ Recibido audio de {self.phone}")
+                with self.stage("transcribe"):
+                    # Descargar y transcribir (con caché por media_id y por contenido)
+                    text = await transcribe_media(event["media_id"], event.get("mime_type") or "audio/ogg")
+
+                if text:
+                    logger.info(f"📝 Transcripción: {text}")
+                    texts.append(text)
+                    # Guardar nota de sistema sobre la transcripción
+                    inbound.append(f"[AUDIO TRANSCRITO]: {text}")
+                else:
+                    # Fallback si falla transcripción
+                    await send_message(self.phone, "🙉 Tuve problemas escuchando tu audio. ¿Podrías escribirlo?")
+
+        return texts, inbound
+
+    def _log_timings(self) -> None:
+        if self.timings:
+            detail = " ".join(f"{name}={elapsed * 1000:.0f}ms" for name, elapsed in self.timings.items())
+            logger.info(f"⏱️ Turno {self.phone}: {detail}")
+
+
+async def process_events(events: list) -> None:
+    """Handler de los workers del spool: un lote de eventos del mismo teléfono."""
+    await TurnPipeline(events[0]["phone"]).run(events)
@@ -4,6 +4,7 @@ Servicio de Cotizaciones - Generación de PDFs.
 import logging
 import io
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional
 
@@ -24,6 +25,28 @@ logger = logging.getLogger(__name__)
 # Bucket para almacenar cotizaciones
 BUCKET_NAME = "venta-maquinarias-cotizaciones"
 
+# Descargas simultáneas de imágenes de producto por cotización
+IMAGE_DOWNLOAD_WORKERS = 4
+
+
+def _download_image(url: str) -> Optional[bytes]:
+    try:
+        response = requests.get(url, timeout=10)
+        if response.status_code == 200:
+            return response.content
+    except Exception:
+        pass
+    return None
+
+
+def _download_images(urls: list) -> dict:
+    """Descarga en paralelo las imágenes (url -> bytes o None)."""
+    unique = list(dict.fromkeys(u for u in urls if u))
+    if not unique:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(IMAGE_DOWNLOAD_WORKERS, len(unique))) as pool:
+        return dict(zip(unique, pool.map(_download_image, unique)))
+
 
 def generate_quotation_pdf(
     cliente_nombre: str,
@@ -149,6 +172,11 @@ def generate_quotation_pdf(
         
         total_neto = 0
         
+        # Primera imagen de cada producto, descargadas todas a la vez
+        imagenes_descargadas = _download_images([
+            maq["imagenes"][0] for maq in maquinarias if maq.get("imagenes")
+        ])
+        
         # ITERAR PRODUCTOS
         for idx, maq in enumerate(maquinarias):
             precio_unitario = maq.get("precioReferencia", 0)
@@ -171,16 +199,15 @@ def generate_quotation_pdf(
             # Imagen
             imagenes = maq.get("imagenes", [])
             if imagenes:
-                img_url = imagenes[0]
-                try:
-                    response = requests.get(img_url, timeout=10)
-                    if response.status_code == 200:
-                        img_buffer = io.BytesIO(response.content)
+                contenido = imagenes_descargadas.get(imagenes[0])
+                if contenido:
+                    try:
+                        img_buffer = io.BytesIO(contenido)
                         prod_img = Image(img_buffer, width=4*inch, height=3*inch, kind='proportional')
                         story.append(prod_img)
                         story.append(Spacer(1, 0.1*inch))
-                except Exception:
-                    pass
+                    except Exception:
+                        pass
 
             # Spec
             specs = maq.get("especificacionesTecnicas", "")
@@ -281,7 +308,7 @@ def save_quotation_to_firestore(
     Guarda la cotización multi-producto en Firestore.
     """
     try:
-        from app.services.firebase import db
+        from app.services.firebase import db, count_firestore
         
         doc_ref = db.collection("cotizaciones").document()
         doc_ref.set({
@@ -297,6 +324,7 @@ def save_quotation_to_firestore(
             "origen": "WhatsApp",
             "created_at": datetime.now().isoformat()
         })
+        count_firestore("cotizaciones", "write")
         
         logger.info(f"💾 Cotización guardada en Firestore: {doc_ref.id}")
         return doc_ref.id
@@ -311,7 +339,7 @@ def update_quotation_status(cliente_telefono: str, nuevo_estado: str) -> bool:
     Estados válidos: NEGOCIANDO, VENDIDA, PERDIDA
     """
     try:
-        from app.services.firebase import db
+        from app.services.firebase import db, count_firestore
         
         # Buscar la última cotización de este teléfono
         # Firestore requiere índice compuesto para where + order_by.
@@ -321,6 +349,7 @@ def update_quotation_status(cliente_telefono: str, nuevo_estado: str) -> bool:
             .stream()
             
         all_docs = list(docs)
+        count_firestore("cotizaciones", "read", len(all_docs))
         if not all_docs:
              logger.warning(f"⚠️ No se encontró cotización para {cliente_telefono}")
              return False
@@ -332,6 +361,7 @@ def update_quotation_status(cliente_telefono: str, nuevo_estado: str) -> bool:
         if found_doc:
             doc_ref = db.collection("cotizaciones").document(found_doc.id)
             doc_ref.update({"estado": nuevo_estado})
+            count_firestore("cotizaciones", "write")
             logger.info(f"🔄 Estado actualizado a {nuevo_estado} para cotización {found_doc.id}")
             return True
             
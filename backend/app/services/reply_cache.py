@@ -0,0 +1,234 @@
+"""
+Caché semántica de respuestas del agente para preguntas repetidas.
+
+Solo aplica al primer mensaje de una conversación (sin respuestas previas
+ni resumen) y a intenciones que no dependen de ella (catálogo, información
+del negocio, precio/detalle de un producto nombrado, saludo). Con historial
+el modelo responde según lo conversado con ese cliente, así que esa
+respuesta no puede servirle a otro. También se omite si el mensaje hace
+referencia a algo anterior ("ese", "el primero"), trae datos personales o
+pide una acción (cotizar, agendar).
+
+La clave incluye la versión del catálogo y de la configuración, así que
+cualquier cambio en Firestore invalida lo guardado. Dentro de la misma
+clave se busca primero el mensaje normalizado exacto y luego el más
+parecido por coseno sobre vectores de n-gramas de caracteres hasheados.
+"""
+import copy
+import math
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from app.core.config import settings
+from app.services.intent import classify_normalized, normalize
+from app.services.metrics import counter, gauge
+
+REPLY_CACHE_REQUESTS = counter(
+    "reply_cache_requests_total",
+    "Consultas a la caché de respuestas por resultado",
+    labels=("intent", "result")
+)
+REPLY_CACHE_SAVED_SECONDS = counter(
+    "reply_cache_saved_seconds_total",
+    "Segundos de agente ahorrados por hits de la caché de respuestas"
+)
+
+VECTOR_DIMENSIONS = 512
+NGRAM = 3
+
+STOPWORDS = {
+    "de", "del", "la", "las", "el", "los", "un", "una", "unos", "unas", "y", "o", "a", "al",
+    "me", "te", "se", "por", "favor", "para", "con", "que", "q", "porfa", "pf", "hola",
+    "buenas", "buenos", "dias", "tardes", "noches", "quisiera", "queria", "quiero", "saber",
+    "podria", "podrian", "puede", "pueden", "decir", "dime", "info", "informacion", "sobre",
+    "tienen", "tiene", "hay", "cual", "es", "son", "su", "sus", "mi", "mis", "ustedes",
+}
+
+# Referencias a la conversación, datos personales o pedidos con efectos: nunca se cachean
+UNCACHEABLE_SIGNALS = frozenset({
+    "referential", "personal", "quote", "schedule", "discount", "purchase", "photos",
+})
+
+
+def normalize_message(text: str) -> str:
+    """Minúsculas, sin acentos ni puntuación, espacios colapsados."""
+    return normalize(text)
+
+
+def _content_words(normalized: str) -> str:
+    return " ".join(w for w in normalized.split() if w not in STOPWORDS)
+
+
+def vectorize(text: str) -> dict:
+    """Vector disperso L2-normalizado de n-gramas de caracteres hasheados."""
+    padded = f" {text} "
+    weights = {}
+    for i in range(len(padded) - NGRAM + 1):
+        index = zlib.crc32(padded[i:i + NGRAM].encode()) % VECTOR_DIMENSIONS
+        weights[index] = weights.get(index, 0.0) + 1.0
+    norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+    return {index: w / norm for index, w in weights.items()}
+
+
+def cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(index, 0.0) for index, w in a.items())
+
+
+def classify(normalized: str) -> tuple:
+    """
+    Intención sin estado del mensaje, o None si la respuesta depende del contexto.
+
+    Returns:
+        (intent, productos mencionados)
+    """
+    words = normalized.split()
+    if not words or len(words) > 20:
+        return None, ()
+    if "@" in normalized or re.search(r"\d{6,}", normalized):
+        return None, ()
+    intent = classify_normalized(normalized)
+    if intent.signals & UNCACHEABLE_SIGNALS:
+        return None, ()
+
+    products = intent.products
+    if products and intent.signals & {"price", "details"}:
+        return "product", products
+    if "info" in intent.signals:
+        return "info", ()
+    if not products and "catalog" in intent.signals:
+        return "catalog", ()
+    if len(words) <= 4 and intent.greeting_only:
+        return "greeting", ()
+    return None, ()
+
+
+class CacheKey(NamedTuple):
+    bucket: tuple
+    text: str
+    vector: dict
+
+
+class SemanticReplyCache:
+    """LRU con TTL; dentro de cada bucket (intent + versiones) busca por similitud."""
+
+    def __init__(self, maxsize: int = 500, ttl: float = 3600.0, threshold: float = 0.9):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # (bucket, text) -> (expires_at, vector, result, seconds)
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey) -> tuple:
+        """
+        Returns:
+            (resultado, segundos que costó generarlo, "exact"/"similar") o (None, 0, "miss")
+        """
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get((key.bucket, key.text))
+            if item is not None and item[0] > now:
+                self._data.move_to_end((key.bucket, key.text))
+                self.hits += 1
+                return copy.deepcopy(item[2]), item[3], "exact"
+
+            best, best_score = None, self.threshold
+            for stored_key, (expires_at, vector, result, seconds) in self._data.items():
+                if stored_key[0] != key.bucket or expires_at <= now:
+                    continue
+                score = cosine(key.vector, vector)
+                if score >= best_score:
+                    best, best_score = stored_key, score
+            if best is not None:
+                self._data.move_to_end(best)
+                self.hits += 1
+                item = self._data[best]
+                return copy.deepcopy(item[2]), item[3], "similar"
+
+            self.misses += 1
+            return None, 0.0, "miss"
+
+    def set(self, key: CacheKey, result: dict, seconds: float) -> None:
+        with self._lock:
+            self._data[(key.bucket, key.text)] = (
+                time.monotonic() + self.ttl, key.vector, copy.deepcopy(result), seconds
+            )
+            self._data.move_to_end((key.bucket, key.text))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+_cache = SemanticReplyCache(
+    maxsize=settings.REPLY_CACHE_SIZE,
+    ttl=settings.REPLY_CACHE_TTL_SECONDS,
+    threshold=settings.REPLY_CACHE_SIMILARITY
+)
+
+
+def make_key(message: str, fresh: bool, catalog_version: int, settings_version: int) -> Optional[CacheKey]:
+    """
+    Clave de caché del mensaje, o None si no debe cachearse (se cuenta como bypass).
+
+    Args:
+        fresh: True si es el inicio de la conversación (sin respuestas previas ni resumen)
+    """
+    if not fresh:
+        # La respuesta depende del historial de este cliente
+        REPLY_CACHE_REQUESTS.inc(intent="none", result="bypass")
+        return None
+    normalized = normalize_message(message)
+    intent, products = classify(normalized)
+    if intent is None:
+        REPLY_CACHE_REQUESTS.inc(intent="none", result="bypass")
+        return None
+    text = _content_words(normalized) or normalized
+    bucket = (intent, products, catalog_version, settings_version)
+    return CacheKey(bucket, text, vectorize(text))
+
+
+def lookup(key: CacheKey) -> Optional[dict]:
+    """Respuesta cacheada para la clave, registrando hit/miss y el tiempo ahorrado."""
+    result, seconds, kind = _cache.get(key)
+    intent = key.bucket[0]
+    if result is None:
+        REPLY_CACHE_REQUESTS.inc(intent=intent, result="miss")
+        return None
+    REPLY_CACHE_REQUESTS.inc(intent=intent, result=f"hit_{kind}")
+    REPLY_CACHE_SAVED_SECONDS.inc(seconds)
+    return result
+
+
+def store(key: CacheKey, result: dict, seconds: float) -> None:
+    """Guarda la respuesta si es reutilizable (sin documentos generados ni errores)."""
+    if not result.get("text") or result.get("documents") or result.get("deferred"):
+        return
+    if result["text"].startswith(("⚠️", "Error")):
+        return
+    _cache.set(key, result, seconds)
+
+
+def get_reply_cache_stats() -> dict:
+    return _cache.stats()
+
+
+gauge("reply_cache_entries", "Respuestas guardadas en la caché semántica", source=lambda: {(): len(_cache)})
+gauge("reply_cache_hit_ratio", "Proporción de hits de la caché semántica", source=lambda: {(): _cache.stats()["hit_ratio"]})
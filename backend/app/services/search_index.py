@@ -0,0 +1,186 @@
+"""
+Índice invertido para buscar maquinarias con ranking BM25.
+
+Cada ítem del catálogo se analiza una vez (al cargarlo o cambiarlo): sus
+campos ya normalizados se separan en términos, se quitan palabras vacías, se
+reducen los plurales y se agregan los sinónimos del rubro. Con eso cada
+snapshot del catálogo arma un índice término -> [(ítem, peso)], donde el
+peso ya trae el BM25 del término con boosts por campo
+(nombre > tags > categoría > descripción).
+
+Una consulta solo recorre las listas de sus términos (y de los términos del
+vocabulario que empiezan con ellos), suma pesos por ítem y toma los mejores
+con un heap, así que su costo depende de cuántos ítems calzan, no del
+tamaño del catálogo. Un ítem califica solo si calza con todos los términos
+de la consulta: "bomba de agua" no trae el carro aljibe por decir "agua".
+"""
+import bisect
+import heapq
+import math
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+# Boost de cada campo en el puntaje (BM25F)
+FIELD_BOOSTS = {
+    "nombre": 5.0,
+    "tags": 3.0,
+    "categoria": 2.0,
+    "descripcion": 1.0,
+}
+
+# Parámetros BM25: saturación de la frecuencia y normalización por largo del campo
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Término de consulta -> término del catálogo al que equivale. Se aplican al
+# indexar: un ítem con "nebulizador" también queda bajo "fumigadora", etc.
+SYNONYMS = {
+    "fertilizador": "fertilizante",
+    "abonadora": "fertilizante",
+    "sembradora": "siembra",
+    "rastra": "grada",
+    "fumigadora": "nebulizador",
+    "fumigacion": "nebulizador",
+    "atomizador": "nebulizador",
+    "rociador": "nebulizador",
+    "triturador": "trituradora",
+}
+# Un sinónimo pesa menos que el término que de verdad aparece en el campo
+SYNONYM_WEIGHT = 0.8
+
+# Un término de la consulta que es prefijo de otro del vocabulario ("tract"
+# -> "tractor") cuenta a este peso, y se expande a lo más a PREFIX_EXPANSIONS
+PREFIX_WEIGHT = 0.6
+PREFIX_MIN_LENGTH = 3
+PREFIX_EXPANSIONS = 20
+
+STOPWORDS = frozenset({
+    "a", "al", "con", "de", "del", "el", "en", "es", "la", "las", "lo", "los", "o", "para", "por",
+    "que", "se", "sin", "su", "un", "una", "unos", "unas", "y",
+    # Relleno de las consultas ("algo para suelos", "busco un tractor"): no describen al producto
+    "algo", "busco", "necesito", "quiero", "me", "mi", "interesa", "tienen", "hay",
+})
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _stem(token: str) -> str:
+    """Plural a singular, lo justo para que consulta e índice coincidan (tractores -> tractor)."""
+    if len(token) > 5 and token.endswith("es") and token[-3] in "lnrdz":
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token[-2].isdigit():
+        return token[:-1]
+    return token
+
+
+def _expand_synonyms() -> Dict[str, Tuple[str, ...]]:
+    expansions = defaultdict(list)
+    for query_term, catalog_term in SYNONYMS.items():
+        expansions[_stem(catalog_term)].append(_stem(query_term))
+    return {term: tuple(extra) for term, extra in expansions.items()}
+
+
+_INDEX_SYNONYMS = _expand_synonyms()
+
+
+def tokenize(text: str) -> List[str]:
+    """Términos de un texto ya normalizado (minúsculas, sin acentos)."""
+    return [_stem(token) for token in _TOKEN.findall(text) if token not in STOPWORDS]
+
+
+class FieldTerms(NamedTuple):
+    """Términos de un campo: frecuencia (sinónimos con peso reducido) y largo."""
+    counts: Dict[str, float]
+    length: int
+
+
+def analyze_field(texts: Iterable[str]) -> FieldTerms:
+    """Analiza un campo normalizado (o varios textos, como los tags) para el índice."""
+    counts = defaultdict(float)
+    length = 0
+    for text in texts:
+        for token in tokenize(text):
+            counts[token] += 1.0
+            length += 1
+            for synonym in _INDEX_SYNONYMS.get(token, ()):
+                counts[synonym] += SYNONYM_WEIGHT
+    return FieldTerms(dict(counts), length)
+
+
+class SearchIndex:
+    """Índice invertido de un snapshot del catálogo; no se modifica una vez armado."""
+
+    def __init__(self, items: Sequence[dict], analyzed: Sequence[Dict[str, FieldTerms]]):
+        self.items = items
+        total = len(items)
+
+        # Largo promedio de cada campo entre los ítems que lo tienen (muchos no traen tags)
+        lengths = {field: 0 for field in FIELD_BOOSTS}
+        present = {field: 0 for field in FIELD_BOOSTS}
+        for fields in analyzed:
+            for field in FIELD_BOOSTS:
+                lengths[field] += fields[field].length
+                present[field] += bool(fields[field].length)
+        average = {field: lengths[field] / present[field] if present[field] else 1.0 for field in FIELD_BOOSTS}
+
+        # Frecuencia BM25F de cada término por ítem: suma de campos con boost y largo normalizado
+        frequencies = defaultdict(dict)
+        for position, fields in enumerate(analyzed):
+            for field, boost in FIELD_BOOSTS.items():
+                terms = fields[field]
+                if not terms.length:
+                    continue
+                norm = 1 - BM25_B + BM25_B * terms.length / average[field]
+                for term, count in terms.counts.items():
+                    postings = frequencies[term]
+                    postings[position] = postings.get(position, 0.0) + boost * count / norm
+
+        self.postings: Dict[str, List[Tuple[int, float]]] = {}
+        for term, postings in frequencies.items():
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            self.postings[term] = [
+                (position, idf * tf * (BM25_K1 + 1) / (tf + BM25_K1))
+                for position, tf in postings.items()
+            ]
+        self.vocabulary = sorted(self.postings)
+
+    def _prefixed(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        terms = []
+        for term in self.vocabulary[start:start + PREFIX_EXPANSIONS + 1]:
+            if not term.startswith(prefix):
+                break
+            if term != prefix:
+                terms.append(term)
+        return terms[:PREFIX_EXPANSIONS]
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[float, dict]]:
+        """
+        Los `limit` ítems con mayor puntaje para una consulta ya normalizada,
+        entre los que calzan con todos sus términos (exacto, sinónimo o prefijo).
+
+        Returns:
+            (puntaje, ítem) de mayor a menor; empates en orden del catálogo
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        for token in tokens:
+            # Por ítem cuenta el mejor calce del término: exacto o por prefijo
+            best = {}
+            for position, weight in self.postings.get(token, ()):
+                best[position] = weight
+            if len(token) >= PREFIX_MIN_LENGTH:
+                for term in self._prefixed(token):
+                    for position, weight in self.postings[term]:
+                        weight *= PREFIX_WEIGHT
+                        if weight > best.get(position, 0.0):
+                            best[position] = weight
+            for position, weight in best.items():
+                scores[position] += weight
+                matched[position] += 1
+
+        candidates = ((position, score) for position, score in scores.items() if matched[position] == len(tokens))
+        top = heapq.nsmallest(limit, candidates, key=lambda entry: (-entry[1], entry[0]))
+        return [(score, self.items[position]) for position, score in top]
@@ -1,5 +1,22 @@
+"""
+Configuración dinámica del bot (documento `config/bot_settings`).
+
+Se mantiene en memoria como un snapshot inmutable con una versión que solo
+sube cuando el contenido cambia; otras cachés (modelo y prompt del agente)
+se indexan por esa versión.
+
+Un listener `on_snapshot` aplica los cambios del dashboard apenas ocurren,
+con polling cada SETTINGS_POLL_SECONDS si no está activo y un TTL de
+SETTINGS_CACHE_TTL_SECONDS sin ninguno de los dos (ver `live_snapshot`).
+"""
 import logging
-from app.services.firebase import db
+from types import MappingProxyType
+from typing import NamedTuple, Mapping, Optional
+
+from app.core.config import settings
+from app.services.firebase import db, count_firestore
+from app.services.live_snapshot import LiveSnapshot
+from app.services.metrics import gauge
 
 logger = logging.getLogger(__name__)
 
@@ -10,18 +27,103 @@ DEFAULT_SETTINGS = {
     "reminderMessage": "¿Sigues interesado en esta maquinaria? Si tienes dudas, estoy aquí para ayudarte. 🚜"
 }
 
-def get_bot_settings() -> dict:
-    """Obtiene la configuración del bot desde Firestore."""
+
+class SettingsSnapshot(NamedTuple):
+    version: int
+    data: Mapping
+
+
+def _doc_ref():
+    return db.collection("config").document("bot_settings")
+
+
+def _merge(data: Optional[dict]) -> dict:
+    # Merge with defaults to ensure all keys exist
+    return {**DEFAULT_SETTINGS, **(data or {})}
+
+
+def _read_bot_settings() -> Optional[dict]:
+    """Lee la configuración desde Firestore (None si la lectura falló)."""
     try:
-        doc_ref = db.collection("config").document("bot_settings")
-        doc = doc_ref.get()
-        
-        if doc.exists:
-            data = doc.to_dict()
-            # Merge with defaults to ensure all keys exist
-            return {**DEFAULT_SETTINGS, **data}
-            
-        return DEFAULT_SETTINGS
+        doc = _doc_ref().get()
+        count_firestore("config", "read")
+        return _merge(doc.to_dict() if doc.exists else None)
     except Exception as e:
         logger.error(f"Error reading bot settings: {e}")
-        return DEFAULT_SETTINGS
+        return None
+
+
+def _apply(data: Optional[dict]) -> SettingsSnapshot:
+    """Publica un nuevo snapshot si el contenido cambió."""
+    with _live.lock:
+        snapshot = _live.current
+        if data is None:
+            # Lectura fallida: conservar lo que había (o defaults si es la primera)
+            if snapshot is None:
+                snapshot = _live.current = SettingsSnapshot(1, MappingProxyType(dict(DEFAULT_SETTINGS)))
+            return snapshot
+
+        if snapshot is None or data != dict(snapshot.data):
+            version = (snapshot.version if snapshot else 0) + 1
+            snapshot = _live.current = SettingsSnapshot(version, MappingProxyType(data))
+            logger.info(f"⚙️ Configuración del bot v{version} cargada")
+        _live.mark_fetched()
+        return snapshot
+
+
+def _on_change(doc_snapshots, changes) -> None:
+    for doc in doc_snapshots:
+        count_firestore("config", "read")
+        _apply(_merge(doc.to_dict() if doc.exists else None))
+    if not doc_snapshots:
+        _apply(_merge(None))
+
+
+_live = LiveSnapshot(
+    "configuración",
+    read=lambda: _read_bot_settings(),
+    apply=_apply,
+    subscribe=lambda callback: _doc_ref().on_snapshot(callback),
+    on_change=_on_change,
+    poll_seconds=settings.SETTINGS_POLL_SECONDS,
+    ttl_seconds=settings.SETTINGS_CACHE_TTL_SECONDS,
+)
+
+
+def get_settings_snapshot() -> SettingsSnapshot:
+    """
+    Configuración vigente y su versión, sin ir a Firestore si está al día.
+
+    Returns:
+        SettingsSnapshot(version, data) con `data` de solo lectura
+    """
+    return _live.get()
+
+
+async def get_settings_snapshot_async() -> SettingsSnapshot:
+    """Igual que get_settings_snapshot, pero la lectura (si hace falta) va al pool bloqueante."""
+    return await _live.get_async()
+
+
+def get_bot_settings() -> dict:
+    """Obtiene la configuración del bot (copia mutable del snapshot vigente)."""
+    return dict(get_settings_snapshot().data)
+
+
+def get_settings_version() -> int:
+    snapshot = _live.current
+    return snapshot.version if snapshot else 0
+
+
+async def start_settings_listener() -> None:
+    """Carga inicial, listener en vivo y polling de respaldo (startup de la app)."""
+    await _live.start()
+
+
+async def stop_settings_listener() -> None:
+    """Detiene listener y polling (shutdown de la app)."""
+    await _live.stop()
+
+
+gauge("bot_settings_version", "Versión vigente de config/bot_settings", source=lambda: {(): get_settings_version()})
+gauge("bot_settings_listener_active", "1 si el listener on_snapshot está activo", source=lambda: {(): int(_live.listening)})
@@ -0,0 +1,386 @@
+"""
+Cola durable de turnos entrantes (spool local en SQLite).
+
+El webhook solo valida y persiste los eventos de Meta; un pool de workers
+drena la cola en segundo plano. Los eventos con la misma clave (teléfono) se
+entregan al handler en lotes ordenados, de a un lote por clave; claves
+distintas corren en paralelo.
+
+Cada lote se toma con un lease: la fila guarda la instancia dueña (`owner`)
+y hasta cuándo es suya (`lease_until`), y un heartbeat lo renueva mientras
+el turno sigue en curso. Solo las filas cuyo lease venció (la instancia
+murió o se reinició a mitad de turno) vuelven a 'pending'. El despliegue
+está pensado para una sola instancia (`--max-instances=1`); el lease cubre
+solapes breves como el de un rollout, no un reparto de carga entre
+instancias sobre NFS.
+"""
+import asyncio
+import functools
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+_wakeup: Optional[asyncio.Event] = None
+_workers: list = []
+_stopping = False
+_heartbeat: Optional[asyncio.Task] = None
+# Un solo hilo para el SQLite del spool: las escrituras se serializan igual, y así
+# ni el webhook ni los workers bloquean el event loop esperando el lock del archivo
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spool")
+# Identifica a esta base del spool; junto al id de fila y la instancia forma el token con que se reclaman mensajes
+_spool_uuid: Optional[str] = None
+# Identifica a este proceso como dueño de los lotes que toma
+_instance_id = uuid.uuid4().hex
+
+
+# Sistemas de archivos que viven en memoria de la instancia
+_EPHEMERAL_PREFIXES = ("/tmp/", "/dev/shm/", "/run/")
+
+
+def init_spool(path: str = None) -> None:
+    """
+    Abre (o crea) la base SQLite del spool.
+
+    Raises:
+        RuntimeError: si no hay SPOOL_PATH configurado; sin un volumen
+            persistente la cola no sobrevive a la instancia
+    """
+    global _conn, _spool_uuid
+    path = path or settings.SPOOL_PATH
+    if not path:
+        raise RuntimeError(
+            "SPOOL_PATH no está configurado: apúntalo a un volumen persistente "
+            "(p. ej. /mnt/spool/maci_spool.db) para que los turnos pendientes sobrevivan a la instancia"
+        )
+    if path.startswith(_EPHEMERAL_PREFIXES):
+        logger.warning(f"⚠️ Spool en {path}: es almacenamiento efímero, los turnos pendientes se pierden con la instancia")
+
+    with _lock:
+        if _conn is not None:
+            return
+        _conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL (por defecto) + NORMAL: cada commit sobrevive a un crash del proceso sin pagar fsync por mensaje
+        _conn.execute(f"PRAGMA journal_mode={settings.SPOOL_JOURNAL_MODE}")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS inbound (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                last_error TEXT
+            )
+        """)
+        # Spools creados antes de existir la clave de orden
+        columns = {row[1] for row in _conn.execute("PRAGMA table_info(inbound)")}
+        if "key" not in columns:
+            _conn.execute("ALTER TABLE inbound ADD COLUMN key TEXT")
+        # ...y antes de existir el lease
+        if "owner" not in columns:
+            _conn.execute("ALTER TABLE inbound ADD COLUMN owner TEXT")
+        if "lease_until" not in columns:
+            _conn.execute("ALTER TABLE inbound ADD COLUMN lease_until REAL")
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_inbound_status ON inbound (status, id)")
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_inbound_key ON inbound (key, status)")
+        _conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        _conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('spool_uuid', ?)", (uuid.uuid4().hex,))
+        _spool_uuid = _conn.execute("SELECT value FROM meta WHERE key = 'spool_uuid'").fetchone()[0]
+
+
+def _db() -> sqlite3.Connection:
+    if _conn is None:
+        init_spool()
+    return _conn
+
+
+async def _run(func: Callable, *args) -> Any:
+    """Ejecuta una operación del spool en su hilo dedicado."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args))
+
+
+def enqueue(payload: dict, key: str = None) -> int:
+    """Persiste un evento y despierta a los workers."""
+    return enqueue_many([(payload, key)])[0]
+
+
+def enqueue_many(items: list) -> list:
+    """Persiste varios (payload, key) en una sola transacción y despierta a los workers."""
+    ids = _insert_many(items)
+    if _wakeup is not None and ids:
+        _wakeup.set()
+    return ids
+
+
+async def enqueue_many_async(items: list) -> list:
+    """Igual que enqueue_many, pero la escritura va al hilo del spool (webhook)."""
+    ids = await _run(_insert_many, items)
+    # asyncio.Event no es thread-safe: se despierta a los workers desde el loop
+    if _wakeup is not None and ids:
+        _wakeup.set()
+    return ids
+
+
+def _insert_many(items: list) -> list:
+    now = time.time()
+    ids = []
+    with _lock:
+        db = _db()
+        db.execute("BEGIN")
+        try:
+            for payload, key in items:
+                cur = db.execute(
+                    "INSERT INTO inbound (key, payload, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(payload, ensure_ascii=False), now, now)
+                )
+                ids.append(cur.lastrowid)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+    return ids
+
+
+def claim_batch() -> Optional[list]:
+    """
+    Toma todos los eventos pendientes de la clave más antigua que esté lista
+    y los marca como 'processing'.
+
+    Una clave está lista cuando no tiene otro lote en curso y su último evento
+    lleva al menos COALESCE_WINDOW_SECONDS en cola (o el primero lleva
+    COALESCE_MAX_WAIT_SECONDS). Así una ráfaga de mensajes cortos del mismo
+    teléfono, o lo que llegue mientras su turno anterior sigue en curso, se
+    procesa como un único turno.
+
+    La lectura y el marcado van en una transacción `BEGIN IMMEDIATE`: otra
+    instancia sobre el mismo archivo no puede tomar las mismas filas.
+
+    Returns:
+        Lista de (id, payload, número de intento, dueño anterior) o None si
+        no hay nada listo
+    """
+    with _lock:
+        db = _db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = _claim_rows(db, time.time())
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+    if not rows:
+        return None
+    return [(item_id, json.loads(payload), attempts + 1, owner) for item_id, payload, attempts, owner in rows]
+
+
+def _claim_rows(db: sqlite3.Connection, now: float) -> list:
+    """Marca como propio el próximo lote listo (dentro de la transacción de claim_batch)."""
+    row = db.execute(
+        """
+        SELECT key, MIN(id) FROM inbound
+        WHERE status = 'pending'
+          AND (key IS NULL OR key NOT IN (
+              SELECT key FROM inbound WHERE status = 'processing' AND key IS NOT NULL
+          ))
+        GROUP BY COALESCE(key, 'id:' || id)
+        HAVING MAX(created_at) <= ? OR MIN(created_at) <= ?
+        ORDER BY MIN(id) LIMIT 1
+        """,
+        (now - settings.COALESCE_WINDOW_SECONDS, now - settings.COALESCE_MAX_WAIT_SECONDS)
+    ).fetchone()
+    if not row:
+        return []
+
+    key, first_id = row
+    if key is None:
+        rows = db.execute(
+            "SELECT id, payload, attempts, owner FROM inbound WHERE id = ?", (first_id,)
+        ).fetchall()
+    else:
+        rows = db.execute(
+            """
+            SELECT id, payload, attempts, owner FROM inbound
+            WHERE key = ? AND status = 'pending'
+            ORDER BY id LIMIT ?
+            """,
+            (key, settings.COALESCE_MAX_EVENTS)
+        ).fetchall()
+
+    db.executemany(
+        """
+        UPDATE inbound
+        SET status = 'processing', attempts = attempts + 1, owner = ?, lease_until = ?, updated_at = ?
+        WHERE id = ?
+        """,
+        [(_instance_id, now + settings.SPOOL_LEASE_SECONDS, now, item_id) for item_id, _, _, _ in rows]
+    )
+    return rows
+
+
+def claim_token(item_id: int, owner: Optional[str] = None) -> str:
+    """Token con que una fila del spool reclama sus mensajes: base, fila e instancia dueña."""
+    return f"{_spool_uuid}:{item_id}:{owner or _instance_id}"
+
+
+def complete(item_ids: list) -> None:
+    """Elimina eventos ya procesados (si el lote sigue siendo de esta instancia)."""
+    with _lock:
+        _db().executemany(
+            "DELETE FROM inbound WHERE id = ? AND owner = ?",
+            [(item_id, _instance_id) for item_id in item_ids]
+        )
+
+
+def release(item_ids: list, error: str = None) -> None:
+    """Devuelve eventos fallidos a la cola, o los marca 'dead' si agotaron los intentos."""
+    now = time.time()
+    with _lock:
+        _db().executemany(
+            """
+            UPDATE inbound
+            SET status = CASE WHEN attempts >= ? THEN 'dead' ELSE 'pending' END,
+                lease_until = NULL, last_error = ?, updated_at = ?
+            WHERE id = ? AND owner = ? AND status = 'processing'
+            """,
+            [(settings.SPOOL_MAX_ATTEMPTS, error, now, item_id, _instance_id) for item_id in item_ids]
+        )
+
+
+def renew_leases() -> int:
+    """Extiende el lease de los lotes que esta instancia tiene en curso."""
+    now = time.time()
+    with _lock:
+        cur = _db().execute(
+            "UPDATE inbound SET lease_until = ? WHERE status = 'processing' AND owner = ?",
+            (now + settings.SPOOL_LEASE_SECONDS, _instance_id)
+        )
+    return cur.rowcount
+
+
+def recover_in_flight() -> int:
+    """
+    Reencola los payloads cuyo lease venció: la instancia que los tomó murió
+    o se reinició a mitad de turno. Conservan `owner` para que el reintento
+    pueda recuperar los mensajes que esa instancia ya había reclamado.
+    """
+    now = time.time()
+    with _lock:
+        cur = _db().execute(
+            """
+            UPDATE inbound SET status = 'pending', lease_until = NULL, updated_at = ?
+            WHERE status = 'processing' AND (lease_until IS NULL OR lease_until < ?)
+            """,
+            (now, now)
+        )
+    return cur.rowcount
+
+
+def get_spool_stats() -> dict:
+    """Cantidad de payloads por estado."""
+    with _lock:
+        rows = _db().execute("SELECT status, COUNT(*) FROM inbound GROUP BY status").fetchall()
+    return {status: count for status, count in rows}
+
+
+async def _worker_loop(worker_id: int, handler: Callable[[list], Awaitable[None]]) -> None:
+    # wait_for puede tragarse la cancelación si coincide con el wakeup (Python < 3.12):
+    # sin esta bandera el worker seguiría tomando lotes después de stop_workers
+    while not _stopping:
+        batch = await _run(claim_batch)
+        if batch is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=settings.SPOOL_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+            continue
+
+        item_ids = [item_id for item_id, _, _, _ in batch]
+        payloads = []
+        for item_id, payload, attempt, previous_owner in batch:
+            # Permite al handler distinguir un reintento propio de un reenvío de Meta:
+            # solo la misma fila puede volver a reclamar su mensaje, con su token
+            # actual o con el del intento anterior (otra instancia cuyo lease venció)
+            payload["attempt"] = attempt
+            payload["claim_token"] = claim_token(item_id)
+            payload["previous_claim_token"] = claim_token(item_id, previous_owner) if previous_owner else None
+            payloads.append(payload)
+        try:
+            await handler(payloads)
+            await _run(complete, item_ids)
+            # Puede haber eventos de la misma clave esperando a que terminara este lote
+            _wakeup.set()
+        except asyncio.CancelledError:
+            # Sin await: la tarea ya está cancelada y la fila debe liberarse igual
+            release(item_ids, "worker detenido")
+            raise
+        except Exception as e:
+            logger.error(f"❌ Worker {worker_id} falló procesando lote {item_ids}: {e}", exc_info=True)
+            await _run(release, item_ids, str(e))
+
+
+async def _heartbeat_loop() -> None:
+    """Renueva los leases propios y reencola los lotes cuyo dueño dejó de renovarlos."""
+    while True:
+        await asyncio.sleep(settings.SPOOL_LEASE_SECONDS / 3)
+        try:
+            await _run(renew_leases)
+            recovered = await _run(recover_in_flight)
+            if recovered:
+                logger.warning(f"♻️ {recovered} turnos con lease vencido devueltos a la cola")
+                _wakeup.set()
+        except Exception as e:
+            logger.error(f"Error renovando leases del spool: {e}")
+
+
+async def start_workers(handler: Callable[[list], Awaitable[None]], concurrency: int = None) -> None:
+    """Recupera turnos interrumpidos y lanza el pool de workers."""
+    global _wakeup, _stopping, _heartbeat
+    await _run(init_spool)
+    _wakeup = asyncio.Event()
+    _stopping = False
+
+    recovered = await _run(recover_in_flight)
+    if recovered:
+        logger.warning(f"♻️ {recovered} turnos interrumpidos devueltos a la cola")
+
+    for worker_id in range(concurrency or settings.SPOOL_WORKERS):
+        _workers.append(asyncio.create_task(_worker_loop(worker_id, handler)))
+    _heartbeat = asyncio.create_task(_heartbeat_loop())
+    logger.info(f"🧵 {len(_workers)} workers del spool iniciados")
+
+
+async def stop_workers(timeout: float = 0) -> None:
+    """
+    Detiene los workers. Los lotes en curso tienen hasta `timeout` segundos
+    para terminar; los que sigan en curso vuelven a la cola.
+    """
+    global _stopping, _heartbeat
+    _stopping = True
+    if _workers and timeout:
+        # Despierta a los workers ociosos para que salgan sin esperar el polling
+        _wakeup.set()
+        await asyncio.wait(_workers, timeout=timeout)
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    # El heartbeat se detiene al final: los lotes en curso conservan su lease hasta liberarse
+    if _heartbeat is not None:
+        _heartbeat.cancel()
+        await asyncio.gather(_heartbeat, return_exceptions=True)
+        _heartbeat = None
@@ -0,0 +1,190 @@
+"""
+Servicio de transcripción de notas de voz con Gemini (multimodal).
+
+- Un solo modelo del backend de LLM reutilizado entre transcripciones.
+- Caché por media_id (reintentos y reenvíos de Meta) y por hash SHA-256 del
+  contenido (audios reenviados entre clientes), LRU en memoria más la
+  colección `transcripciones` en Firestore.
+- Límite de transcripciones simultáneas hacia Gemini.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+
+from app.core.config import settings
+from app.services.cache import TTLCache
+from app.services.executor import run_blocking
+from app.services.firebase import db, count_firestore
+from app.services.llm import generate
+from app.services.llm_backend import get_backend
+from app.services.whatsapp import get_media_url, download_media
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "transcripciones"
+
+TRANSCRIPTION_PROMPT = """
+Transcribe este mensaje de voz de WhatsApp.
+Contexto: Un cliente agricultor chileno consultando por maquinaria.
+Idioms: Puede contener modismos chilenos o términos técnicos agrícolas.
+Tarea: Transcribe exactamente lo que dice el usuario. Si hay ruido, ignóralo.
+"""
+
+_model = None
+_semaphore = None
+_by_media_id = TTLCache(
+    maxsize=settings.TRANSCRIPTION_CACHE_SIZE, ttl=settings.TRANSCRIPTION_CACHE_TTL_SECONDS,
+    name="transcription_media_id"
+)
+_by_hash = TTLCache(
+    maxsize=settings.TRANSCRIPTION_CACHE_SIZE, ttl=settings.TRANSCRIPTION_CACHE_TTL_SECONDS,
+    name="transcription_hash"
+)
+_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "media_id_hits": 0,
+    "hash_hits": 0,
+    "store_hits": 0,
+    "transcribed": 0,
+    "errors": 0,
+    "gemini_seconds_total": 0.0,
+    "gemini_seconds_max": 0.0
+}
+
+
+def _get_model():
+    global _model
+    if _model is None:
+        _model = get_backend().model(settings.MODEL_NAME)
+    return _model
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.TRANSCRIPTION_CONCURRENCY)
+    return _semaphore
+
+
+def _count(key: str, value: float = 1) -> None:
+    with _lock:
+        _stats[key] += value
+
+
+def _load_stored(content_hash: str) -> str:
+    doc = db.collection(COLLECTION).document(content_hash).get()
+    count_firestore(COLLECTION, "read")
+    if doc.exists:
+        return (doc.to_dict() or {}).get("text", "")
+    return ""
+
+
+def _store(content_hash: str, text: str, mime_type: str) -> None:
+    db.collection(COLLECTION).document(content_hash).set({
+        "text": text,
+        "mime_type": mime_type,
+        "created_at": datetime.now(timezone.utc)
+    })
+    count_firestore(COLLECTION, "write")
+
+
+async def transcribe_audio(audio_bytes: bytes, mime_type: str = "audio/ogg") -> str:
+    """Transcribe audio usando Gemini Flash (Multimodal), sin caché."""
+    # Limpiar mime-type (WhatsApp envía 'audio/ogg; codecs=opus')
+    if ";" in mime_type:
+        mime_type = mime_type.split(";")[0]
+
+    part = get_backend().audio_part(audio_bytes, mime_type)
+    async with _get_semaphore():
+        start = time.perf_counter()
+        try:
+            response = await generate(
+                _get_model(), [part, TRANSCRIPTION_PROMPT], "transcription",
+                generation_config={"temperature": 0.0}
+            )
+        finally:
+            elapsed = time.perf_counter() - start
+            with _lock:
+                _stats["gemini_seconds_total"] += elapsed
+                _stats["gemini_seconds_max"] = max(_stats["gemini_seconds_max"], elapsed)
+    return response.text.strip()
+
+
+async def transcribe_media(media_id: str, mime_type: str = "audio/ogg") -> str:
+    """
+    Transcribe una nota de voz de WhatsApp por su media_id, usando las cachés.
+
+    Returns:
+        Texto transcrito, o "" si falló la descarga o la transcripción
+    """
+    _count("requests")
+
+    cached = _by_media_id.get(media_id)
+    if cached:
+        _count("media_id_hits")
+        return cached
+
+    try:
+        url = await get_media_url(media_id)
+        if not url:
+            logger.error("Error obteniendo URL de audio")
+            _count("errors")
+            return ""
+
+        audio_content = await download_media(url, max_bytes=settings.TRANSCRIPTION_MAX_BYTES)
+        if not audio_content:
+            logger.error("Error descargando audio content")
+            _count("errors")
+            return ""
+
+        content_hash = hashlib.sha256(audio_content).hexdigest()
+
+        text = _by_hash.get(content_hash)
+        if text:
+            _count("hash_hits")
+        else:
+            try:
+                text = await run_blocking(_load_stored, content_hash)
+            except Exception as e:
+                logger.error(f"Error leyendo transcripción guardada: {e}")
+                text = ""
+
+            if text:
+                _count("store_hits")
+            else:
+                text = await transcribe_audio(audio_content, mime_type)
+                if not text:
+                    _count("errors")
+                    return ""
+                _count("transcribed")
+                try:
+                    await run_blocking(_store, content_hash, text, mime_type)
+                except Exception as e:
+                    logger.error(f"Error guardando transcripción: {e}")
+
+            _by_hash.set(content_hash, text)
+
+        _by_media_id.set(media_id, text)
+        return text
+
+    except Exception as e:
+        logger.error(f"❌ Error transcribiendo audio: {e}")
+        _count("errors")
+        return ""
+
+
+def get_transcription_stats() -> dict:
+    """Métricas de caché y latencia de transcripción."""
+    with _lock:
+        stats = dict(_stats)
+    cache_hits = stats["media_id_hits"] + stats["hash_hits"] + stats["store_hits"]
+    stats["cache_hit_ratio"] = round(cache_hits / stats["requests"], 4) if stats["requests"] else 0.0
+    stats["gemini_seconds_avg"] = (
+        round(stats["gemini_seconds_total"] / stats["transcribed"], 3) if stats["transcribed"] else 0.0
+    )
+    return stats
@@ -2,8 +2,9 @@
 Servicio de WhatsApp para envío y recepción de mensajes/medios.
 """
 import logging
-import requests
+import httpx
 from app.core.config import settings
+from app.services.http_client import GRAPH_API_URL, get_http_client, graph_headers, record_graph_call
 
 logger = logging.getLogger(__name__)
 
@@ -36,18 +37,15 @@ def split_message(message: str, max_length: int = MAX_CHARS) -> list:
     return chunks
 
 
-def send_message(phone: str, message: str) -> bool:
+async def send_message(phone: str, message: str) -> bool:
     """Envía un mensaje de texto"""
     if not settings.META_TOKEN or not settings.PHONE_NUMBER_ID:
         logger.warning("⚠️ META_TOKEN o PHONE_NUMBER_ID no configurados")
         return False
     
     chunks = split_message(message)
-    url = f"https://graph.facebook.com/v18.0/{settings.PHONE_NUMBER_ID}/messages"
-    headers = {
-        "Authorization": f"Bearer {settings.META_TOKEN}",
-        "Content-Type": "application/json"
-    }
+    url = f"{GRAPH_API_URL}/{settings.PHONE_NUMBER_ID}/messages"
+    client = get_http_client()
     
     for chunk in chunks:
         data = {
@@ -56,21 +54,22 @@ def send_message(phone: str, message: str) -> bool:
             "text": {"body": chunk}
         }
         try:
-            requests.post(url, headers=headers, json=data, timeout=10).raise_for_status()
+            (await client.post(url, headers=graph_headers(), json=data, timeout=10)).raise_for_status()
+            record_graph_call("text")
         except Exception as e:
+            record_graph_call("text", e)
             logger.error(f"❌ Error enviando mensaje: {e}")
             return False
     return True
 
 
-def send_image(phone: str, image_url: str, caption: str = "") -> bool:
+async def send_image(phone: str, image_url: str, caption: str = "") -> bool:
     """Envía una imagen"""
     if not settings.META_TOKEN or not settings.PHONE_NUMBER_ID:
         logger.warning("⚠️ META_TOKEN o PHONE_NUMBER_ID no configurados para imagen")
         return False
     
-    url = f"https://graph.facebook.com/v18.0/{settings.PHONE_NUMBER_ID}/messages"
-    headers = {"Authorization": f"Bearer {settings.META_TOKEN}", "Content-Type": "application/json"}
+    url = f"{GRAPH_API_URL}/{settings.PHONE_NUMBER_ID}/messages"
     
     data = {
         "messaging_product": "whatsapp",
@@ -81,11 +80,13 @@ def send_image(phone: str, image_url: str, caption: str = "") -> bool:
     if caption: data["image"]["caption"] = caption[:1024]
     
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=15)
+        response = await get_http_client().post(url, headers=graph_headers(), json=data, timeout=15)
         response.raise_for_status()
+        record_graph_call("image")
         logger.info(f"✅ Imagen enviada exitosamente a {phone}")
         return True
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
+        record_graph_call("image", e)
         # Log detallado del error de la API de WhatsApp
         try:
             error_detail = e.response.json()
@@ -94,17 +95,17 @@ def send_image(phone: str, image_url: str, caption: str = "") -> bool:
             logger.error(f"❌ Error HTTP enviando imagen: {e}")
         return False
     except Exception as e:
+        record_graph_call("image", e)
         logger.error(f"❌ Error enviando imagen: {e}")
         return False
 
 
-def send_document(phone: str, document_url: str, filename: str = "", caption: str = "") -> bool:
+async def send_document(phone: str, document_url: str, filename: str = "", caption: str = "") -> bool:
     """Envía un documento"""
     if not settings.META_TOKEN or not settings.PHONE_NUMBER_ID:
         return False
     
-    url = f"https://graph.facebook.com/v18.0/{settings.PHONE_NUMBER_ID}/messages"
-    headers = {"Authorization": f"Bearer {settings.META_TOKEN}", "Content-Type": "application/json"}
+    url = f"{GRAPH_API_URL}/{settings.PHONE_NUMBER_ID}/messages"
     
     data = {
         "messaging_product": "whatsapp",
@@ -116,39 +117,103 @@ def send_document(phone: str, document_url: str, filename: str = "", caption: st
     if caption: data["document"]["caption"] = caption[:1024]
     
     try:
-        requests.post(url, headers=headers, json=data, timeout=10).raise_for_status()
+        (await get_http_client().post(url, headers=graph_headers(), json=data, timeout=10)).raise_for_status()
+        record_graph_call("document")
         return True
     except Exception as e:
+        record_graph_call("document", e)
         logger.error(f"❌ Error enviando documento: {e}")
         return False
 
 
-def get_media_url(media_id: str) -> str:
+async def get_media_url(media_id: str) -> str:
     """Obtiene la URL de descarga de un medio de WhatsApp"""
     if not settings.META_TOKEN: return ""
     
-    url = f"https://graph.facebook.com/v18.0/{media_id}"
-    headers = {"Authorization": f"Bearer {settings.META_TOKEN}"}
+    url = f"{GRAPH_API_URL}/{media_id}"
     
     try:
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = await get_http_client().get(url, headers=graph_headers(json_body=False), timeout=10)
         resp.raise_for_status()
+        record_graph_call("media_url")
         return resp.json().get("url", "")
     except Exception as e:
+        record_graph_call("media_url", e)
         logger.error(f"❌ Error obteniendo URL de media {media_id}: {e}")
         return ""
 
 
-def download_media(media_url: str) -> bytes:
-    """Descarga el contenido binario del medio"""
+async def download_media(media_url: str, max_bytes: int = None) -> bytes:
+    """Descarga el contenido binario del medio (en streaming, cortando si excede max_bytes)"""
     if not settings.META_TOKEN: return None
     
-    headers = {"Authorization": f"Bearer {settings.META_TOKEN}"}
-    
     try:
-        resp = requests.get(media_url, headers=headers, timeout=30)
-        resp.raise_for_status()
-        return resp.content
+        client = get_http_client()
+        async with client.stream("GET", media_url, headers=graph_headers(json_body=False), timeout=30) as resp:
+            resp.raise_for_status()
+            chunks = []
+            size = 0
+            async for chunk in resp.aiter_bytes():
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    record_graph_call("media_download", reason="too_large")
+                    logger.error(f"❌ Media excede el límite de {max_bytes} bytes")
+                    return None
+                chunks.append(chunk)
+        record_graph_call("media_download")
+        return b"".join(chunks)
     except Exception as e:
+        record_graph_call("media_download", e)
         logger.error(f"❌ Error descargando media: {e}")
         return None
+
+
+def parse_webhook_events(data: dict) -> list:
+    """
+    Recorre todo el envelope del webhook (entry → changes → messages) y
+    normaliza cada mensaje entrante.
+    
+    Meta agrupa varios mensajes y remitentes en un mismo POST bajo carga,
+    así que ningún índice se asume fijo.
+    
+    Returns:
+        Lista de eventos con message_id, phone, name, type, timestamp,
+        text, media_id y mime_type
+    """
+    events = []
+    
+    for entry in data.get("entry") or []:
+        for change in entry.get("changes") or []:
+            value = change.get("value") or {}
+            contacts = {
+                c.get("wa_id"): (c.get("profile") or {}).get("name")
+                for c in value.get("contacts") or []
+            }
+            
+            for message in value.get("messages") or []:
+                phone = message.get("from")
+                if not phone:
+                    continue
+                
+                msg_type = message.get("type")
+                event = {
+                    "message_id": message.get("id"),
+                    "phone": phone,
+                    "name": contacts.get(phone),
+                    "type": msg_type,
+                    "timestamp": message.get("timestamp"),
+                    "text": "",
+                    "media_id": None,
+                    "mime_type": None
+                }
+                
+                if msg_type == "text":
+                    event["text"] = (message.get("text") or {}).get("body", "")
+                elif msg_type == "audio":
+                    audio = message.get("audio") or {}
+                    event["media_id"] = audio.get("id")
+                    event["mime_type"] = audio.get("mime_type", "audio/ogg")
+                
+                events.append(event)
+    
+    return events
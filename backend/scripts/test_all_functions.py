@@ -3,6 +3,7 @@
 Test comprehensivo de todas las funciones del agente.
 """
 
+import asyncio
 import sys
 import os
 from pathlib import Path
@@ -27,7 +28,7 @@ def print_test(test_name):
 def send_message(message, phone="+56912345678"):
     """Envía mensaje y muestra respuesta."""
     print(f"👤 Cliente: {message}")
-    response = process_message(message, chat_history=[], client_phone=phone)
+    response = asyncio.run(process_message(message, chat_history=[], client_phone=phone))
     print(f"\n🤖 Agente: {response.get('text', 'ERROR')}")
     
     if response.get('images'):
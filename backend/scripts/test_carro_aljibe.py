@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 """Test conversación completa con Carro Aljibe."""
+import asyncio
 import sys
 from pathlib import Path
 
@@ -17,7 +18,7 @@ history = []
 # Paso 1: Pedir transporte
 msg = 'necesito algo para transporte'
 print(f'\n👤: {msg}')
-r = process_message(msg, history, phone)
+r = asyncio.run(process_message(msg, history, phone))
 print(f'🤖: {r["text"][:150]}...')
 history.extend([
     {'role': 'user', 'content': msg},
@@ -30,7 +31,7 @@ if 'aljibe' in r['text'].lower():
 # Paso 2: Pedir Carro Aljibe
 msg = 'me interesa el carro aljibe'
 print(f'\n👤: {msg}')
-r = process_message(msg, history, phone)
+r = asyncio.run(process_message(msg, history, phone))
 print(f'🤖: {r["text"][:200]}...')
 history.extend([
     {'role': 'user', 'content': msg},
@@ -45,7 +46,7 @@ else:
 # Paso 3: Preguntar precio
 msg = 'cuanto cuesta?'
 print(f'\n👤: {msg}')
-r = process_message(msg, history, phone)
+r = asyncio.run(process_message(msg, history, phone))
 print(f'🤖: {r["text"]}')
 
 print('\n' + '=' * 70)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test del catálogo en memoria (app/services/catalog.py).
+
+Con una consulta de Firestore simulada verifica que:
+1. El catálogo se lee una vez; las búsquedas no vuelven a Firestore.
+2. Altas, cambios y bajas del listener se ven en la siguiente búsqueda.
+3. La versión sube con cada cambio real y no con eventos repetidos.
+4. Tomar el snapshot cuesta microsegundos, no un viaje a Firestore.
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services import catalog
+from app.services.catalog import get_catalog_version
+from app.services.firebase import FIRESTORE_OPS
+from app.services.maquinarias import (
+    get_all_categories, get_maquinaria, resolve_maquinarias, search_maquinarias
+)
+
+ITEMS = {
+    "arado-1": {"nombre": "Arado de Discos", "categoria": "Preparación de suelo", "tags": ["arado"], "activa": True},
+    "aljibe-1": {"nombre": "Carro Aljibe 3000L", "categoria": "Transporte", "tags": ["agua"], "activa": True},
+    "rastra-1": {"nombre": "Rastra Offset", "categoria": "Preparación de suelo", "tags": ["grada"], "activa": True},
+}
+
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeWatch:
+    is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+
+
+class FakeQuery:
+    """Consulta `activa == True`: stream() cuenta lecturas y on_snapshot guarda el callback."""
+
+    def __init__(self):
+        self.streams = 0
+        self.callback = None
+
+    def stream(self):
+        self.streams += 1
+        return [FakeDoc(doc_id, data) for doc_id, data in ITEMS.items()]
+
+    def on_snapshot(self, callback):
+        self.callback = callback
+        # Como Firestore: el primer evento trae todo el resultado como ADDED
+        self.emit(*(("ADDED", doc_id, data) for doc_id, data in ITEMS.items()))
+        return FakeWatch()
+
+    def emit(self, *events):
+        changes = [
+            SimpleNamespace(type=SimpleNamespace(name=kind), document=FakeDoc(doc_id, data))
+            for kind, doc_id, data in events
+        ]
+        self.callback([], changes, None)
+
+
+def reads() -> int:
+    return FIRESTORE_OPS.snapshot().get(("maquinarias", "read"), 0)
+
+
+async def main_async() -> int:
+    query = FakeQuery()
+    catalog._query = lambda: query
+    errors = []
+
+    def check(condition, message):
+        print(f"{'✅' if condition else '❌'} {message}")
+        if not condition:
+            errors.append(message)
+
+    await catalog.start_catalog_listener()
+    version = get_catalog_version()
+    check(version == 1, f"Carga inicial + primer evento del listener = una versión (v{version})")
+
+    for _ in range(1000):
+        search_maquinarias("arado")
+        resolve_maquinarias(["Carro Aljibe", "Rastra"])
+        get_all_categories()
+    check(query.streams == 1, f"3000 consultas con {query.streams} lectura completa de la colección")
+
+    query.emit(("ADDED", "tractor-1", {"nombre": "Tractor 75HP", "categoria": "Tracción", "tags": [], "activa": True}))
+    found = [m["id"] for m in search_maquinarias("tractor")]
+    check(found == ["tractor-1"] and get_catalog_version() == version + 1, f"Alta visible: {found} (v{get_catalog_version()})")
+
+    query.emit(("MODIFIED", "arado-1", {**ITEMS["arado-1"], "precioReferencia": 1600000}))
+    price = get_maquinaria("arado-1").get("precioReferencia")
+    check(price == 1600000 and get_catalog_version() == version + 2, f"Cambio visible: precio {price} (v{get_catalog_version()})")
+
+    query.emit(("MODIFIED", "arado-1", {**ITEMS["arado-1"], "precioReferencia": 1600000}))
+    check(get_catalog_version() == version + 2, "Evento repetido sin cambios no sube la versión")
+
+    query.emit(("REMOVED", "aljibe-1", ITEMS["aljibe-1"]))
+    found = [m["id"] for m in search_maquinarias("aljibe")]
+    check(not found and get_catalog_version() == version + 3, f"Baja visible: {found} (v{get_catalog_version()})")
+    check("Transporte" not in get_all_categories(), f"Categorías al día: {get_all_categories()}")
+
+    start = time.perf_counter()
+    for _ in range(10000):
+        catalog.get_catalog_snapshot()
+    snapshot_us = (time.perf_counter() - start) / 10000 * 1e6
+    check(snapshot_us < 50, f"Acceso al snapshot: {snapshot_us:.2f} µs (antes: un viaje a Firestore)")
+    print(f"📊 Lecturas de maquinarias registradas: {reads()}")
+
+    await catalog.stop_catalog_listener()
+    print("=" * 60)
+    if errors:
+        print(f"❌ {len(errors)} errores")
+        return 1
+    print("✅ Catálogo en memoria al día sin releer Firestore")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main_async()))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test de estrés: cientos de conversaciones intercaladas sin cruce de datos.
+
+Cada conversación pide agendar una reunión sin dar su teléfono, así que
+`agendar_reunion` debe tomarlo del contexto del turno. Gemini y Firestore
+se simulan con latencias aleatorias para que los turnos se intercalen
+(incluido el pool bloqueante). Se verifica que cada reunión quede con el
+teléfono de su conversación y que cada respuesta mencione solo ese teléfono.
+"""
+import asyncio
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+# Sin cuota local: se mide el aislamiento, no el rate limit del gateway
+os.environ["LLM_RPM"] = "0"
+os.environ["LLM_TPM"] = "0"
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services import agent
+from app.services.llm_backend import ScriptedBackend, ScriptedCall, ScriptedRule, set_backend
+
+N_CONVERSATIONS = 300
+TURNS_PER_CONVERSATION = 3
+MAX_GEMINI_LATENCY = 0.05
+MAX_FIRESTORE_LATENCY = 0.02
+
+meetings = []
+
+
+# Gemini simulado: siempre pide agendar_reunion con el correo del mensaje
+SCRIPT = [
+    ScriptedRule(r"\S+@test\.cl", ScriptedCall(
+        "agendar_reunion", lambda m: {"cliente_email": m.group(0), "horario_preferido": "mañana 10:00"}
+    ))
+]
+
+
+async def fake_settings():
+    return 1, {"maxDiscount": 10}
+
+
+def fake_schedule_meeting(phone, client_email, meeting_time, meeting_type):
+    time.sleep(random.uniform(0, MAX_FIRESTORE_LATENCY))
+    meetings.append((phone, client_email))
+    return True
+
+
+def patch_services():
+    set_backend(ScriptedBackend(SCRIPT, latency=0.0, jitter=MAX_GEMINI_LATENCY))
+    agent.get_settings_snapshot_async = fake_settings
+    agent.schedule_meeting = fake_schedule_meeting
+    agent.search_maquinarias = lambda *args, **kwargs: []
+
+
+async def conversation(i: int) -> list:
+    """Turnos consecutivos de un cliente; retorna los errores de cruce encontrados."""
+    phone = f"569{i:08d}"
+    email = f"cliente{i}@test.cl"
+    errors = []
+    for turn in range(TURNS_PER_CONVERSATION):
+        await asyncio.sleep(random.uniform(0, MAX_GEMINI_LATENCY))
+        result = await agent.process_message(
+            f"Agenda una reunión, mi correo es {email} (turno {turn})",
+            chat_history=[],
+            client_phone=phone
+        )
+        phones = set(re.findall(r"569\d{8}", result["text"]))
+        if phones != {phone}:
+            errors.append(f"{phone} recibió respuesta con {phones or 'sin teléfono'}")
+    return errors
+
+
+async def main_async():
+    patch_services()
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(conversation(i) for i in range(N_CONVERSATIONS)))
+    elapsed = time.perf_counter() - start
+
+    errors = [e for conv in results for e in conv]
+    expected = {f"569{i:08d}": f"cliente{i}@test.cl" for i in range(N_CONVERSATIONS)}
+    for phone, email in meetings:
+        if expected.get(phone) != email:
+            errors.append(f"Reunión de {email} agendada con el teléfono {phone}")
+    total = N_CONVERSATIONS * TURNS_PER_CONVERSATION
+
+    print("=" * 60)
+    print(f"💬 {N_CONVERSATIONS} conversaciones x {TURNS_PER_CONVERSATION} turnos en {elapsed:.2f}s")
+    print(f"📅 Reuniones agendadas: {len(meetings)}/{total}")
+    print("=" * 60)
+
+    if len(meetings) != total:
+        errors.append(f"Se esperaban {total} reuniones y se agendaron {len(meetings)}")
+    if errors:
+        for error in errors[:10]:
+            print(f"❌ {error}")
+        print(f"❌ {len(errors)} cruces entre conversaciones")
+        return 1
+    if agent.current_turn() is not None:
+        print("❌ El contexto del turno quedó fijado fuera de process_message")
+        return 1
+    print("✅ Sin cruce de datos entre conversaciones concurrentes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main_async()))
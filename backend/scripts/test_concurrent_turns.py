@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Test de concurrencia: varios webhooks simultáneos no deben serializarse.
+
+Reemplaza Gemini, Firestore y la Graph API por versiones simuladas con
+latencia fija (Gemini y Graph como I/O async, Firestore como llamada
+bloqueante) y envía N webhooks de teléfonos distintos a la app real.
+Si el camino async bloqueara el event loop, el tiempo total sería ~N turnos;
+con I/O no bloqueante debe ser cercano a un turno.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# Spool temporal y sin ventana de agrupación para medir solo el procesamiento
+os.environ["SPOOL_PATH"] = os.path.join(tempfile.mkdtemp(), "spool.db")
+os.environ["COALESCE_WINDOW_SECONDS"] = "0"
+os.environ.setdefault("SPOOL_WORKERS", "32")
+os.environ["LLM_RPM"] = "0"
+os.environ["LLM_TPM"] = "0"
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+import httpx
+
+import app.main as main
+from app.services import agent, delivery, pipeline, spool
+from app.services.llm_backend import ScriptedBackend, ScriptedRule, set_backend
+from app.services.memory import ConversationContext
+
+GEMINI_LATENCY = 0.5
+FIRESTORE_LATENCY = 0.05
+GRAPH_LATENCY = 0.1
+N_TURNS = 20
+
+sent = []
+
+
+def fake_firestore_write(*args, **kwargs):
+    time.sleep(FIRESTORE_LATENCY)
+
+
+async def fake_load_conversation(phone):
+    await asyncio.to_thread(time.sleep, FIRESTORE_LATENCY)
+    return ConversationContext("", [], False)
+
+
+async def fake_settings():
+    return 1, {"maxDiscount": 10}
+
+
+async def fake_send_message(phone, message):
+    await asyncio.sleep(GRAPH_LATENCY)
+    sent.append(phone)
+    return True
+
+
+def patch_services():
+    # Gemini simulado: responde texto tras GEMINI_LATENCY
+    set_backend(ScriptedBackend([ScriptedRule(r".", "Hola 👋 ¿en qué te ayudo?")], latency=GEMINI_LATENCY))
+    agent.get_settings_snapshot_async = fake_settings
+    agent.search_maquinarias = lambda *args, **kwargs: []
+    pipeline.save_message_firestore = fake_firestore_write
+    pipeline.load_conversation = fake_load_conversation
+    pipeline.claim_message = lambda *args, **kwargs: True
+    delivery.save_message_firestore = fake_firestore_write
+    delivery.send_message = fake_send_message
+    fake_doc = SimpleNamespace(update=fake_firestore_write)
+    pipeline.db = SimpleNamespace(collection=lambda name: SimpleNamespace(document=lambda phone: fake_doc))
+
+
+def webhook_payload(phone: str, n: int) -> dict:
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {"messages": [
+            {"from": phone, "id": f"wamid.test.{n}", "type": "text", "text": {"body": f"hola, soy el cliente {n}"}}
+        ]}}]}]
+    }
+
+
+async def run_turns(client: httpx.AsyncClient, n: int) -> tuple:
+    """Envía n webhooks en paralelo y espera a que se envíen todas las respuestas."""
+    sent.clear()
+    ack_latencies = []
+
+    async def post(i):
+        start = time.perf_counter()
+        resp = await client.post("/webhook", json=webhook_payload(f"5690000{i:04d}", i))
+        ack_latencies.append(time.perf_counter() - start)
+        assert resp.json()["status"] == "queued", resp.json()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(post(i) for i in range(n)))
+    while len(sent) < n:
+        await asyncio.sleep(0.01)
+    return time.perf_counter() - start, max(ack_latencies)
+
+
+async def main_async():
+    patch_services()
+    await spool.start_workers(pipeline.process_events)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        single, _ = await run_turns(client, 1)
+        total, max_ack = await run_turns(client, N_TURNS)
+
+    await spool.stop_workers()
+
+    print("=" * 60)
+    print(f"⏱️  1 turno:            {single:.2f}s")
+    print(f"⏱️  {N_TURNS} turnos en paralelo: {total:.2f}s (serializado serían ~{single * N_TURNS:.1f}s)")
+    print(f"📨 Peor ack del webhook: {max_ack * 1000:.1f}ms")
+    print("=" * 60)
+
+    if total < single * 2:
+        print("✅ Los turnos concurrentes no se serializan")
+        return 0
+    print("❌ Los turnos se están serializando")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main_async()))
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test de deduplicación en reintentos del spool (app/services/dedup.py).
+
+Con una colección de Firestore en memoria verifica que:
+1. Un reintento de la misma fila del spool recupera su propio reclamo,
+   con o sin la caché local (reinicio de la instancia).
+2. Un wamid repetido dentro de un lote reintentado sigue siendo duplicado.
+3. Un reenvío de Meta en el primer intento es duplicado.
+4. Si otra instancia retoma la fila (lease vencido), recupera el reclamo con
+   el token del intento anterior y pasa a ser su dueña.
+"""
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from google.api_core.exceptions import AlreadyExists
+
+from app.services import dedup
+
+
+class FakeDoc:
+    def __init__(self, store, doc_id):
+        self.store = store
+        self.id = doc_id
+
+    @property
+    def exists(self):
+        return self.id in self.store
+
+    def create(self, record):
+        if self.id in self.store:
+            raise AlreadyExists(self.id)
+        self.store[self.id] = dict(record)
+
+    def update(self, fields):
+        self.store[self.id].update(fields)
+
+    def get(self):
+        return self
+
+    def to_dict(self):
+        return dict(self.store.get(self.id, {}))
+
+
+class FakeCollection:
+    def __init__(self):
+        self.store = {}
+
+    def document(self, doc_id):
+        return FakeDoc(self.store, doc_id)
+
+
+def main() -> int:
+    collection = FakeCollection()
+    dedup.db = type("FakeDb", (), {"collection": lambda self, name: collection})()
+    errors = []
+
+    def check(condition, message):
+        print(f"{'✅' if condition else '❌'} {message}")
+        if not condition:
+            errors.append(message)
+
+    row_a, row_b = "spool-1:10:inst-1", "spool-1:11:inst-1"
+    check(dedup.claim_message("wamid.A", "569", claim_token=row_a), "Primer intento reclama el mensaje")
+    check(not dedup.claim_message("wamid.A", "569", claim_token=row_b), "Reenvío de Meta en el primer intento es duplicado")
+
+    # Lote reintentado con el wamid repetido: solo la fila que lo reclamó lo procesa
+    check(dedup.claim_message("wamid.A", "569", claim_token=row_a, retry=True), "Reintento de la misma fila lo recupera")
+    check(not dedup.claim_message("wamid.A", "569", claim_token=row_b, retry=True), "Otra fila del lote reintentado es duplicado")
+
+    # Reinicio: sin caché local, el dueño se lee de Firestore
+    dedup._seen.clear()
+    check(not dedup.claim_message("wamid.A", "569", claim_token=row_b, retry=True), "Tras reinicio, otra fila sigue siendo duplicado")
+    check(dedup.claim_message("wamid.A", "569", claim_token=row_a, retry=True), "Tras reinicio, la fila dueña recupera su reclamo")
+
+    # Un reintento de un mensaje que nunca llegó a reclamarse lo reclama normalmente
+    check(dedup.claim_message("wamid.B", "569", claim_token="spool-1:12:inst-1", retry=True), "Reintento sin reclamo previo reclama")
+    check(collection.store["wamid.B"]["claim_token"] == "spool-1:12:inst-1", "El reclamo guarda el token de la fila")
+
+    # Otra instancia retoma la fila 10 tras vencer el lease de inst-1
+    row_a_new = "spool-1:10:inst-2"
+    check(not dedup.claim_message("wamid.A", "569", claim_token=row_a_new, retry=True),
+          "Otra instancia sin el token anterior es duplicado")
+    dedup._seen.clear()
+    check(dedup.claim_message("wamid.A", "569", claim_token=row_a_new, retry=True, previous_claim_token=row_a),
+          "Otra instancia con el token anterior recupera el reclamo")
+    check(collection.store["wamid.A"]["claim_token"] == row_a_new, "El reclamo pasa a la nueva instancia")
+    check(not dedup.claim_message("wamid.A", "569", claim_token=row_a, retry=True),
+          "La instancia anterior ya no es dueña")
+    check(dedup.claim_message("wamid.A", "569", claim_token=row_a_new, retry=True),
+          "La nueva dueña recupera su reclamo en el siguiente reintento")
+
+    print("=" * 60)
+    if errors:
+        print(f"❌ {len(errors)} errores")
+        return 1
+    print("✅ Reintentos sin procesar duplicados dos veces")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
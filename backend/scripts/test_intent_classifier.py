@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Test del pre-clasificador de intención (app/services/intent.py).
+
+1. Corpus etiquetado: intención y productos esperados por mensaje
+   (con acentos, mayúsculas, plurales y puntuación como llegan por WhatsApp).
+2. Benchmark contra el código anterior: el escaneo de listas de palabras de
+   process_message (minúsculas + `any(word in ...)` + `str.replace` en
+   cadena) más el de la caché de respuestas.
+"""
+import re
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services.intent import classify_message
+
+# (mensaje, intención esperada, productos esperados)
+CORPUS = [
+    ("Hola", "greeting", ()),
+    ("Hola, buenas tardes!", "greeting", ()),
+    ("Buenos días", "greeting", ()),
+    ("holi", "greeting", ()),
+    ("Saludos", "greeting", ()),
+    ("¿Cuánto cuesta el tractor?", "price", ("tractor",)),
+    ("cuanto vale la rastra", "price", ("rastra",)),
+    ("Precio del carro aljibe", "price", ("aljibe", "carro")),
+    ("¿Qué precio tienen los arados?", "price", ("arado",)),
+    ("cuánto cuestan las sembradoras", "price", ("sembradora",)),
+    ("y el valor?", "price", ()),
+    ("Muéstrame fotos del arado", "photos", ("arado",)),
+    ("¿Tienes imágenes de la cosechadora?", "photos", ("cosechadora",)),
+    ("quiero ver fotos", "photos", ()),
+    ("mándame una foto del remolque", "photos", ("remolque",)),
+    ("Quiero una cotización", "quote", ()),
+    ("cotízame 2 rastras y un arado", "quote", ("arado", "rastra")),
+    ("me puedes cotizar el tractor", "quote", ("tractor",)),
+    ("Necesito la cotizacion formal", "quote", ()),
+    ("Agendemos una reunión", "schedule", ()),
+    ("¿podemos tener una videollamada mañana?", "schedule", ()),
+    ("prefiero una llamada telefónica", "schedule", ()),
+    ("quiero agendar para el martes", "schedule", ()),
+    ("¿Hay algún descuento?", "discount", ()),
+    ("está caro, ¿me haces una rebaja?", "discount", ()),
+    ("Necesito un arado", "search", ("arado",)),
+    ("busco tractores usados", "search", ("tractor",)),
+    ("Tienen fumigadores?", "search", ("fumigador",)),
+    ("me interesa un subsolador", "search", ("subsolador",)),
+    ("algo para el fertilizante", "search", ("fertilizante",)),
+    ("¿Tienen desbrozadoras?", "search", ("desbrozadora",)),
+    ("un coloso para la fruta", "search", ("coloso",)),
+    ("¿Qué máquinas tienen?", "catalog", ()),
+    ("Muéstrenme el catálogo", "catalog", ()),
+    ("qué venden ustedes", "catalog", ()),
+    ("lista de productos", "catalog", ()),
+    ("¿Cuál es el horario de atención?", "info", ()),
+    ("¿Dónde están ubicados?", "info", ()),
+    ("hacen envíos a Temuco?", "info", ()),
+    ("formas de pago", "info", ()),
+    ("¿Qué capacidad tiene el carro?", "details", ("carro",)),
+    ("características del nebulizador", "details", ("nebulizador",)),
+    ("ok gracias", "other", ()),
+    ("me parece bien", "other", ()),
+    ("palabra", "other", ()),
+    ("jajaja", "other", ()),
+    ("Algo para preparación de suelo", "other", ()),
+    ("equipos para la cosecha", "other", ()),
+]
+
+# Señales que el agente usa para decidir la pre-búsqueda (mensaje, pre-busca, término)
+PRESEARCH = [
+    ("Necesito un arado para la viña", True, "arado para la vina"),
+    ("busco tractores", True, "tractores"),
+    ("Algo para preparación de suelo", True, "preparacion de suelo"),
+    ("¿Cuánto cuesta el arado?", False, None),
+    ("muéstrame fotos del tractor", False, None),
+    ("hola", False, None),
+]
+
+
+# --- Código anterior, copiado para el benchmark ---------------------------------
+
+LEGACY_CONTEXT_WORDS = [
+    "cuánto cuesta", "cuanto cuesta", "precio", "qué precio", "que precio",
+    "muéstrame", "muestrame", "fotos", "imágenes", "imagenes", "ver fotos",
+    "cotización", "cotizacion", "descuento"
+]
+LEGACY_PRODUCT_KEYWORDS = [
+    "tractor", "arado", "rastra", "fumigador", "cosechadora", "sembradora",
+    "cultivador", "subsolador", "máquina", "equipo", "implemento",
+    "carro", "remolque", "triturador", "fertilizador",
+    "preparación", "suelo", "cosecha", "transporte", "mantenimiento"
+]
+LEGACY_GREETINGS = {"hola", "buenas", "buenos", "dias", "tardes", "noches", "saludos", "holi", "ola", "alo"}
+LEGACY_CATALOG = (
+    "que maquinas", "que maquinaria", "catalogo", "que tienen", "que venden", "que productos",
+    "todas las maquinas", "lista de", "todo lo que tienen", "maquinas disponibles",
+)
+LEGACY_INFO = (
+    "horario", "atencion", "direccion", "ubicacion", "donde estan", "donde quedan", "sucursal",
+    "despacho", "envio", "envios", "formas de pago", "medios de pago", "contacto",
+)
+LEGACY_PRODUCT_TERMS = (
+    "tractor", "arado", "rastra", "fumigador", "nebulizador", "cosechadora", "sembradora",
+    "cultivador", "subsolador", "carro", "aljibe", "remolque", "triturador", "trituradora",
+    "fertilizador", "fertilizante", "pala", "coloso", "acoplado", "desbrozadora",
+)
+LEGACY_QUESTION = ("precio", "cuanto cuesta", "cuanto vale", "valor", "caracteristicas", "medidas", "capacidad")
+LEGACY_REFERENTIAL = {
+    "ese", "esa", "este", "esta", "eso", "esto", "esos", "esas", "estos", "estas", "aquel",
+    "aquella", "anterior", "mismo", "misma", "primero", "primera", "segundo", "segunda",
+    "tercero", "tercera", "ultimo", "ultima", "otro", "otra", "ambos", "tambien",
+}
+LEGACY_ACTIONS = (
+    "cotiza", "cotizacion", "agenda", "reunion", "llamada", "descuento", "compro", "comprar",
+    "mi nombre", "mi correo", "mi email", "fotos", "foto", "imagen", "imagenes", "muestrame",
+)
+
+
+def legacy_normalize(text):
+    text = unicodedata.normalize("NFD", text or "")
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn").lower()
+    return " ".join(re.sub(r"[^a-z0-9ñ@ ]+", " ", text).split())
+
+
+def legacy_classify(message):
+    """process_message (pre-búsqueda) + reply_cache.classify, como estaban antes."""
+    message_lower = message.lower()
+    has_context = any(word in message_lower for word in LEGACY_CONTEXT_WORDS)
+    has_product_keyword = any(keyword in message_lower for keyword in LEGACY_PRODUCT_KEYWORDS)
+    search_term = message_lower
+    for remove in ["necesito", "busco", "quiero", "me interesa", "algo para", "un ", "una "]:
+        search_term = search_term.replace(remove, "")
+    search_term = search_term.strip()
+
+    normalized = legacy_normalize(message)
+    words = normalized.split()
+    cache_intent = None
+    if not (LEGACY_REFERENTIAL.intersection(words) or any(a in normalized for a in LEGACY_ACTIONS)):
+        products = tuple(sorted(p for p in LEGACY_PRODUCT_TERMS if p in normalized))
+        if products and any(q in normalized for q in LEGACY_QUESTION):
+            cache_intent = "product"
+        elif any(p in normalized for p in LEGACY_INFO):
+            cache_intent = "info"
+        elif not products and any(p in normalized for p in LEGACY_CATALOG):
+            cache_intent = "catalog"
+        elif len(words) <= 4 and all(w in LEGACY_GREETINGS for w in words):
+            cache_intent = "greeting"
+    return has_context, has_product_keyword, search_term, cache_intent
+
+
+# --------------------------------------------------------------------------------
+
+def check_corpus() -> int:
+    errors = 0
+    for message, expected, products in CORPUS:
+        result = classify_message(message)
+        if result.intent != expected or result.products != products:
+            print(f"❌ '{message}': {result.intent} {result.products} (esperado {expected} {products})")
+            errors += 1
+    print(f"📚 Corpus: {len(CORPUS) - errors}/{len(CORPUS)} correctos")
+
+    from app.services.agent import CONTEXT_SIGNALS, PRODUCT_SIGNALS
+    for message, should_search, term in PRESEARCH:
+        result = classify_message(message)
+        searches = bool(result.signals & PRODUCT_SIGNALS) and not result.signals & CONTEXT_SIGNALS
+        if searches != should_search or (should_search and result.search_term != term):
+            print(f"❌ Pre-búsqueda '{message}': {searches} '{result.search_term}' (esperado {should_search} '{term}')")
+            errors += 1
+    return errors
+
+
+def benchmark(iterations: int = 2000) -> None:
+    messages = [message for message, _, _ in CORPUS]
+    total = iterations * len(messages)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for message in messages:
+            legacy_classify(message)
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for message in messages:
+            classify_message(message)
+    compiled = time.perf_counter() - start
+
+    print(f"⏱️  Código anterior: {legacy / total * 1e6:.1f} µs/mensaje")
+    print(f"⏱️  Clasificador compilado: {compiled / total * 1e6:.1f} µs/mensaje ({legacy / compiled:.1f}x)")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    errors = check_corpus()
+    benchmark()
+    print("=" * 60)
+    if errors:
+        print(f"❌ {errors} errores de clasificación")
+        sys.exit(1)
+    print("✅ Clasificador de intención OK")
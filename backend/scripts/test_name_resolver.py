@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test del resolvedor de nombres por lote (resolve_maquinarias).
+
+Con un catálogo en memoria verifica que:
+1. N nombres se resuelven con una sola lectura del catálogo.
+2. Cada nombre trae su mejor producto y una confianza (exacto = 1.0).
+3. Errores de tipeo y nombres parciales resuelven al producto correcto.
+4. Nombres que no existen quedan sin producto en vez de tomar cualquiera.
+"""
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services import catalog
+from app.services.maquinarias import resolve_maquinarias
+
+CATALOG = [
+    {"id": "arado-1", "nombre": "Arado de Discos", "categoria": "Preparación de suelo", "tags": ["arado", "discos"]},
+    {"id": "arado-2", "nombre": "Arado Cincel", "categoria": "Preparación de suelo", "tags": ["arado"]},
+    {"id": "rastra-1", "nombre": "Rastra Offset 20 Discos", "categoria": "Preparación de suelo", "tags": ["rastra"]},
+    {"id": "aljibe-1", "nombre": "Carro Aljibe 3000L", "categoria": "Transporte", "tags": ["agua", "aljibe"]},
+    {"id": "nebulizador-1", "nombre": "Nebulizador Turbo 1500", "categoria": "Pulverización", "tags": ["fumigador"]},
+    {"id": "coloso-1", "nombre": "Coloso Frutero", "categoria": "Transporte", "tags": ["fruta", "coloso"]},
+]
+
+# (nombre pedido, id esperado o None, confianza mínima esperada)
+CASES = [
+    ("Arado de Discos", "arado-1", 1.0),
+    ("arado de discos", "arado-1", 1.0),
+    ("Arado Cincel", "arado-2", 1.0),
+    ("Carro Aljibe", "aljibe-1", 0.7),
+    ("carro aljibe 3000 litros", "aljibe-1", 0.5),
+    ("Nebulisador Turbo", "nebulizador-1", 0.5),
+    ("Rastra offset", "rastra-1", 0.5),
+    ("coloso", "coloso-1", 0.5),
+    ("Cosechadora de papas", None, 0.0),
+    ("", None, 0.0),
+]
+
+reads = []
+
+
+def fake_read_catalog():
+    reads.append(len(CATALOG))
+    return {item["id"]: dict(item) for item in CATALOG}
+
+
+def main() -> int:
+    catalog._read_catalog = fake_read_catalog
+    errors = 0
+
+    matches = resolve_maquinarias([name for name, _, _ in CASES])
+    if len(reads) != 1:
+        print(f"❌ Se leyó el catálogo {len(reads)} veces para {len(CASES)} nombres")
+        errors += 1
+
+    for (name, expected, min_score), match in zip(CASES, matches):
+        found = match.item["id"] if match.item else None
+        ok = found == expected and match.query == name and (expected is None or match.score >= min_score)
+        print(f"{'✅' if ok else '❌'} '{name}' → {found} ({match.score:.2f})")
+        if not ok:
+            errors += 1
+
+    print("=" * 60)
+    if errors:
+        print(f"❌ {errors} errores")
+        return 1
+    print(f"✅ {len(CASES)} nombres resueltos con una lectura del catálogo")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline: turnos por minuto del agente y del webhook sin Vertex AI.
+
+Usa el backend de LLM guionado (LLM_BACKEND=fake) con latencia simulada y
+reemplaza Firestore, Storage y la Graph API por versiones en memoria. Mide:
+
+1. `process_message` directo con N_AGENT_TURNS turnos concurrentes.
+2. El camino completo webhook → spool → agente → envío con N_WEBHOOK_TURNS.
+
+Los mensajes rotan entre saludo, búsqueda, fotos, cotización y reunión, así
+que se ejercitan las function calls y la continuación con FunctionResponses.
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["LLM_RPM"] = "0"
+os.environ["LLM_TPM"] = "0"
+os.environ["SPOOL_PATH"] = os.path.join(tempfile.mkdtemp(), "spool.db")
+os.environ["COALESCE_WINDOW_SECONDS"] = "0"
+os.environ.setdefault("SPOOL_WORKERS", "64")
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+import httpx
+
+import app.main as main
+from app.services import agent, catalog, delivery, pipeline, spool
+from app.services.llm_backend import ScriptedBackend, set_backend
+from app.services.memory import ConversationContext
+
+LLM_LATENCY = 0.05
+LLM_JITTER = 0.05
+N_AGENT_TURNS = 3000
+N_WEBHOOK_TURNS = 2000
+AGENT_CONCURRENCY = 200
+MIN_TURNS_PER_MINUTE = 2000
+WEBHOOK_TIMEOUT_SECONDS = 60
+
+MESSAGES = [
+    "hola, soy el cliente {i}",
+    "busco un tractor para el campo {i}",
+    "quiero ver fotos del arado ({i})",
+    "cotiza el arado por favor, pedido {i}",
+    "agenda una reunión para el cliente {i}",
+]
+
+CATALOG = [
+    {"id": "arado-1", "nombre": "Arado de Discos", "descripcion": "Arado de 3 discos", "precioReferencia": 1500000},
+    {"id": "tractor-1", "nombre": "Tractor 75HP", "descripcion": "Tractor 4x4", "precioReferencia": 18000000},
+]
+
+sent = []
+
+
+def fake_search(query, limit=10, **kwargs):
+    return CATALOG[:limit]
+
+
+async def fake_settings():
+    return 1, {"maxDiscount": 10}
+
+
+async def fake_load_conversation(phone):
+    return ConversationContext("", [], False)
+
+
+async def fake_send_message(phone, message):
+    sent.append(phone)
+    return True
+
+
+async def fake_send_document(phone, url, filename=None, *args, **kwargs):
+    return True
+
+
+def patch_services():
+    set_backend(ScriptedBackend(latency=LLM_LATENCY, jitter=LLM_JITTER))
+    agent.get_settings_snapshot_async = fake_settings
+    agent.search_maquinarias = fake_search
+    catalog._read_catalog = lambda: {item["id"]: item for item in CATALOG}
+    agent.schedule_meeting = lambda **kwargs: True
+    agent.generate_quotation_pdf = lambda **kwargs: "https://storage.test/cotizaciones/COT-TEST.pdf"
+    agent.save_quotation_to_firestore = lambda **kwargs: True
+    pipeline.save_message_firestore = lambda *args, **kwargs: None
+    pipeline.load_conversation = fake_load_conversation
+    pipeline.claim_message = lambda *args, **kwargs: True
+    fake_doc = SimpleNamespace(update=lambda *args, **kwargs: None)
+    pipeline.db = SimpleNamespace(collection=lambda name: SimpleNamespace(document=lambda phone: fake_doc))
+    delivery.save_message_firestore = lambda *args, **kwargs: None
+    delivery.send_message = fake_send_message
+    delivery.send_document = fake_send_document
+
+
+async def bench_agent() -> tuple:
+    """Returns: (segundos, turnos con error)"""
+    semaphore = asyncio.Semaphore(AGENT_CONCURRENCY)
+    errors = []
+
+    async def turn(i):
+        async with semaphore:
+            message = MESSAGES[i % len(MESSAGES)].format(i=i)
+            result = await agent.process_message(message, chat_history=[], client_phone=f"569{i:08d}")
+            if not result.get("text") or result["text"] in ("Error técnico.", "Error procesando. Intenta de nuevo."):
+                errors.append((message, result))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(turn(i) for i in range(N_AGENT_TURNS)))
+    elapsed = time.perf_counter() - start
+    if errors:
+        print(f"❌ {len(errors)} turnos con error, ej: {errors[0]}")
+    return elapsed, len(errors)
+
+
+def webhook_payload(i: int) -> dict:
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {"messages": [{
+            "from": f"569{i:08d}", "id": f"wamid.bench.{i}", "type": "text",
+            "text": {"body": MESSAGES[i % len(MESSAGES)].format(i=i)}
+        }]}}]}]
+    }
+
+
+async def bench_webhook() -> tuple:
+    """Returns: (segundos, respuestas que no llegaron antes del timeout)"""
+    sent.clear()
+    await spool.start_workers(pipeline.process_events)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        start = time.perf_counter()
+        for batch in range(0, N_WEBHOOK_TURNS, 100):
+            await asyncio.gather(*(
+                client.post("/webhook", json=webhook_payload(i))
+                for i in range(batch, min(batch + 100, N_WEBHOOK_TURNS))
+            ))
+        while len(sent) < N_WEBHOOK_TURNS and time.perf_counter() - start < WEBHOOK_TIMEOUT_SECONDS:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        missing = max(N_WEBHOOK_TURNS - len(sent), 0)
+        if missing:
+            print(f"❌ Solo {len(sent)}/{N_WEBHOOK_TURNS} respuestas en {WEBHOOK_TIMEOUT_SECONDS}s")
+    await spool.stop_workers()
+    return elapsed, missing
+
+
+async def main_async():
+    # Los logs por turno distorsionan la medición
+    logging.getLogger().setLevel(logging.WARNING)
+    patch_services()
+
+    agent_seconds, agent_errors = await bench_agent()
+    webhook_seconds, webhook_missing = await bench_webhook()
+
+    agent_rate = N_AGENT_TURNS / agent_seconds * 60
+    webhook_rate = N_WEBHOOK_TURNS / webhook_seconds * 60
+    print("=" * 60)
+    print(f"🧠 process_message: {N_AGENT_TURNS} turnos en {agent_seconds:.2f}s → {agent_rate:,.0f} turnos/min")
+    print(f"📨 webhook completo: {N_WEBHOOK_TURNS} turnos en {webhook_seconds:.2f}s → {webhook_rate:,.0f} turnos/min")
+    print(f"   (latencia simulada del LLM: {LLM_LATENCY * 1000:.0f}-{(LLM_LATENCY + LLM_JITTER) * 1000:.0f}ms por llamada)")
+    print("=" * 60)
+
+    # Un timeout mide solo hasta el corte: la tasa no vale si faltaron respuestas
+    if agent_errors or webhook_missing:
+        print(f"❌ {agent_errors} turnos con error y {webhook_missing} respuestas sin llegar")
+        return 1
+    if min(agent_rate, webhook_rate) >= MIN_TURNS_PER_MINUTE:
+        print(f"✅ Sobre {MIN_TURNS_PER_MINUTE:,} turnos/min sin Vertex AI")
+        return 0
+    print(f"❌ Bajo {MIN_TURNS_PER_MINUTE:,} turnos/min")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main_async()))
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 """Test completo del flujo de precio y cotización - Varios escenarios"""
+import asyncio
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -26,14 +27,14 @@ chat1 = [
 ]
 
 print("\n1. Cliente pregunta: '¿Cuánto cuesta?'")
-result1 = process_message("¿Cuánto cuesta?", chat1, "56990702658")
+result1 = asyncio.run(process_message("¿Cuánto cuesta?", chat1, "56990702658"))
 print("   Respuesta:")
 print("   " + result1.get("text", "").replace("\n", "\n   "))
 
 # Verificaciones
 has_price = "$" in result1.get("text", "")
 offers_quote = "cotización" in result1.get("text", "").lower() or "cotizacion" in result1.get("text", "").lower()
-has_pdf = len(result1.get("documents", [])) > 0
+has_pdf = any(a.kind == "quotation_pdf" for a in result1.get("deferred", []))
 
 print(f"\n   ✅ Menciona precio: {has_price}")
 print(f"   ✅ Ofrece cotización: {offers_quote}")
@@ -57,13 +58,13 @@ chat2 = [
 ]
 
 print("\n1. Cliente pregunta: 'cuanto vale el carro transporte de personal'")
-result2 = process_message("cuanto vale el carro transporte de personal", chat2, "56990702658")
+result2 = asyncio.run(process_message("cuanto vale el carro transporte de personal", chat2, "56990702658"))
 print("   Respuesta:")
 print("   " + result2.get("text", "").replace("\n", "\n   "))
 
 has_price2 = "$" in result2.get("text", "")
 offers_quote2 = "cotización" in result2.get("text", "").lower() or "cotizacion" in result2.get("text", "").lower()
-has_pdf2 = len(result2.get("documents", [])) > 0
+has_pdf2 = any(a.kind == "quotation_pdf" for a in result2.get("deferred", []))
 
 print(f"\n   ✅ Menciona precio: {has_price2}")
 print(f"   ✅ Ofrece cotización: {offers_quote2}")
@@ -89,7 +90,7 @@ chat3 = [
 ]
 
 print("\n1. Cliente dice: 'cotizame ese por favor'")
-result3 = process_message("cotizame ese por favor", chat3, "56990702658")
+result3 = asyncio.run(process_message("cotizame ese por favor", chat3, "56990702658"))
 print("   Respuesta:")
 print("   " + result3.get("text", "").replace("\n", "\n   "))
 
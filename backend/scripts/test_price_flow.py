@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 """Test para verificar el flujo correcto de precio y cotización"""
+import asyncio
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -22,18 +23,18 @@ chat_history = [
 # PASO 1: Cliente pregunta el precio
 print("PASO 1: Cliente pregunta el precio")
 print("-" * 70)
-result1 = process_message(
+result1 = asyncio.run(process_message(
     user_message="¿Cuánto cuesta?",
     chat_history=chat_history,
     client_phone="56990702658"
-)
+))
 
 print("RESPUESTA DEL AGENTE:")
 print(result1.get("text", ""))
 print()
 
-# Verificar que NO generó cotización
-if result1.get("documents"):
+# Verificar que NO generó cotización (el PDF viaja como artefacto diferido)
+if any(a.kind == "quotation_pdf" for a in result1.get("deferred", [])):
     print("❌ ERROR: Generó cotización cuando solo preguntó el precio")
 else:
     print("✅ OK: No generó cotización automáticamente")
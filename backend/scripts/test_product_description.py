@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 """Test para verificar la generación variada de descripciones de productos"""
+import asyncio
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -23,11 +24,11 @@ for i in range(3):
     print(f"INTENTO {i+1}: Pidiendo ver 'Carro Aljibe'")
     print('='*70)
     
-    result = process_message(
+    result = asyncio.run(process_message(
         user_message="quiero ver fotos del carro aljibe",
         chat_history=chat_history,
         client_phone="56990702658"
-    )
+    ))
     
     print("\n📝 RESPUESTA DEL AGENTE:")
     print("-" * 70)
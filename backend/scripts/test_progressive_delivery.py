@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Test de entrega progresiva: el texto de una cotización no espera al PDF.
+
+Con el backend de LLM guionado y un generador de PDF lento simulado,
+verifica que:
+1. El texto sale a la latencia del LLM, antes de que el PDF esté listo.
+2. El PDF llega después, como documento con el aviso de éxito, y queda
+   registrado antes de que termine el turno (y se complete su fila del spool).
+3. Si el PDF falla, el cliente recibe un aviso en vez de nada.
+4. Las imágenes salen antes que el PDF aunque el PDF esté listo primero.
+5. Si WhatsApp rechaza el texto, el turno falla (el spool lo reintenta) y
+   no se guarda una respuesta que el cliente nunca recibió.
+"""
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+os.environ["LLM_RPM"] = "0"
+os.environ["LLM_TPM"] = "0"
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services import agent, catalog, delivery, pipeline
+from app.services.llm_backend import ScriptedBackend, set_backend
+from app.services.memory import ConversationContext
+
+LLM_LATENCY = 0.2
+PDF_LATENCY = 1.5
+PHONE = "56911112222"
+
+timeline = []
+saved = []
+start = 0.0
+
+
+def fake_pdf(**kwargs):
+    time.sleep(PDF_LATENCY)
+    return "https://storage.test/cotizaciones/CotizacionArado20260101_COT-TEST.pdf"
+
+
+async def fake_send_message(phone, message):
+    timeline.append(("text", message, time.perf_counter() - start))
+    return True
+
+
+async def fake_send_document(phone, url, filename="", caption=""):
+    timeline.append(("document", f"{filename} {caption}", time.perf_counter() - start))
+    return True
+
+
+async def fake_send_image(phone, url, caption=""):
+    timeline.append(("image", url, time.perf_counter() - start))
+    return True
+
+
+async def fake_settings():
+    return 1, {"maxDiscount": 10}
+
+
+async def fake_load_conversation(phone):
+    return ConversationContext("", [], False)
+
+
+def patch_services():
+    set_backend(ScriptedBackend(latency=LLM_LATENCY))
+    agent.get_settings_snapshot_async = fake_settings
+    catalog._read_catalog = lambda: {
+        "arado-1": {"id": "arado-1", "nombre": "Arado de Discos", "precioReferencia": 1500000}
+    }
+    agent.generate_quotation_pdf = fake_pdf
+    agent.save_quotation_to_firestore = lambda **kwargs: True
+    pipeline.save_message_firestore = lambda *args, **kwargs: None
+    pipeline.load_conversation = fake_load_conversation
+    pipeline.claim_message = lambda *args, **kwargs: True
+    pipeline.forget_message = lambda *args, **kwargs: None
+    fake_doc = SimpleNamespace(update=lambda *args, **kwargs: None)
+    pipeline.db = SimpleNamespace(collection=lambda name: SimpleNamespace(document=lambda phone: fake_doc))
+    delivery.save_message_firestore = lambda phone, role, content, **kwargs: saved.append(content)
+    delivery.send_message = fake_send_message
+    delivery.send_document = fake_send_document
+    delivery.send_image = fake_send_image
+
+
+async def run_turn() -> float:
+    """Turno completo; retorna cuánto tardó el turno en liberar al worker."""
+    global start
+    timeline.clear()
+    saved.clear()
+    start = time.perf_counter()
+    event = {"phone": PHONE, "type": "text", "text": "cotiza el arado por favor", "message_id": f"wamid.{start}"}
+    await pipeline.process_events([event])
+    return time.perf_counter() - start
+
+
+async def check_order() -> bool:
+    """Imágenes lentas y PDF rápido: igual se entregan texto → imágenes → PDF."""
+    global start
+    timeline.clear()
+    start = time.perf_counter()
+
+    async def slow_images():
+        await asyncio.sleep(0.3)
+        return [("image", "https://storage.test/arado.jpg", "", "")]
+
+    async def fast_pdf():
+        return [("document", "https://storage.test/COT-TEST.pdf", "COT-TEST.pdf", "")]
+
+    text_sent = asyncio.Event()
+    deliveries = delivery.start_deferred(PHONE, [
+        delivery.DeferredArtifact("images", slow_images, "sin fotos"),
+        delivery.DeferredArtifact("quotation_pdf", fast_pdf, "sin PDF"),
+    ], after=text_sent)
+    await fake_send_message(PHONE, "Aquí va tu cotización")
+    text_sent.set()
+    await asyncio.gather(*deliveries)
+    order = [kind for kind, _, _ in timeline]
+    print(f"📨 Orden de entrega: {order}")
+    return order == ["text", "image", "document"]
+
+
+async def check_failed_text() -> bool:
+    """WhatsApp rechaza el texto: el turno falla y no se persiste la respuesta."""
+    async def rejected(phone, message):
+        return False
+
+    delivery.send_message = rejected
+    try:
+        await run_turn()
+        failed = False
+    except RuntimeError:
+        failed = True
+    finally:
+        delivery.send_message = fake_send_message
+    print(f"📨 Texto rechazado: turno {'falló' if failed else 'terminó'}, guardados {saved}")
+    return failed and not saved
+
+
+async def main_async():
+    patch_services()
+    ok = True
+
+    turn_seconds = await run_turn()
+    first_text = next((t for kind, _, t in timeline if kind == "text"), None)
+    document = next((t for kind, _, t in timeline if kind == "document"), None)
+    print(f"⏱️  Primer texto: {first_text:.2f}s | turno liberado: {turn_seconds:.2f}s | PDF: {document or 0:.2f}s")
+
+    if first_text is None or first_text > LLM_LATENCY + 0.5:
+        print("❌ El texto esperó más que la latencia del LLM")
+        ok = False
+    if document is None or document < first_text:
+        print("❌ El PDF no llegó después del texto")
+        ok = False
+    if document is not None and document > turn_seconds:
+        print("❌ El turno terminó antes de entregar el PDF")
+        ok = False
+    if not any(s.startswith("📄") for s in saved):
+        print("❌ El PDF no quedó registrado en la conversación")
+        ok = False
+    # El éxito se anuncia con el PDF, no en el texto que sale antes de que exista
+    texts = [message for kind, message, _ in timeline if kind == "text"]
+    documents = [message for kind, message, _ in timeline if kind == "document"]
+    if any("Exitosamente" in message for message in texts) or not any("Exitosamente" in d for d in documents):
+        print("❌ La cotización se anunció como generada antes de tener el PDF")
+        ok = False
+
+    agent.generate_quotation_pdf = lambda **kwargs: None
+    await run_turn()
+    notices = [message for kind, message, _ in timeline if kind == "text" and "PDF" in message and "problema" in message]
+    print(f"📨 Mensajes con PDF fallido: {[m[:40] for _, m, _ in timeline]}")
+    if not notices:
+        print("❌ No se avisó al cliente que el PDF falló")
+        ok = False
+
+    if not await check_order():
+        print("❌ Los artefactos no se entregaron en orden")
+        ok = False
+
+    if not await check_failed_text():
+        print("❌ Un texto rechazado no hizo fallar el turno o quedó guardado")
+        ok = False
+
+    if ok:
+        print("✅ Texto inmediato, PDF y fotos en orden dentro del turno y aviso ante fallas")
+        return 0
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main_async()))
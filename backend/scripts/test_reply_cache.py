@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test de la caché de respuestas del agente (app/services/reply_cache.py).
+
+Con el backend de LLM guionado verifica que:
+1. El mismo mensaje al inicio de dos conversaciones distintas se responde
+   desde caché la segunda vez.
+2. Con historial (o resumen) nunca se usa ni se llena la caché: dos clientes
+   con historiales distintos que envían el mismo mensaje reciben cada uno
+   su propia respuesta del modelo.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+os.environ["LLM_RPM"] = "0"
+os.environ["LLM_TPM"] = "0"
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services import agent
+from app.services.llm_backend import ScriptedBackend, ScriptedRule, set_backend
+
+MESSAGE = "¿Cuánto cuesta el tractor?"
+
+
+class CountingBackend(ScriptedBackend):
+    def __init__(self):
+        super().__init__([ScriptedRule(r".", "El Tractor 75HP está en $18.000.000 + IVA 🚜")], latency=0)
+        self.calls = 0
+
+    def reply_parts(self, text, tool_names):
+        self.calls += 1
+        return super().reply_parts(text, tool_names)
+
+
+async def fake_settings():
+    return 1, {"maxDiscount": 10}
+
+
+def history(*messages):
+    """Historial como lo carga el pipeline: el mensaje del turno ya va al final."""
+    return [{"role": role, "content": content} for role, content in messages] + [{"role": "user", "content": MESSAGE}]
+
+
+async def main_async() -> int:
+    backend = CountingBackend()
+    set_backend(backend)
+    agent.get_settings_snapshot_async = fake_settings
+    agent.search_maquinarias = lambda *args, **kwargs: []
+    agent.get_catalog_version = lambda: 1
+    errors = []
+
+    async def turn(description, chat_history, expect_model_call, summary=None):
+        before = backend.calls
+        result = await agent.process_message(MESSAGE, chat_history=chat_history, conversation_summary=summary)
+        called = backend.calls > before
+        ok = called == expect_model_call and bool(result.get("text"))
+        print(f"{'✅' if ok else '❌'} {description}: {'modelo' if called else 'caché'}")
+        if not ok:
+            errors.append(description)
+
+    await turn("Inicio de conversación A", history(), expect_model_call=True)
+    await turn("Inicio de conversación B, mismo mensaje", history(), expect_model_call=False)
+
+    viñedo = history(("user", "hola, tengo un viñedo de 5 hectáreas"), ("assistant", "¡Buena! ¿Qué necesitas?"))
+    lecheria = history(("user", "tengo una lechería en Osorno"), ("assistant", "¡Dale! ¿En qué te ayudo?"))
+    await turn("Cliente con historial (viñedo)", viñedo, expect_model_call=True)
+    await turn("Otro cliente con otro historial (lechería), mismo mensaje", lecheria, expect_model_call=True)
+    await turn("Mismo historial (viñedo) otra vez", viñedo, expect_model_call=True)
+    await turn("Solo resumen de una conversación anterior", history(), expect_model_call=True,
+               summary="Cliente con viñedo, pidió cotización de nebulizador")
+
+    print("=" * 60)
+    if errors:
+        print(f"❌ {len(errors)} errores")
+        return 1
+    print("✅ La caché solo reutiliza respuestas de inicio de conversación")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main_async()))
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de search_maquinarias con campos precalculados.
+
+Con un catálogo sintético de 5.000 maquinarias compara el costo por consulta
+del código anterior (normalizar nombre, categoría, descripción y cada tag de
+cada ítem en cada consulta) contra la búsqueda actual sobre los campos que
+el catálogo precalcula al cargar. Verifica además que la búsqueda actual no
+pierda ninguno de los ítems que encontraba el código anterior.
+"""
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services import catalog
+from app.services.catalog import normalize_text
+from app.services.maquinarias import search_maquinarias
+
+N_ITEMS = 5000
+ITERATIONS = 20
+
+TIPOS = [
+    "Arado", "Rastra", "Sembradora", "Cosechadora", "Nebulizador", "Carro Aljibe", "Subsolador",
+    "Trituradora", "Fertilizadora", "Coloso", "Pala Niveladora", "Desbrozadora",
+]
+CATEGORIAS = ["Preparación de suelo", "Siembra", "Cosecha", "Pulverización", "Transporte", "Mantención"]
+PALABRAS = [
+    "reforzado", "hidráulico", "compacto", "frutales", "viñedos", "cereales", "acero", "discos",
+    "tolva", "bomba", "turbina", "enganche", "categoría", "tractores", "riego", "pradera",
+]
+
+QUERIES = [
+    "arado", "carro aljibe", "fumigadora", "nebulizador turbo", "rastra", "pala niveladora",
+    "cosechadora de papas", "fertilizador", "viñedos", "modelo 4999", "tractor",
+]
+
+
+def build_catalog() -> dict:
+    rng = random.Random(42)
+    items = {}
+    for i in range(N_ITEMS):
+        tipo = rng.choice(TIPOS)
+        item_id = f"maq-{i:05d}"
+        items[item_id] = {
+            "id": item_id,
+            "nombre": f"{tipo} Modelo {i}",
+            "categoria": rng.choice(CATEGORIAS),
+            "descripcion": " ".join(rng.choice(PALABRAS) for _ in range(12)).capitalize() + ".",
+            "tags": [tipo.lower(), rng.choice(PALABRAS), rng.choice(PALABRAS)],
+            "precioReferencia": rng.randint(500, 30000) * 1000,
+        }
+    return items
+
+
+# --- Código anterior, copiado para el benchmark ---------------------------------
+
+LEGACY_SYNONYMS = {
+    "fertilizador": "fertilizante", "abonadora": "fertilizante", "sembradora": "siembra",
+    "rastra": "grada", "fumigadora": "nebulizador", "fumigacion": "nebulizador",
+    "atomizador": "nebulizador", "rociador": "nebulizador", "triturador": "trituradora",
+    "preparacion": "preparacion",
+}
+LEGACY_GENERIC = ["todas", "todo", "maquinas", "catalogo", "disponible", "disponibles", "lista"]
+
+
+def legacy_search(all_docs: list, query: str, limit: int = 10) -> list:
+    query_norm = normalize_text(query)
+    search_terms = {query_norm}
+    for word in query_norm.split():
+        if word in LEGACY_SYNONYMS:
+            search_terms.add(LEGACY_SYNONYMS[word])
+    if any(keyword in query_norm for keyword in LEGACY_GENERIC) or len(query_norm) < 3:
+        return all_docs[:limit]
+
+    results = []
+    for data in all_docs:
+        nombre = normalize_text(data.get("nombre", ""))
+        categoria = normalize_text(data.get("categoria", ""))
+        descripcion = normalize_text(data.get("descripcion", ""))
+        tags = [normalize_text(t) for t in data.get("tags", [])]
+        if any(
+            term in nombre or term in categoria or term in descripcion or any(term in tag for tag in tags)
+            for term in search_terms
+        ):
+            results.append(data)
+            if len(results) >= limit:
+                break
+    return results
+
+
+# --------------------------------------------------------------------------------
+
+def per_query_us(search, iterations: int = ITERATIONS) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for query in QUERIES:
+            search(query)
+    return (time.perf_counter() - start) / (iterations * len(QUERIES)) * 1e6
+
+
+def main() -> int:
+    # Los logs por consulta distorsionan la medición
+    logging.getLogger().setLevel(logging.WARNING)
+    items = build_catalog()
+    catalog._read_catalog = lambda: items
+
+    start = time.perf_counter()
+    snapshot = catalog.get_catalog_snapshot()
+    load_ms = (time.perf_counter() - start) * 1000
+    all_docs = list(snapshot.items)
+
+    errors = 0
+    for query in QUERIES:
+        expected = {m["id"] for m in legacy_search(all_docs, query, limit=N_ITEMS)}
+        missing = expected - {m["id"] for m in search_maquinarias(query, limit=N_ITEMS)}
+        if missing:
+            print(f"❌ '{query}': faltan {len(missing)} de {len(expected)}, ej: {sorted(missing)[:3]}")
+            errors += 1
+
+    legacy = per_query_us(lambda query: legacy_search(all_docs, query))
+    precomputed = per_query_us(search_maquinarias)
+
+    print("=" * 60)
+    print(f"📦 Catálogo: {N_ITEMS} ítems, campos precalculados en {load_ms:.0f} ms (una vez por carga)")
+    print(f"⏱️  Código anterior: {legacy:,.0f} µs/consulta")
+    print(f"⏱️  Búsqueda actual: {precomputed:,.0f} µs/consulta ({legacy / precomputed:.1f}x)")
+    print("=" * 60)
+    if errors:
+        print(f"❌ {errors} consultas perdieron resultados")
+        return 1
+    print(f"✅ Ningún resultado perdido en {len(QUERIES)} consultas, solo se normaliza la consulta")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test del buscador de maquinarias con índice invertido (app/services/search_index.py).
+
+1. Ranking: un producto llamado "Tractor" va antes que uno que solo menciona
+   tractores en la descripción, y el orden de campos es nombre > tags >
+   categoría > descripción. También plurales, prefijos, sinónimos y
+   consultas de varias palabras, que deben calzar con todos sus términos
+   ("bomba de agua" no trae el carro aljibe).
+2. Escala: con catálogos de 1.000 a 20.000 ítems, el costo de una consulta
+   selectiva no crece con el catálogo (el recorrido lineal sí).
+"""
+import logging
+import sys
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services import catalog
+from app.services.catalog import SearchFields, normalize_text
+from app.services.maquinarias import search_maquinarias
+from app.services.search_index import SearchIndex
+
+CATALOG = [
+    {"id": "carro-1", "nombre": "Carro de Arrastre", "categoria": "Transporte",
+     "descripcion": "Carro para tractor, ideal para tractores de 60 a 90 HP", "tags": ["carga"]},
+    {"id": "tractor-1", "nombre": "Tractor 75HP", "categoria": "Tracción",
+     "descripcion": "Tractor 4x4 con cabina", "tags": ["tractor"]},
+    {"id": "aljibe-1", "nombre": "Carro Aljibe 3000L", "categoria": "Transporte",
+     "descripcion": "Estanque de agua", "tags": ["agua"]},
+    {"id": "frutero-1", "nombre": "Carro Frutero", "categoria": "Transporte",
+     "descripcion": "Para bins de fruta", "tags": ["frutales"]},
+    {"id": "nebulizador-1", "nombre": "Nebulizador Turbo 1500", "categoria": "Pulverización",
+     "descripcion": "Turbina de alto caudal", "tags": []},
+    {"id": "subsolador-1", "nombre": "Subsolador 5 Brazos", "categoria": "Preparación de suelo",
+     "descripcion": "Descompacta el suelo", "tags": []},
+    # Mismo término en un solo campo de cada ítem: nombre > tags > categoría > descripción
+    {"id": "campo-descripcion", "nombre": "Pala Niveladora", "categoria": "Movimiento de tierra",
+     "descripcion": "Sirve para viñedos", "tags": []},
+    {"id": "campo-categoria", "nombre": "Desbrozadora", "categoria": "Viñedos",
+     "descripcion": "Corta maleza", "tags": []},
+    {"id": "campo-tags", "nombre": "Despalilladora", "categoria": "Vendimia",
+     "descripcion": "Separa el escobajo", "tags": ["viñedos"]},
+    {"id": "campo-nombre", "nombre": "Atomizador Viñedos", "categoria": "Pulverización",
+     "descripcion": "Aplicación en hileras", "tags": []},
+]
+
+# (consulta, ids esperados al inicio, en ese orden)
+CASES = [
+    ("tractor", ["tractor-1", "carro-1"]),
+    ("tractores", ["tractor-1", "carro-1"]),
+    ("viñedos", ["campo-nombre", "campo-tags", "campo-categoria", "campo-descripcion"]),
+    ("carro aljibe", ["aljibe-1"]),
+    ("fumigadora", ["nebulizador-1"]),
+    ("subsol", ["subsolador-1"]),
+    ("carro para fruta", ["frutero-1"]),
+    ("algo para suelos", ["subsolador-1"]),
+    ("nebulisador", []),
+    ("helicoptero", []),
+    # Calzar con un solo término no basta: no hay cosechadoras ni bombas
+    ("cosechadora de fruta", []),
+    ("bomba de agua", []),
+]
+
+SCALE_SIZES = (1000, 5000, 20000)
+SCALE_QUERY = "subsolador"
+SCALE_MATCHES = 10
+
+
+def check_ranking() -> int:
+    catalog._read_catalog = lambda: {item["id"]: dict(item) for item in CATALOG}
+    errors = 0
+    for query, expected in CASES:
+        found = [m["id"] for m in search_maquinarias(query)]
+        ok = found[:len(expected)] == expected if expected else not found
+        print(f"{'✅' if ok else '❌'} '{query}' → {found[:5]}")
+        if not ok:
+            errors += 1
+    return errors
+
+
+def synthetic_fields(size: int) -> list:
+    """`size` ítems de los que solo SCALE_MATCHES mencionan SCALE_QUERY."""
+    items = []
+    for i in range(size):
+        nombre = f"Subsolador Modelo {i}" if i % (size // SCALE_MATCHES) == 0 else f"Rastra Modelo {i}"
+        items.append(SearchFields.build({
+            "id": f"maq-{i}", "nombre": nombre, "categoria": "Preparación de suelo",
+            "descripcion": f"Equipo número {i} para trabajo de suelo", "tags": ["suelo"],
+        }))
+    return items
+
+
+def linear_scan(fields: list, query: str, limit: int = 10) -> list:
+    # Recorrido de todos los ítems, como antes del índice
+    results = []
+    for f in fields:
+        if query in f.nombre or query in f.categoria or query in f.descripcion or any(query in t for t in f.tags):
+            results.append(f.item)
+            if len(results) >= limit:
+                break
+    return results
+
+
+def per_query_us(search, iterations: int = 200) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        search()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def check_scale() -> int:
+    query = normalize_text(SCALE_QUERY)
+    timings = []
+    for size in SCALE_SIZES:
+        fields = synthetic_fields(size)
+        index = SearchIndex([f.item for f in fields], [f.terms for f in fields])
+        indexed = per_query_us(lambda: index.search(query))
+        linear = per_query_us(lambda: linear_scan(fields, query, limit=size))
+        timings.append(indexed)
+        print(f"⏱️  {size:>6} ítems: índice {indexed:7.1f} µs/consulta | recorrido lineal {linear:9.1f} µs/consulta")
+
+    growth = timings[-1] / timings[0]
+    ok = growth < 4
+    catalog_growth = SCALE_SIZES[-1] / SCALE_SIZES[0]
+    print(f"{'✅' if ok else '❌'} Catálogo x{catalog_growth:.0f} → consulta x{growth:.1f}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    # Los logs por consulta distorsionan la medición
+    logging.getLogger().setLevel(logging.WARNING)
+    print("=" * 60)
+    errors = check_ranking()
+    errors += check_scale()
+    print("=" * 60)
+    if errors:
+        print(f"❌ {errors} errores")
+        sys.exit(1)
+    print("✅ Ranking por relevancia con costo independiente del tamaño del catálogo")
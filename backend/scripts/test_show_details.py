@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 """Test: mostrar detalles cuando cliente dice 'me interesa X'."""
+import asyncio
 import sys
 from pathlib import Path
 
@@ -17,7 +18,7 @@ history = []
 # Paso 1: Listar opciones de transporte
 msg = 'necesito algo para transporte'
 print(f'\n👤: {msg}')
-r1 = process_message(msg, history, phone)
+r1 = asyncio.run(process_message(msg, history, phone))
 print(f'🤖: {r1["text"][:120]}...')
 history.extend([
     {'role': 'user', 'content': msg},
@@ -27,7 +28,7 @@ history.extend([
 # Paso 2: Cliente dice "me interesa el carro aljibe"
 msg = 'me interesa el carro aljibe'
 print(f'\n👤: {msg}')
-r2 = process_message(msg, history, phone)
+r2 = asyncio.run(process_message(msg, history, phone))
 print(f'🤖: {r2["text"][:300]}...')
 
 if r2.get('images'):
@@ -3,6 +3,7 @@
 Test que el agente verifica stock ANTES de recomendar productos.
 """
 
+import asyncio
 import sys
 import os
 from pathlib import Path
@@ -29,7 +30,7 @@ def test_stock_verification():
     message = "hola, necesito un arado de cincel"
     print(f"Cliente: {message}")
     
-    response = process_message(message, chat_history=[], client_phone=phone_number)
+    response = asyncio.run(process_message(message, chat_history=[], client_phone=phone_number))
     print(f"\n🤖 Agente: {response.get('text', 'ERROR')}")
     
     # Verificar si hay function_calls
@@ -70,7 +71,7 @@ def test_stock_verification():
     message = "necesito algo para mantenimiento de suelos"
     print(f"Cliente: {message}")
     
-    response = process_message(message, chat_history=[], client_phone=phone_number)
+    response = asyncio.run(process_message(message, chat_history=[], client_phone=phone_number))
     print(f"\n🤖 Agente: {response.get('text', 'ERROR')}")
     
     if response.get('function_calls'):
@@ -92,7 +93,7 @@ def test_stock_verification():
     message = "cuéntame más del primero"
     print(f"Cliente: {message}")
     
-    response = process_message(message, chat_history=[], client_phone=phone_number)
+    response = asyncio.run(process_message(message, chat_history=[], client_phone=phone_number))
     print(f"\n🤖 Agente: {response.get('text', 'ERROR')}")
     
     if response.get('function_calls'):
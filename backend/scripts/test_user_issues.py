@@ -3,6 +3,7 @@
 Test de los problemas reportados por el usuario.
 """
 
+import asyncio
 import sys
 from pathlib import Path
 
@@ -30,7 +31,7 @@ def test_scenario_1():
     ]
     
     print("\n👤 Cliente: cuanto cuesta?")
-    response = process_message("cuanto cuesta?", chat_history=history, client_phone=phone)
+    response = asyncio.run(process_message("cuanto cuesta?", chat_history=history, client_phone=phone))
     print(f"🤖 Agente: {response['text']}\n")
     
     if "$" in response['text'] or "precio" in response['text'].lower():
@@ -48,7 +49,7 @@ def test_scenario_2():
     
     # Primera consulta: buscar transporte
     print("\n👤 Cliente: necesito algo para transporte")
-    response1 = process_message("necesito algo para transporte", chat_history=[], client_phone=phone)
+    response1 = asyncio.run(process_message("necesito algo para transporte", chat_history=[], client_phone=phone))
     print(f"🤖 Agente: {response1['text'][:200]}...")
     
     if "aljibe" in response1['text'].lower():
@@ -63,7 +64,7 @@ def test_scenario_2():
     ]
     
     print("\n👤 Cliente: me interesa el carro aljibe")
-    response2 = process_message("me interesa el carro aljibe", chat_history=history, client_phone=phone)
+    response2 = asyncio.run(process_message("me interesa el carro aljibe", chat_history=history, client_phone=phone))
     print(f"🤖 Agente: {response2['text']}\n")
     
     if "no tengo" in response2['text'].lower() or "no está en stock" in response2['text'].lower():